@@ -16,13 +16,17 @@
 
 
 
-from flask import Flask, request
+from flask import Flask, Response, request, g
 from flask_cors import CORS
-from queue import Queue
 from services.webhook import send_webhook
-import threading
+from services.job_executor import JobExecutor, resolve_lane_limits
+from services.job_queue import create_job_queue, new_job, resolve_task, register_endpoints
+from services import job_control
+from services import preload
+from services.response_stream import StreamingResult, resolve as resolve_response
 import uuid
 import os
+import contextlib
 import time
 import json
 from version import BUILD_NUMBER  # Import the BUILD_NUMBER
@@ -31,6 +35,10 @@ from services.gcp_toolkit import trigger_cloud_run_job
 from flask_swagger_ui import get_swaggerui_blueprint
 
 MAX_QUEUE_LENGTH = int(os.environ.get('MAX_QUEUE_LENGTH', 0))
+QUEUE_WORKERS = os.environ.get('QUEUE_WORKERS', 'auto')
+QUEUE_LANES = os.environ.get('QUEUE_LANES', '')
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 0))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
 
 def create_app():
     app = Flask(__name__)
@@ -44,67 +52,197 @@ def create_app():
         }
     })
 
-    # Create a queue to hold tasks
-    task_queue = Queue()
-    queue_id = id(task_queue)  # Generate a single queue_id for this worker
-
-    # Function to process tasks from the queue
-    def process_queue():
-        while True:
-            job_id, data, task_func, queue_start_time = task_queue.get()
-            queue_time = time.time() - queue_start_time
-            run_start_time = time.time()
-            pid = os.getpid()  # Get the PID of the actual processing thread
-            
-            # Log job status as running
+    # Function to process a single job taken from the queue
+    def process_job(job):
+        job_id = job["job_id"]
+        data = job["data"]
+        queue_start_time = job["queued_at"]
+        queue_time = time.time() - queue_start_time
+        run_start_time = time.time()
+        pid = os.getpid()  # Get the PID of the actual processing thread
+        
+        # Log job status as running
+        log_job_status(job_id, {
+            "job_status": "running",
+            "job_id": job_id,
+            "queue_id": queue_id,
+            "process_id": pid,
+            "response": None
+        })
+        
+        # Resolve the route function; the job may have been queued by another worker or before a restart
+        task_func = resolve_task(job)
+        if task_func is None:
+            response = (f"Unknown task {job['task']}", job["endpoint"], 500)
+        else:
+            # Streamed responses are only sent to synchronous requests; the webhook gets the final object
+            response = resolve_response(task_func(job_id=job_id, data=data, *job["args"], **job["kwargs"]))
+
+        # A cancelled or timed out job has already been recorded by abort_job
+        context = job_control.current_job()
+        if context is not None and context.cancelled:
+            return
+
+        run_time = time.time() - run_start_time
+        total_time = time.time() - queue_start_time
+
+        response_data = {
+            "endpoint": response[1],
+            "code": response[2],
+            "id": data.get("id"),
+            "job_id": job_id,
+            "response": response[0] if response[2] == 200 else None,
+            "message": "success" if response[2] == 200 else response[0],
+            "pid": pid,
+            "queue_id": queue_id,
+            "lane": job["lane"],
+            "run_time": round(run_time, 3),
+            "queue_time": round(queue_time, 3),
+            "total_time": round(total_time, 3),
+            "upload_stats": context.upload_stats() if context is not None else None,
+            "queue_length": executor.qsize(),
+            "build_number": BUILD_NUMBER  # Add build number to response
+        }
+        
+        # Log job status as done
+        log_job_status(job_id, {
+            "job_status": "done",
+            "job_id": job_id,
+            "queue_id": queue_id,
+            "process_id": pid,
+            "response": response_data
+        })
+
+        # Only send webhook if webhook_url has an actual value (not an empty string)
+        if data.get("webhook_url") and data.get("webhook_url") != "":
+            send_webhook(data.get("webhook_url"), response_data)
+
+    # Function to record a queued job that was cancelled or ran past its timeout
+    def abort_job(job, reason):
+        job_id = job["job_id"]
+        data = job["data"]
+        pid = os.getpid()
+        total_time = time.time() - job["queued_at"]
+
+        response_data = {
+            "endpoint": job["endpoint"],
+            "code": job_control.ABORT_CODES[reason],
+            "id": data.get("id"),
+            "job_id": job_id,
+            "response": None,
+            "message": job_control.abort_message(reason, job.get("timeout")),
+            "pid": pid,
+            "queue_id": queue_id,
+            "lane": job["lane"],
+            "total_time": round(total_time, 3),
+            "queue_length": executor.qsize(),
+            "build_number": BUILD_NUMBER
+        }
+
+        # Log job status as cancelled or timed_out
+        log_job_status(job_id, {
+            "job_status": reason,
+            "job_id": job_id,
+            "queue_id": queue_id,
+            "process_id": pid,
+            "response": response_data
+        })
+
+        if data.get("webhook_url") and data.get("webhook_url") != "":
+            send_webhook(data.get("webhook_url"), response_data)
+
+    # Function to record a job found interrupted by a worker that died while running it
+    def recover_job(job, retried):
+        job_id = job["job_id"]
+        data = job["data"]
+        pid = os.getpid()
+
+        if retried:
+            # Log job status as retried; it runs again from the queue
             log_job_status(job_id, {
-                "job_status": "running",
+                "job_status": "retried",
                 "job_id": job_id,
                 "queue_id": queue_id,
                 "process_id": pid,
+                "attempts": job["attempts"],
                 "response": None
             })
-            
-            response = task_func()
-            run_time = time.time() - run_start_time
-            total_time = time.time() - queue_start_time
-
-            response_data = {
-                "endpoint": response[1],
-                "code": response[2],
-                "id": data.get("id"),
-                "job_id": job_id,
-                "response": response[0] if response[2] == 200 else None,
-                "message": "success" if response[2] == 200 else response[0],
-                "pid": pid,
-                "queue_id": queue_id,
-                "run_time": round(run_time, 3),
-                "queue_time": round(queue_time, 3),
-                "total_time": round(total_time, 3),
-                "queue_length": task_queue.qsize(),
-                "build_number": BUILD_NUMBER  # Add build number to response
-            }
-            
-            # Log job status as done
-            log_job_status(job_id, {
-                "job_status": "done",
-                "job_id": job_id,
-                "queue_id": queue_id,
-                "process_id": pid,
-                "response": response_data
-            })
-
-            # Only send webhook if webhook_url has an actual value (not an empty string)
-            if data.get("webhook_url") and data.get("webhook_url") != "":
-                send_webhook(data.get("webhook_url"), response_data)
-
-            task_queue.task_done()
+            return
+
+        response_data = {
+            "endpoint": job["endpoint"],
+            "code": 500,
+            "id": data.get("id"),
+            "job_id": job_id,
+            "response": None,
+            "message": f"Job was interrupted {job['attempts']} times and will not be retried",
+            "pid": pid,
+            "queue_id": queue_id,
+            "lane": job["lane"],
+            "attempts": job["attempts"],
+            "build_number": BUILD_NUMBER
+        }
 
-    # Start the queue processing in a separate thread
-    threading.Thread(target=process_queue, daemon=True).start()
+        log_job_status(job_id, {
+            "job_status": "failed",
+            "job_id": job_id,
+            "queue_id": queue_id,
+            "process_id": pid,
+            "attempts": job["attempts"],
+            "response": response_data
+        })
+
+        if data.get("webhook_url") and data.get("webhook_url") != "":
+            send_webhook(data.get("webhook_url"), response_data)
+
+    # Per-job timeout from the payload, falling back to JOB_TIMEOUT (0 means no limit)
+    def resolve_timeout():
+        return g.get("job_timeout") or JOB_TIMEOUT or None
+
+    # Create the executor that runs queued tasks on a pool of worker threads.
+    # With the default SQLite backend the queue is shared by all gunicorn workers.
+    # Each lane (heavy-ml, encode, light-io) gets its own threads and concurrency limit.
+    executor = JobExecutor(
+        process_job,
+        create_job_queue(),
+        resolve_lane_limits(QUEUE_WORKERS, QUEUE_LANES),
+        on_abort=abort_job,
+        on_recover=recover_job,
+        max_attempts=JOB_MAX_ATTEMPTS
+    )
+    queue_id = executor.queue_id  # Generate a single queue_id for this worker
+
+    # Send the events of a streaming route as they are produced, ending with its response object
+    def stream_job(stream, context, lane, endpoint, finish):
+        def body():
+            try:
+                with job_control.job_context(context):
+                    with executor.lane_slot(lane) if lane is not None else contextlib.nullcontext():
+                        while True:
+                            try:
+                                event, event_data = next(stream.events)
+                            except StopIteration as stop:
+                                response = stop.value
+                                break
+                            yield stream.encode(event, event_data)
+            except GeneratorExit:
+                # The client went away; stop the work and its subprocesses
+                context.cancel('cancelled')
+                stream.events.close()
+                finish((context.message(), endpoint, job_control.ABORT_CODES['cancelled']))
+                raise
+            except Exception as e:
+                response = (str(e), endpoint, 500)
+            yield stream.encode_result(finish(response)[0])
+
+        return Response(body(), mimetype=stream.mimetype, headers={
+            "Cache-Control": "no-cache",
+            # Keep reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no"
+        })
 
     # Decorator to add tasks to the queue or bypass it
-    def queue_task(bypass_queue=False):
+    def queue_task(bypass_queue=False, lane=None):
         def decorator(f):
             from functools import wraps
             @wraps(f)
@@ -129,7 +267,7 @@ def create_app():
                     })
 
                     # Execute the function directly (no queue)
-                    response = f(job_id=job_id, data=data, *args, **kwargs)
+                    response = resolve_response(f(job_id=job_id, data=data, *args, **kwargs))
                     run_time = time.time() - start_time
 
                     # Build response object
@@ -250,36 +388,68 @@ def create_app():
                         "response": None
                     })
                     
-                    response = f(job_id=job_id, data=data, *args, **kwargs)
-                    run_time = time.time() - start_time
-                    
-                    response_obj = {
-                        "code": response[2],
-                        "id": data.get("id"),
-                        "job_id": job_id,
-                        "response": response[0] if response[2] == 200 else None,
-                        "message": "success" if response[2] == 200 else response[0],
-                        "run_time": round(run_time, 3),
-                        "queue_time": 0,
-                        "total_time": round(run_time, 3),
-                        "pid": pid,
-                        "queue_id": queue_id,
-                        "queue_length": task_queue.qsize(),
-                        "build_number": BUILD_NUMBER  # Add build number to response
-                    }
-                    
-                    # Log job status as done
+                    # Synchronous requests share the lane's concurrency limit with queued jobs
+                    context = job_control.JobContext(job_id, resolve_timeout())
+                    with job_control.job_context(context):
+                        if lane is not None:
+                            with executor.lane_slot(lane):
+                                response = f(job_id=job_id, data=data, *args, **kwargs)
+                        else:
+                            response = f(job_id=job_id, data=data, *args, **kwargs)
+
+                    def finish(response):
+                        run_time = time.time() - start_time
+
+                        # Subprocesses of a cancelled or timed out request were killed; report why
+                        job_status = "done"
+                        if context.cancelled:
+                            job_status = context.reason
+                            response = (context.message(), response[1], job_control.ABORT_CODES[context.reason])
+                        
+                        response_obj = {
+                            "code": response[2],
+                            "id": data.get("id"),
+                            "job_id": job_id,
+                            "response": response[0] if response[2] == 200 else None,
+                            "message": "success" if response[2] == 200 else response[0],
+                            "run_time": round(run_time, 3),
+                            "queue_time": 0,
+                            "total_time": round(run_time, 3),
+                            "upload_stats": context.upload_stats(),
+                            "pid": pid,
+                            "queue_id": queue_id,
+                            "queue_length": executor.qsize(),
+                            "build_number": BUILD_NUMBER  # Add build number to response
+                        }
+                        
+                        # Log job status as done
+                        log_job_status(job_id, {
+                            "job_status": job_status,
+                            "job_id": job_id,
+                            "queue_id": queue_id,
+                            "process_id": pid,
+                            "response": response_obj
+                        })
+                        return response_obj, response[2]
+
+                    if isinstance(response[0], StreamingResult):
+                        # The route only set up the stream; its work runs while the body is sent
+                        return stream_job(response[0], context, lane, request.path, finish)
+
+                    return finish(response)
+                else:
+                    # Log job status as queued
                     log_job_status(job_id, {
-                        "job_status": "done",
+                        "job_status": "queued",
                         "job_id": job_id,
                         "queue_id": queue_id,
                         "process_id": pid,
-                        "response": response_obj
+                        "response": None
                     })
                     
-                    return response_obj, response[2]
-                else:
-                    if MAX_QUEUE_LENGTH > 0 and task_queue.qsize() >= MAX_QUEUE_LENGTH:
+                    # The length check and insert are atomic, so the limit is global across workers
+                    job = new_job(job_id, f, data, request.path, args, kwargs, lane, resolve_timeout())
+                    if not executor.submit(job, MAX_QUEUE_LENGTH):
                         error_response = {
                             "code": 429,
                             "id": data.get("id"),
@@ -287,7 +457,7 @@ def create_app():
                             "message": f"MAX_QUEUE_LENGTH ({MAX_QUEUE_LENGTH}) reached",
                             "pid": pid,
                             "queue_id": queue_id,
-                            "queue_length": task_queue.qsize(),
+                            "queue_length": executor.qsize(),
                             "build_number": BUILD_NUMBER  # Add build number to response
                         }
                         
@@ -302,17 +472,6 @@ def create_app():
                         
                         return error_response, 429
                     
-                    # Log job status as queued
-                    log_job_status(job_id, {
-                        "job_status": "queued",
-                        "job_id": job_id,
-                        "queue_id": queue_id,
-                        "process_id": pid,
-                        "response": None
-                    })
-                    
-                    task_queue.put((job_id, data, lambda: f(job_id=job_id, data=data, *args, **kwargs), start_time))
-                    
                     return {
                         "code": 202,
                         "id": data.get("id"),
@@ -320,14 +479,16 @@ def create_app():
                         "message": "processing",
                         "pid": pid,
                         "queue_id": queue_id,
+                        "lane": job["lane"],
                         "max_queue_length": MAX_QUEUE_LENGTH if MAX_QUEUE_LENGTH > 0 else "unlimited",
-                        "queue_length": task_queue.qsize(),
+                        "queue_length": executor.qsize(),
                         "build_number": BUILD_NUMBER  # Add build number to response
                     }, 202
             return wrapper
         return decorator
 
     app.queue_task = queue_task
+    app.job_executor = executor
 
     # Serve OpenAPI spec
     @app.route('/static/openapi.yaml')
@@ -345,6 +506,14 @@ def create_app():
     # Use the discover_and_register_blueprints function to register all blueprints
     discover_and_register_blueprints(app)
 
+    # Start processing the queue in background threads once every route function is
+    # registered, replaying jobs left queued or interrupted by a previous worker
+    register_endpoints(app)
+    # With PRELOAD_MODELS the app is built in the gunicorn master, whose threads don't
+    # survive fork; the executor then starts in each worker and the models load here
+    preload.after_fork(executor.start)
+    preload.load_models()
+
     # Configure Swagger UI with static OpenAPI spec
     SWAGGER_URL = '/api/docs'
     API_URL = '/static/openapi.yaml'
@@ -365,4 +534,7 @@ def create_app():
 app = create_app()
 
 if __name__ == '__main__':
+    # Under gunicorn this runs in the post_worker_init hook
+    from services.model_registry import start_warmup
+    start_warmup()
     app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
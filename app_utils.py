@@ -14,17 +14,24 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
-
-
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from functools import wraps
 import jsonschema
-import os
-import json
 import time
-from config import LOCAL_STORAGE_PATH
+from services.job_store import get_job_store
+from services.job_queue import register_task
+
+# Job control fields accepted by every endpoint on top of its own payload
+JOB_CONTROL_PROPERTIES = {
+    "timeout": {"type": "number", "exclusiveMinimum": 0}
+}
 
 def validate_payload(schema):
+    # Routes that define their own "timeout" (e.g. a page load timeout) keep its meaning
+    job_timeout_field = "properties" in schema and "timeout" not in schema["properties"]
+    if job_timeout_field:
+        schema = {**schema, "properties": {**schema["properties"], **JOB_CONTROL_PROPERTIES}}
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -34,37 +41,39 @@ def validate_payload(schema):
                 jsonschema.validate(instance=request.json, schema=schema)
             except jsonschema.exceptions.ValidationError as validation_error:
                 return jsonify({"message": f"Invalid payload: {validation_error.message}"}), 400
-            
+
+            # Picked up by queue_task to limit how long the job may run
+            g.job_timeout = request.json.get("timeout") if job_timeout_field else None
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
 def log_job_status(job_id, data):
     """
-    Log job status to a file in the STORAGE_PATH/jobs folder
+    Log job status to the configured job store (SQLite by default)
     
     Args:
         job_id (str): The unique job ID
-        data (dict): Data to write to the log file
+        data (dict): Job status data to store
     """
-    jobs_dir = os.path.join(LOCAL_STORAGE_PATH, 'jobs')
-    
-    # Create jobs directory if it doesn't exist
-    if not os.path.exists(jobs_dir):
-        os.makedirs(jobs_dir, exist_ok=True)
-    
-    # Create or update the job log file
-    job_file = os.path.join(jobs_dir, f"{job_id}.json")
-    
-    # Write data directly to file
-    with open(job_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    get_job_store().save(job_id, data)
+
+def queue_task_wrapper(bypass_queue=False, lane=None):
+    """
+    Run a route function directly or through the job queue.
 
-def queue_task_wrapper(bypass_queue=False):
+    Args:
+        bypass_queue (bool): Always run synchronously, even with a webhook_url
+        lane (str, optional): Concurrency class ("heavy-ml", "encode" or "light-io").
+            Queued jobs without a lane run in the encode lane; synchronous requests
+            without a lane are not limited.
+    """
     def decorator(f):
+        # Make the route function resolvable by key for jobs run from the shared queue
+        register_task(f)
         @wraps(f)
         def wrapper(*args, **kwargs):
-            return current_app.queue_task(bypass_queue=bypass_queue)(f)(*args, **kwargs)
+            return current_app.queue_task(bypass_queue=bypass_queue, lane=lane)(f)(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -0,0 +1,176 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+"""
+Compare the speed and word error rate of the transcription backends on sample clips.
+
+Usage:
+    python benchmark_transcription.py clips/ --backends whisper,faster-whisper --model base
+
+Every audio or video file in the given paths is transcribed by each backend. A
+text file with the same name (clip.mp3 -> clip.txt) is used as the reference
+transcript; clips without one are scored against the first backend's output.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+MEDIA_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.flac', '.ogg', '.opus', '.webm', '.mp4', '.mkv', '.mov'}
+
+def find_clips(paths):
+    """Return the media files in paths, expanding directories."""
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS:
+                    clips.append(os.path.join(path, name))
+        else:
+            clips.append(path)
+    return clips
+
+def read_reference(clip):
+    """Return the reference transcript next to clip, or None."""
+    path = os.path.splitext(clip)[0] + '.txt'
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return None
+
+def get_duration(path):
+    """Return the duration of a media file in seconds."""
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path]
+    return float(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+
+def normalize(text):
+    """Lowercase and strip punctuation so only word differences count."""
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance between two texts divided by the reference length."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def benchmark(clips, backends, model_name, language=None, runs=1):
+    """Transcribe every clip with every backend and return one row per backend and clip."""
+    import numpy as np
+    from services.transcription_backend import transcribe
+
+    options = {"word_timestamps": False, "verbose": None}
+    if language:
+        options["language"] = language
+
+    rows = []
+    texts = {}
+    for backend in backends:
+        # The first call loads the model; time it apart from transcription
+        start_time = time.time()
+        transcribe(np.zeros(16000, dtype=np.float32), model_name, backend, **options)
+        load_seconds = time.time() - start_time
+        print(f"{backend}: loaded {model_name} in {load_seconds:.2f}s", file=sys.stderr)
+
+        for clip in clips:
+            timings = []
+            for _ in range(runs):
+                start_time = time.time()
+                result = transcribe(clip, model_name, backend, **options)
+                timings.append(time.time() - start_time)
+            texts[(backend, clip)] = result['text']
+            duration = get_duration(clip)
+            seconds = min(timings)
+            rows.append({
+                "backend": backend,
+                "clip": os.path.basename(clip),
+                "duration": round(duration, 2),
+                "seconds": round(seconds, 3),
+                "realtime_factor": round(duration / seconds, 2) if seconds > 0 else None,
+                "load_seconds": round(load_seconds, 2)
+            })
+
+    for row, clip in zip(rows, [c for _ in backends for c in clips]):
+        reference = read_reference(clip)
+        row["reference"] = "transcript" if reference is not None else backends[0]
+        if reference is None:
+            reference = texts[(backends[0], clip)]
+        row["wer"] = round(word_error_rate(reference, texts[(row["backend"], clip)]), 4)
+    return rows
+
+def summarize(rows, backends):
+    """Total duration, time and mean WER per backend."""
+    summary = []
+    for backend in backends:
+        backend_rows = [row for row in rows if row["backend"] == backend]
+        duration = sum(row["duration"] for row in backend_rows)
+        seconds = sum(row["seconds"] for row in backend_rows)
+        summary.append({
+            "backend": backend,
+            "clips": len(backend_rows),
+            "audio_seconds": round(duration, 2),
+            "seconds": round(seconds, 3),
+            "realtime_factor": round(duration / seconds, 2) if seconds > 0 else None,
+            "mean_wer": round(sum(row["wer"] for row in backend_rows) / len(backend_rows), 4) if backend_rows else None
+        })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcription backends on sample clips")
+    parser.add_argument('paths', nargs='+', help="Media files or directories of clips")
+    parser.add_argument('--backends', default='whisper,faster-whisper', help="Comma-separated backends to compare")
+    parser.add_argument('--model', default=None, help="Model size (WHISPER_MODEL by default)")
+    parser.add_argument('--language', default=None, help="Language of the clips (detected when omitted)")
+    parser.add_argument('--runs', type=int, default=1, help="Runs per clip; the fastest one counts")
+    parser.add_argument('--json', dest='json_path', default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    clips = find_clips(args.paths)
+    if not clips:
+        print("No clips found", file=sys.stderr)
+        sys.exit(1)
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+
+    rows = benchmark(clips, backends, args.model, args.language, max(1, args.runs))
+    summary = summarize(rows, backends)
+
+    print(f"{'backend':<16}{'clip':<32}{'duration':>10}{'seconds':>10}{'x realtime':>12}{'WER':>8}")
+    for row in rows:
+        print(f"{row['backend']:<16}{row['clip'][:31]:<32}{row['duration']:>10.2f}{row['seconds']:>10.3f}"
+              f"{row['realtime_factor'] or 0:>12.2f}{row['wer']:>8.3f}")
+    print()
+    for item in summary:
+        print(f"{item['backend']}: {item['clips']} clips, {item['audio_seconds']}s of audio in {item['seconds']}s "
+              f"({item['realtime_factor']}x realtime), mean WER {item['mean_wer']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"rows": rows, "summary": summary}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,12 @@ LOCAL_STORAGE_PATH = os.environ.get('LOCAL_STORAGE_PATH', '/tmp')
 GCP_SA_CREDENTIALS = os.environ.get('GCP_SA_CREDENTIALS', '')
 GCP_BUCKET_NAME = os.environ.get('GCP_BUCKET_NAME', '')
 
+# Output uploads: files larger than one part are sent as concurrent multipart uploads
+UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', 64 * 1024 * 1024))
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 8))
+# 'auto' keeps the SDK default, 'none' skips optional checksums, or an algorithm such as crc32c
+UPLOAD_CHECKSUM = os.environ.get('UPLOAD_CHECKSUM', 'auto').lower()
+
 def validate_env_vars(provider):
 
     """ Validate the necessary environment variables for the selected storage provider """
@@ -28,6 +28,12 @@ import json
 import requests
 import time
 
+# Opt-in: build the app and load the PRELOAD_MODELS in the master, so workers share
+# the model weights copy-on-write instead of each loading their own copy
+preload_app = bool(os.environ.get('PRELOAD_MODELS', '').strip())
+if preload_app:
+    os.environ['GUNICORN_PRELOAD_APP'] = '1'
+
 def cloud_run_job_task():
     """Execute a single job request and shut down."""
     path = os.environ.get("GCP_JOB_PATH")
@@ -115,3 +121,15 @@ def when_ready(server):
         import threading
         thread = threading.Thread(target=cloud_run_job_task)
         thread.start()
+
+
+def post_worker_init(worker):
+    """Hook called in each worker after the app is loaded: start what the preloaded master deferred, warm up the configured models."""
+    from services import preload
+    from services.model_registry import start_warmup
+    preload.run_after_fork()
+    start_warmup()
+    try:
+        worker.log.info(f"Worker {os.getpid()} memory at startup: {preload.memory_report()}")
+    except Exception as e:
+        worker.log.warning(f"Could not report worker memory: {e}")
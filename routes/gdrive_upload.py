@@ -29,6 +29,7 @@ from datetime import datetime
 import time
 import psutil
 from services.authentication import authenticate
+from services.client_registry import get_client
 from app_utils import validate_payload, queue_task_wrapper
 
 # Configure logging
@@ -56,21 +57,27 @@ class UploadProgress:
 # Global list to keep track of active uploads
 active_uploads = []
 uploads_lock = threading.Lock()
+# Serializes token refreshes of the shared delegated credentials
+token_lock = threading.Lock()
 
-def get_access_token():
-    """
-    Retrieves an access token for Google APIs using service account credentials.
-    """
+def _create_delegated_credentials():
     credentials_info = json.loads(GCP_SA_CREDENTIALS)
     credentials = Credentials.from_service_account_info(
         credentials_info,
         scopes=['https://www.googleapis.com/auth/drive']
     )
-    delegated_credentials = credentials.with_subject(GDRIVE_USER)
-    if not delegated_credentials.valid or delegated_credentials.expired:
-        delegated_credentials.refresh(Request())
-    access_token = delegated_credentials.token
-    return access_token
+    return credentials.with_subject(GDRIVE_USER)
+
+def get_access_token():
+    """
+    Retrieves an access token for Google APIs using service account credentials.
+    The credentials are built once per process and only refreshed when the token expires.
+    """
+    delegated_credentials = get_client(('gdrive', GCP_SA_CREDENTIALS, GDRIVE_USER), _create_delegated_credentials)
+    with token_lock:
+        if not delegated_credentials.valid or delegated_credentials.expired:
+            delegated_credentials.refresh(Request())
+        return delegated_credentials.token
 
 def initiate_resumable_upload(filename, folder_id, mime_type='application/octet-stream'):
     """
@@ -175,7 +182,7 @@ def upload_file_in_chunks(file_url, upload_url, total_size, job_id, chunk_size):
     "required": ["file_url", "filename", "folder_id"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="light-io")
 def gdrive_upload(job_id, data):
     logger.info(f"Processing Job ID: {job_id}")
 
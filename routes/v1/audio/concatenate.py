@@ -31,7 +31,7 @@ logger = logging.getLogger(__name__)
         "additionalProperties": False,
     }
 )
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def combine_audio(job_id, data):
     media_urls = data["audio_urls"]
     webhook_url = data.get("webhook_url")
@@ -29,7 +29,7 @@ logger = logging.getLogger(__name__)
         "additionalProperties": False,
     }
 )
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def loop_audio(job_id, data):
     """
     Loop an audio file multiple times
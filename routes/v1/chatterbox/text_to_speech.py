@@ -58,7 +58,7 @@ logger = logging.getLogger(__name__)
         "additionalProperties": False,
     }
 )
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def generate_speech(job_id, data):
     """
     Generate speech from text using Chatterbox TTS
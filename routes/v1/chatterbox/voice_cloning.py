@@ -63,7 +63,7 @@ logger = logging.getLogger(__name__)
         "additionalProperties": False,
     }
 )
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def clone_voice(job_id, data):
     """
     Generate speech with voice cloning using Chatterbox TTS
@@ -104,7 +104,7 @@ logger = logging.getLogger(__name__)
     "not": {"required": ["url", "html"]},
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def screenshot(job_id, data):
     logger.info(f"Job {job_id}: Received screenshot request for {data.get('url')}")
     try:
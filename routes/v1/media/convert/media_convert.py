@@ -20,6 +20,7 @@ import logging
 from services.v1.media.convert.media_convert import process_media_convert
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
+from services.streaming_upload import can_stream_upload
 import os
 
 v1_media_convert_bp = Blueprint('v1_media_convert', __name__)
@@ -43,7 +44,7 @@ logger = logging.getLogger(__name__)
     "required": ["media_url", "format"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def convert_media_format(job_id, data):
     media_url = data['media_url']
     output_format = data['format']
@@ -58,6 +59,8 @@ def convert_media_format(job_id, data):
     logger.info(f"Job {job_id}: Received media conversion request for media URL: {media_url} to format: {output_format}")
 
     try:
+        # Streamable formats are uploaded during the encode when STREAMING_UPLOAD is on
+        stream_upload = can_stream_upload(output_format)
         output_file = process_media_convert(
             media_url, 
             job_id, 
@@ -67,11 +70,12 @@ def convert_media_format(job_id, data):
             video_crf,
             audio_codec,
             audio_bitrate,
-            webhook_url
+            webhook_url,
+            stream_upload
         )
         logger.info(f"Job {job_id}: Media format conversion completed successfully")
 
-        cloud_url = upload_file(output_file)
+        cloud_url = output_file if stream_upload else upload_file(output_file)
         logger.info(f"Job {job_id}: Converted media uploaded to cloud storage: {cloud_url}")
         
         return cloud_url, "/v1/media/convert", 200
@@ -23,6 +23,7 @@ import logging
 from services.v1.media.convert.media_to_mp3 import process_media_to_mp3
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
+from services.streaming_upload import can_stream_upload
 import os
 
 v1_media_convert_mp3_bp = Blueprint('v1_media_convert_mp3', __name__)
@@ -43,7 +44,7 @@ logger = logging.getLogger(__name__)
     "required": ["media_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def convert_media_to_mp3(job_id, data):
     media_url = data['media_url']
     webhook_url = data.get('webhook_url')
@@ -54,10 +55,11 @@ def convert_media_to_mp3(job_id, data):
     logger.info(f"Job {job_id}: Received media-to-mp3 request for media URL: {media_url}")
 
     try:
-        output_file = process_media_to_mp3(media_url, job_id, bitrate, sample_rate)
+        stream_upload = can_stream_upload('mp3')
+        output_file = process_media_to_mp3(media_url, job_id, bitrate, sample_rate, stream_upload)
         logger.info(f"Job {job_id}: Media conversion process completed successfully")
 
-        cloud_url = upload_file(output_file)
+        cloud_url = output_file if stream_upload else upload_file(output_file)
         logger.info(f"Job {job_id}: Converted media uploaded to cloud storage: {cloud_url}")
 
         return cloud_url, "/v1/media/transform/mp3", 200
@@ -81,7 +81,7 @@ logger = logging.getLogger(__name__)
     "required": ["media_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="light-io")
 def download_media(job_id, data):
     media_url = data['media_url']
     cookie = data.get('cookie')
@@ -93,7 +93,7 @@ logger = logging.getLogger(__name__)
 
 })
 
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def generate_ass_v1(job_id, data):
     media_url = data['media_url']
     settings = data.get('settings', {})
@@ -20,13 +20,77 @@ from flask import Blueprint
 from app_utils import *
 import logging
 import os
-from services.v1.media.media_transcribe import process_transcribe_media
+from concurrent.futures import ThreadPoolExecutor
+from services.v1.media.media_transcribe import process_transcribe_media, stream_transcribe_media, stream_transcribe_batch
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
+from services.response_stream import StreamingResult
+from services.webhook import send_webhook
 
 v1_media_transcribe_bp = Blueprint('v1_media_transcribe', __name__)
 logger = logging.getLogger(__name__)
 
+def _transcription_response(result, response_type, include_text, include_srt, include_segments):
+    """Build the response payload from the values process_transcribe_media returns."""
+    # If the result is a file path, upload it using the unified upload_file() method
+    if response_type == "direct":
+       
+        result_json = {
+            "text": result[0],
+            "srt": result[1],
+            "segments": result[2],
+            "text_url": None,
+            "srt_url": None,
+            "segments_url": None,
+        }
+        if result[3] is not None:
+            result_json["vad"] = result[3]
+
+        return result_json
+
+    else:
+
+        cloud_urls = {
+            "text": None,
+            "srt": None,
+            "segments": None,
+            "text_url": upload_file(result[0]) if include_text is True else None,
+            "srt_url": upload_file(result[1]) if include_srt is True else None,
+            "segments_url": upload_file(result[2]) if include_segments is True else None,
+        }
+        if result[3] is not None:
+            cloud_urls["vad"] = result[3]
+
+        if include_text is True:
+            os.remove(result[0])  # Remove the temporary file after uploading
+        
+        if include_srt is True:
+            os.remove(result[1])
+
+        if include_segments is True:
+            os.remove(result[2])
+        
+        return cloud_urls
+
+def _transcription_events(job_id, args, response_type, include_text, include_srt, include_segments):
+    """Yield ("segment", segment) while transcribing, then return the usual route response."""
+    events = stream_transcribe_media(*args)
+    try:
+        while True:
+            try:
+                segment = next(events)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            yield "segment", segment
+        logger.info(f"Job {job_id}: Transcription process completed successfully")
+        return _transcription_response(result, response_type, include_text, include_srt, include_segments), "/v1/transcribe/media", 200
+    except Exception as e:
+        logger.error(f"Job {job_id}: Error during transcription process - {str(e)}")
+        return str(e), "/v1/transcribe/media", 500
+    finally:
+        events.close()
+
 @v1_media_transcribe_bp.route('/v1/media/transcribe', methods=['POST'])
 @authenticate
 @validate_payload({
@@ -42,12 +106,18 @@ logger = logging.getLogger(__name__)
         "language": {"type": "string"},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"},
-        "words_per_line": {"type": "integer", "minimum": 1}
+        "words_per_line": {"type": "integer", "minimum": 1},
+        "chunk_duration": {"type": "number", "minimum": 30},
+        "chunk_workers": {"type": "integer", "minimum": 1, "maximum": 16},
+        "vad": {"type": "string", "enum": ["energy", "silencedetect"]},
+        "stream": {"type": "string", "enum": ["ndjson", "sse"]}
     },
     "required": ["media_url"],
+    # Streamed media is transcribed in one pass
+    "not": {"anyOf": [{"required": ["stream", "chunk_duration"]}, {"required": ["stream", "chunk_workers"]}]},
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def transcribe(job_id, data):
     media_url = data['media_url']
     task = data.get('task', 'transcribe')
@@ -60,49 +130,114 @@ def transcribe(job_id, data):
     webhook_url = data.get('webhook_url')
     id = data.get('id')
     words_per_line = data.get('words_per_line', None)
+    chunk_duration = data.get('chunk_duration', None)
+    chunk_workers = data.get('chunk_workers', None)
+    vad = data.get('vad', None)
+
+    stream = data.get('stream', None)
 
     logger.info(f"Job {job_id}: Received transcription request for {media_url}")
 
+    args = (media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line, chunk_duration, chunk_workers, vad)
+    if stream:
+        # Segments are sent as they are transcribed, followed by the usual response object
+        return StreamingResult(
+            _transcription_events(job_id, args, response_type, include_text, include_srt, include_segments), stream
+        ), "/v1/transcribe/media", 200
+
     try:
-        result = process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line)
+        result = process_transcribe_media(*args)
         logger.info(f"Job {job_id}: Transcription process completed successfully")
 
-        # If the result is a file path, upload it using the unified upload_file() method
-        if response_type == "direct":
-           
-            result_json = {
-                "text": result[0],
-                "srt": result[1],
-                "segments": result[2],
-                "text_url": None,
-                "srt_url": None,
-                "segments_url": None,
-            }
-
-            return result_json, "/v1/transcribe/media", 200
-
-        else:
-
-            cloud_urls = {
-                "text": None,
-                "srt": None,
-                "segments": None,
-                "text_url": upload_file(result[0]) if include_text is True else None,
-                "srt_url": upload_file(result[1]) if include_srt is True else None,
-                "segments_url": upload_file(result[2]) if include_segments is True else None,
-            }
-
-            if include_text is True:
-                os.remove(result[0])  # Remove the temporary file after uploading
-            
-            if include_srt is True:
-                os.remove(result[1])
-
-            if include_segments is True:
-                os.remove(result[2])
-            
-            return cloud_urls, "/v1/transcribe/media", 200
+        return _transcription_response(result, response_type, include_text, include_srt, include_segments), "/v1/transcribe/media", 200
 
     except Exception as e:
         logger.error(f"Job {job_id}: Error during transcription process - {str(e)}")
         return str(e), "/v1/transcribe/media", 500
+
+def _batch_events(job_id, data, media_urls, args, response_type, include_text, include_srt, include_segments):
+    """Yield ("item", item) as each clip is done, then return the response with every item."""
+    webhook_url = data.get('webhook_url')
+    item_webhooks = webhook_url and data.get('item_webhooks', True)
+    # One thread keeps the item webhooks in order without holding up transcription
+    webhooks = ThreadPoolExecutor(max_workers=1) if item_webhooks else None
+    items = [None] * len(media_urls)
+    events = stream_transcribe_batch(*args)
+    try:
+        for index, result in events:
+            item = {"index": index, "media_url": media_urls[index]}
+            if isinstance(result, Exception):
+                item.update({"code": 500, "response": None, "message": str(result)})
+            else:
+                try:
+                    response = _transcription_response(result, response_type, include_text, include_srt, include_segments)
+                    item.update({"code": 200, "response": response, "message": "success"})
+                except Exception as e:
+                    item.update({"code": 500, "response": None, "message": str(e)})
+            items[index] = item
+            if webhooks is not None:
+                webhooks.submit(send_webhook, webhook_url, dict(item, event="item", id=data.get('id'), job_id=job_id))
+            yield "item", item
+
+        failed = sum(1 for item in items if item["code"] != 200)
+        logger.info(f"Job {job_id}: Batch transcription completed, {len(items) - failed} of {len(items)} items succeeded")
+        return {"items": items, "succeeded": len(items) - failed, "failed": failed}, "/v1/media/transcribe/batch", 200
+    except Exception as e:
+        logger.error(f"Job {job_id}: Error during batch transcription - {str(e)}")
+        return str(e), "/v1/media/transcribe/batch", 500
+    finally:
+        events.close()
+        if webhooks is not None:
+            webhooks.shutdown(wait=True)
+
+@v1_media_transcribe_bp.route('/v1/media/transcribe/batch', methods=['POST'])
+@authenticate
+@validate_payload({
+    "type": "object",
+    "properties": {
+        "media_urls": {
+            "type": "array",
+            "items": {"type": "string", "format": "uri"},
+            "minItems": 1,
+            "maxItems": 1000
+        },
+        "task": {"type": "string", "enum": ["transcribe", "translate"]},
+        "include_text": {"type": "boolean"},
+        "include_srt": {"type": "boolean"},
+        "include_segments": {"type": "boolean"},
+        "word_timestamps": {"type": "boolean"},
+        "response_type": {"type": "string", "enum": ["direct", "cloud"]},
+        "language": {"type": "string"},
+        "webhook_url": {"type": "string", "format": "uri"},
+        "item_webhooks": {"type": "boolean"},
+        "id": {"type": "string"},
+        "words_per_line": {"type": "integer", "minimum": 1},
+        "stream": {"type": "string", "enum": ["ndjson", "sse"]}
+    },
+    "required": ["media_urls"],
+    "additionalProperties": False
+})
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
+def transcribe_batch(job_id, data):
+    media_urls = data['media_urls']
+    task = data.get('task', 'transcribe')
+    include_text = data.get('include_text', True)
+    include_srt = data.get('include_srt', False)
+    include_segments = data.get('include_segments', False)
+    word_timestamps = data.get('word_timestamps', False)
+    response_type = data.get('response_type', 'direct')
+    language = data.get('language', None)
+    words_per_line = data.get('words_per_line', None)
+
+    stream = data.get('stream', None)
+
+    logger.info(f"Job {job_id}: Received batch transcription request for {len(media_urls)} media URLs")
+
+    args = (media_urls, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line)
+    events = StreamingResult(
+        _batch_events(job_id, data, media_urls, args, response_type, include_text, include_srt, include_segments), stream or "ndjson"
+    )
+    if stream:
+        # Items are sent as they finish, followed by the usual response object
+        return events, "/v1/media/transcribe/batch", 200
+    return events.drain()
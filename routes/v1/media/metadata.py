@@ -40,7 +40,7 @@ v1_media_metadata_bp = Blueprint('v1_media_metadata', __name__)
     "required": ["media_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=True)  # Set to execute immediately instead of queueing
+@queue_task_wrapper(bypass_queue=True, lane="light-io")  # Set to execute immediately instead of queueing
 def media_metadata(job_id, data):
     """
     Extract metadata from a media file, including video and audio properties.
@@ -42,7 +42,7 @@ logger = logging.getLogger(__name__)
     "required": ["media_url", "duration"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def silence(job_id, data):
     """Detect silence in a media file and return the silence intervals."""
     media_url = data['media_url']
@@ -39,7 +39,7 @@ v1_s3_upload_bp = Blueprint('v1_s3_upload', __name__)
     },
     "required": ["file_url"]
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="light-io")
 def s3_upload_endpoint(job_id, data):
     try:
         file_url = data.get('file_url')
@@ -0,0 +1,44 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import logging
+from flask import Blueprint
+from services.authentication import authenticate
+from services.download_cache import get_download_cache
+from services.transcription_cache import get_transcription_cache
+from app_utils import queue_task_wrapper
+
+v1_toolkit_cache_stats_bp = Blueprint('v1_toolkit_cache_stats', __name__)
+logger = logging.getLogger(__name__)
+
+@v1_toolkit_cache_stats_bp.route('/v1/toolkit/cache/stats', methods=['GET'])
+@authenticate
+@queue_task_wrapper(bypass_queue=True)
+def get_cache_stats(job_id, data):
+    endpoint = "/v1/toolkit/cache/stats"
+    try:
+        download_cache = get_download_cache()
+        transcription_cache = get_transcription_cache()
+        return {
+            "downloads": download_cache.stats() if download_cache is not None else None,
+            "transcriptions": transcription_cache.stats() if transcription_cache is not None else None
+        }, endpoint, 200
+
+    except Exception as e:
+        logger.error(f"Error retrieving cache stats: {str(e)}")
+        return {"error": f"Failed to retrieve cache stats: {str(e)}"}, endpoint, 500
@@ -0,0 +1,65 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import logging
+from flask import Blueprint, current_app
+from services.authentication import authenticate
+from services.job_store import get_job_store
+from app_utils import queue_task_wrapper, validate_payload
+
+v1_toolkit_job_cancel_bp = Blueprint('v1_toolkit_job_cancel', __name__)
+logger = logging.getLogger(__name__)
+
+@v1_toolkit_job_cancel_bp.route('/v1/toolkit/job/cancel', methods=['POST'])
+@authenticate
+@validate_payload({
+    "type": "object",
+    "properties": {
+        "job_id": {
+            "type": "string"
+        }
+    },
+    "required": ["job_id"],
+})
+@queue_task_wrapper(bypass_queue=True)
+def cancel_job(job_id, data):
+
+    cancel_job_id = data.get('job_id')
+
+    logger.info(f"Cancelling job {cancel_job_id}")
+    endpoint = "/v1/toolkit/job/cancel"
+    try:
+        job_status = get_job_store().get(cancel_job_id)
+
+        if job_status is None:
+            return {"error": "Job not found", "job_id": cancel_job_id}, endpoint, 404
+
+        if job_status.get("job_status") not in ("queued", "running", "retried"):
+            return {
+                "error": f"Job is not queued or running (status: {job_status.get('job_status')})",
+                "job_id": cancel_job_id
+            }, endpoint, 409
+
+        # Queued jobs are removed, running ones have their process tree killed
+        result = current_app.job_executor.cancel(cancel_job_id)
+
+        return {"job_id": cancel_job_id, "job_status": result}, endpoint, 200
+
+    except Exception as e:
+        logger.error(f"Error cancelling job {cancel_job_id}: {str(e)}")
+        return {"error": f"Failed to cancel job: {str(e)}"}, endpoint, 500
@@ -16,12 +16,10 @@
 
 
 
-import os
-import json
 import logging
 from flask import Blueprint, request
-from config import LOCAL_STORAGE_PATH
 from services.authentication import authenticate
+from services.job_store import get_job_store
 from app_utils import queue_task_wrapper, validate_payload
 
 v1_toolkit_job_status_bp = Blueprint('v1_toolkit_job_status', __name__)
@@ -46,17 +44,12 @@ def get_job_status(job_id, data):
     logger.info(f"Retrieving status for job {get_job_id}")
     endpoint = "/v1/toolkit/job/status"
     try:
-        # Construct the path to the job status file
-        job_file_path = os.path.join(LOCAL_STORAGE_PATH, 'jobs', f"{get_job_id}.json")
+        # Point lookup in the job store
+        job_status = get_job_store().get(get_job_id)
         
-        # Check if the job file exists
-        if not os.path.exists(job_file_path):
+        if job_status is None:
             return {"error": "Job not found", "job_id": get_job_id}, endpoint, 404
         
-        # Read the job status file
-        with open(job_file_path, 'r') as file:
-            job_status = json.load(file)
-        
         # Return the job status file content directly
         return job_status, endpoint, 200
         
@@ -16,13 +16,11 @@
 
 
 
-import os
-import json
 import logging
 import time
 from flask import Blueprint, request
-from config import LOCAL_STORAGE_PATH
 from services.authentication import authenticate
+from services.job_store import get_job_store
 from app_utils import queue_task_wrapper, validate_payload
 
 v1_toolkit_jobs_status_bp = Blueprint('v1_toolkit_jobs_status', __name__)
@@ -53,34 +51,12 @@ def get_all_jobs_status(job_id, data):
             
         cutoff_time = time.time() - since_seconds
         
-        # Construct the path to the jobs directory
-        jobs_dir = os.path.join(LOCAL_STORAGE_PATH, 'jobs')
-        
-        # Check if the jobs directory exists
-        if not os.path.exists(jobs_dir):
+        # Indexed range query on the job store's updated_at column
+        try:
+            jobs_status = get_job_store().list_statuses(cutoff_time)
+        except FileNotFoundError:
             return {"error": "Jobs directory not found"}, endpoint, 404
         
-        # Dictionary to store job statuses
-        jobs_status = {}
-        
-        # Iterate through job files in the directory
-        for filename in os.listdir(jobs_dir):
-            if filename.endswith('.json'):
-                job_file_path = os.path.join(jobs_dir, filename)
-                file_mod_time = os.path.getmtime(job_file_path)
-                
-                # Check if the file was modified within the time range
-                if file_mod_time >= cutoff_time:
-                    job_id = filename.split('.')[0]  # Remove .json extension to get job_id
-                    
-                    # Read the job status file
-                    with open(job_file_path, 'r') as file:
-                        job_data = json.load(file)
-                        
-                        # Only include the job_status field, not the response
-                        if "job_status" in job_data:
-                            jobs_status[job_id] = job_data["job_status"]
-        
         # Return the job statuses
         return jobs_status, endpoint, 200
         
@@ -39,7 +39,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url", "audio_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def add_audio_to_video(job_id, data):
     """
     Add or replace audio track in a video file.
@@ -130,7 +130,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url", "text"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def add_tts_with_captions(job_id, data):
     """
     Add TTS audio and karaoke captions to video in one step
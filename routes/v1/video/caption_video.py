@@ -104,7 +104,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="heavy-ml")
 def caption_video_v1(job_id, data):
     video_url = data['video_url']
     captions = data.get('captions')
@@ -159,11 +159,12 @@ def caption_video_v1(job_id, data):
         # Render the video with subtitles using FFmpeg
         try:
             import ffmpeg
-            ffmpeg.input(video_path).output(
+            from services.job_control import run_ffmpeg
+            run_ffmpeg(ffmpeg.input(video_path).output(
                 output_path,
                 vf=f"subtitles='{ass_path}'",
                 acodec='copy'
-            ).run(overwrite_output=True)
+            ), overwrite_output=True)
             logger.info(f"Job {job_id}: FFmpeg processing completed. Output saved to {output_path}")
         except Exception as e:
             logger.error(f"Job {job_id}: FFmpeg error: {str(e)}")
@@ -55,7 +55,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url", "cuts"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def video_cut(job_id, data):
     """Cut specified segments from a video file with optional encoding settings."""
     video_url = data['video_url']
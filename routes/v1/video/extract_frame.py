@@ -56,7 +56,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="light-io")
 def extract_frame(job_id, data):
     """
     Extract a specific frame from a video
@@ -44,7 +44,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url", "loop_count"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def loop_video(job_id, data):
     """
     Loop a video file multiple times
@@ -55,7 +55,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url", "splits"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def video_split(job_id, data):
     """Split a video file into multiple segments with optional encoding settings."""
     video_url = data['video_url']
@@ -43,7 +43,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="light-io")
 def generate_thumbnail(job_id, data):
     video_url = data.get('video_url')
     second = data.get('second', 0)  # Default to 0 if not provided
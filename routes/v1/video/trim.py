@@ -44,7 +44,7 @@ logger = logging.getLogger(__name__)
     "required": ["video_url"],
     "additionalProperties": False
 })
-@queue_task_wrapper(bypass_queue=False)
+@queue_task_wrapper(bypass_queue=False, lane="encode")
 def video_trim(job_id, data):
     """Trim a video by removing specified portions from the beginning and/or end with optional encoding settings."""
     video_url = data['video_url']
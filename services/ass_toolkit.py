@@ -20,13 +20,14 @@ import os
 import ffmpeg
 import logging
 import subprocess
-import whisper
 from datetime import timedelta
 import srt
 import re
 from services.file_management import download_file
+from services.http_client import get_session
+from services.job_control import run_ffprobe
+from services.transcription_cache import transcribe_with_cache
 from services.cloud_storage import upload_file  # Ensure this import is present
-import requests  # Ensure requests is imported for webhook handling
 from urllib.parse import urlparse
 from config import LOCAL_STORAGE_PATH
 
@@ -64,14 +65,14 @@ def rgb_to_ass_color(rgb_color):
 
 def generate_transcription(video_path, language='auto'):
     try:
-        model = whisper.load_model("base")
         transcription_options = {
             'word_timestamps': True,
             'verbose': True,
         }
         if language != 'auto':
             transcription_options['language'] = language
-        result = model.transcribe(video_path, **transcription_options)
+        # Re-styling captions of an already transcribed video skips inference
+        result = transcribe_with_cache(video_path, **transcription_options)
         logger.info(f"Transcription generated successfully for video: {video_path}")
         return result
     except Exception as e:
@@ -80,7 +81,7 @@ def generate_transcription(video_path, language='auto'):
 
 def get_video_resolution(video_path):
     try:
-        probe = ffmpeg.probe(video_path)
+        probe = run_ffprobe(video_path)
         video_streams = [s for s in probe['streams'] if s['codec_type'] == 'video']
         if video_streams:
             width = int(video_streams[0]['width'])
@@ -167,7 +168,7 @@ def download_captions(captions_url):
     """Download captions from the given URL."""
     try:
         logger.info(f"Downloading captions from URL: {captions_url}")
-        response = requests.get(captions_url)
+        response = get_session().get(captions_url)
         response.raise_for_status()
         logger.info("Captions downloaded successfully.")
         return response.text
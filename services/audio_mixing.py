@@ -18,18 +18,18 @@
 
 import os
 import subprocess
-from services.file_management import download_file
+from services.file_management import download_files
+from services.job_control import run_subprocess
 
 STORAGE_PATH = "/tmp/"
 
 def get_duration(file_path):
     cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    result = run_subprocess(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     return float(result.stdout)
 
 def process_audio_mixing(video_url, audio_url, video_vol, audio_vol, output_length, job_id, webhook_url=None):
-    video_path = download_file(video_url, STORAGE_PATH)
-    audio_path = download_file(audio_url, STORAGE_PATH)
+    video_path, audio_path = download_files([video_url, audio_url], STORAGE_PATH)
     output_path = os.path.join(STORAGE_PATH, f"{job_id}.mp4")
 
     video_duration = get_duration(video_path)
@@ -75,10 +75,10 @@ def process_audio_mixing(video_url, audio_url, video_vol, audio_vol, output_leng
     cmd.append(output_path)
 
     # Run FFmpeg command
-    subprocess.run(cmd, check=True)
+    run_subprocess(cmd, check=True)
 
     # Clean up input files
-    os.remove(video_path)
-    os.remove(audio_path)
+    for path in {video_path, audio_path}:
+        os.remove(path)
 
     return output_path
\ No newline at end of file
@@ -0,0 +1,196 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import uuid
+import logging
+import subprocess
+from config import LOCAL_STORAGE_PATH
+from services.job_control import run_subprocess
+
+logger = logging.getLogger(__name__)
+
+# Whisper's input format, used by every analysis stage that reads prepared audio
+SAMPLE_RATE = 16000
+
+def load_samples(path, start=0, end=None):
+    """
+    Memory-map the raw float32 samples in path, optionally only samples [start, end).
+
+    The map is copy-on-write: consumers that need a writable array (torch.from_numpy)
+    get one without copying, and nothing is ever written back to the file.
+    """
+    import numpy as np
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode='c')[start:end]
+
+def sample_range(samples):
+    """
+    Return (path, start, end) when samples are a contiguous slice of a prepared audio
+    file, so another process can map the same samples instead of receiving a copy.
+
+    Returns:
+        tuple: (path, start, end) in samples, or None for arrays not backed by a file
+    """
+    import numpy as np
+    if not isinstance(samples, np.memmap) or samples.dtype != np.float32 or samples.ndim != 1 or not samples.flags.c_contiguous:
+        return None
+    root = samples
+    while isinstance(root.base, np.memmap):
+        root = root.base
+    if root.filename is None:
+        return None
+    address = samples.__array_interface__['data'][0]
+    root_address = root.__array_interface__['data'][0]
+    start = (address - root_address + root.offset) // 4
+    return root.filename, start, start + len(samples)
+
+class PreparedAudio:
+    """
+    16 kHz mono float32 samples of a media file, decoded once per job into a raw file.
+
+    The file is decoded on first access to samples, so a job served from the
+    transcription cache never decodes. Whisper, voice activity detection, silence
+    detection and level analysis all read the same memory-mapped array, and the
+    long-media pool processes map the same file instead of decoding again.
+
+    Usage:
+        with prepare_audio(input_path) as audio:
+            result = model.transcribe(audio.samples)
+    """
+
+    def __init__(self, path, media_path=None):
+        self.path = path
+        self.media_path = media_path
+        self._samples = None
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            if not os.path.exists(self.path):
+                self._decode()
+            self._samples = load_samples(self.path)
+        return self._samples
+
+    @property
+    def duration(self):
+        return len(self.samples) / SAMPLE_RATE
+
+    def _decode(self):
+        cmd = [
+            'ffmpeg', '-nostdin', '-y', '-i', self.media_path,
+            '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', self.path
+        ]
+        try:
+            run_subprocess(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        except subprocess.CalledProcessError as e:
+            self.remove()
+            raise RuntimeError(f"Failed to decode audio of {self.media_path}: {e.stderr.decode(errors='replace')[-500:]}")
+        logger.info(f"Decoded {self.media_path} to {os.path.getsize(self.path) // 4} samples at {SAMPLE_RATE} Hz")
+
+    def slice(self, start, end=None):
+        """Samples between start and end seconds, without copying."""
+        return self.samples[int(start * SAMPLE_RATE):None if end is None else int(end * SAMPLE_RATE)]
+
+    def remove(self):
+        """Unmap the samples and delete the raw file."""
+        self._samples = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.remove()
+
+def prepare_audio(media_path, output_path=None):
+    """
+    Return the prepared audio of a local media file; it is decoded when first read.
+
+    Args:
+        media_path (str): Local media file
+        output_path (str, optional): Raw float32 file to decode into
+
+    Returns:
+        PreparedAudio: Remove it (or use it as a context manager) when the job is done
+    """
+    output_path = output_path or os.path.join(LOCAL_STORAGE_PATH, f"{uuid.uuid4().hex}.f32")
+    return PreparedAudio(output_path, media_path)
+
+def audio_from_samples(samples, output_path):
+    """Write samples (e.g. only the speech of a file) as prepared audio."""
+    import numpy as np
+    np.asarray(samples, dtype=np.float32).tofile(output_path)
+    return PreparedAudio(output_path)
+
+def _parse_threshold(noise_threshold):
+    """Amplitude of a silencedetect-style threshold: "-30dB" or a ratio like 0.001."""
+    text = str(noise_threshold).strip()
+    if text.lower().endswith('db'):
+        return 10 ** (float(text[:-2]) / 20)
+    return float(text)
+
+# Seconds of samples frame_levels reads at a time, so its temporaries stay small for any length
+_LEVEL_BLOCK_SECONDS = 60
+
+def frame_levels(samples, frame_seconds=0.01):
+    """
+    Per-frame levels of 16 kHz samples.
+
+    The samples (usually a memory map) are read in blocks of _LEVEL_BLOCK_SECONDS,
+    so memory use doesn't grow with the length of the media.
+
+    Returns:
+        tuple: (rms_db, peak) float32 arrays, one value per frame of frame_seconds
+    """
+    import numpy as np
+    frame = max(1, int(SAMPLE_RATE * frame_seconds))
+    count = len(samples) // frame
+    block = max(1, int(_LEVEL_BLOCK_SECONDS / frame_seconds))
+    power = np.empty(count, dtype=np.float32)
+    peak = np.empty(count, dtype=np.float32)
+    for start in range(0, count, block):
+        end = min(count, start + block)
+        frames = np.asarray(samples[start * frame:end * frame], dtype=np.float32).reshape(end - start, frame)
+        power[start:end] = np.einsum('ij,ij->i', frames, frames) / frame
+        peak[start:end] = np.maximum(frames.max(axis=1), -frames.min(axis=1))
+    rms_db = 10 * np.log10(power + 1e-10)
+    return rms_db, peak
+
+def detect_silences(samples, noise_threshold="-30dB", min_duration=0.5, frame_seconds=0.01):
+    """
+    Find silences in 16 kHz samples like FFmpeg's silencedetect filter, without decoding again.
+
+    A frame is silent when no sample in it exceeds noise_threshold; runs of silent
+    frames lasting at least min_duration seconds are reported.
+
+    Returns:
+        list: (start, end, duration) tuples in seconds, as find_silences returns
+    """
+    import numpy as np
+    _, peak = frame_levels(samples, frame_seconds)
+    silent = np.concatenate(([False], peak < _parse_threshold(noise_threshold), [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    silences = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        duration = (end - start) * frame_seconds
+        if duration >= min_duration:
+            silences.append((start * frame_seconds, end * frame_seconds, duration))
+    return silences
@@ -0,0 +1,58 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Process-wide SDK clients, keyed by (pid, key) so a forked worker never reuses its parent's sockets
+_clients = {}
+_lock = threading.Lock()
+
+def get_client(key, factory):
+    """
+    Return the client registered under key, creating it with factory() on first use.
+
+    Clients are created once per gunicorn worker and shared by all executor threads,
+    so only use this for thread-safe clients (boto3 clients, google-cloud clients).
+    If factory raises, nothing is cached and the next call tries again.
+
+    Args:
+        key (tuple): Identifies the client and the configuration it was built from
+        factory (callable): Builds the client
+
+    Returns:
+        The cached client
+    """
+    registry_key = (os.getpid(), key)
+    client = _clients.get(registry_key)
+    if client is None:
+        with _lock:
+            client = _clients.get(registry_key)
+            if client is None:
+                client = factory()
+                _clients[registry_key] = client
+                logger.info(f"Created {key[0]} client for PID {os.getpid()}")
+    return client
+
+def reset_client(key):
+    """Drop the cached client under key, e.g. after its credentials were rotated."""
+    with _lock:
+        _clients.pop((os.getpid(), key), None)
@@ -17,11 +17,15 @@
 
 
 import os
+import io
+import time
 import logging
 from abc import ABC, abstractmethod
-from services.gcp_toolkit import upload_to_gcs
-from services.s3_toolkit import upload_to_s3
+from services.gcp_toolkit import upload_to_gcs, upload_stream_to_gcs
+from services.s3_toolkit import upload_to_s3, upload_stream_to_s3
 from config import validate_env_vars
+from services.client_registry import get_client
+from services import job_control
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
@@ -43,6 +47,11 @@ class CloudStorageProvider(ABC):
     def upload_file(self, file_path: str) -> str:
         pass
 
+    @abstractmethod
+    def upload_stream(self, stream, filename: str) -> str:
+        """Upload everything readable from a binary stream as filename."""
+        pass
+
 class GCPStorageProvider(CloudStorageProvider):
     def __init__(self):
         self.bucket_name = os.getenv('GCP_BUCKET_NAME')
@@ -50,6 +59,9 @@ class GCPStorageProvider(CloudStorageProvider):
     def upload_file(self, file_path: str) -> str:
         return upload_to_gcs(file_path, self.bucket_name)
 
+    def upload_stream(self, stream, filename: str) -> str:
+        return upload_stream_to_gcs(stream, filename, self.bucket_name)
+
 class S3CompatibleProvider(CloudStorageProvider):
     def __init__(self):
 
@@ -86,6 +98,9 @@ class S3CompatibleProvider(CloudStorageProvider):
     def upload_file(self, file_path: str) -> str:
         return upload_to_s3(file_path, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region)
 
+    def upload_stream(self, stream, filename: str) -> str:
+        return upload_stream_to_s3(stream, filename, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region)
+
 class LocalStorageProvider(CloudStorageProvider):
     """Local storage provider for testing - returns download URL"""
     def __init__(self):
@@ -104,7 +119,24 @@ class LocalStorageProvider(CloudStorageProvider):
         logger.info(f"Local storage: file available at {download_url}")
         return download_url
 
+    def upload_stream(self, stream, filename: str) -> str:
+        import shutil
+        file_path = os.path.join(self.storage_path, filename)
+        try:
+            with open(file_path, 'wb') as f:
+                shutil.copyfileobj(stream, f)
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        return self.upload_file(file_path)
+
 def get_storage_provider() -> CloudStorageProvider:
+    """Return the provider for the configured storage, created and validated once per process."""
+    settings = tuple(os.getenv(name) for name in ('S3_ENDPOINT_URL', 'S3_ACCESS_KEY', 'S3_BUCKET_NAME', 'S3_REGION', 'GCP_BUCKET_NAME'))
+    return get_client(('storage_provider',) + settings, _create_storage_provider)
+
+def _create_storage_provider() -> CloudStorageProvider:
 
     if os.getenv('S3_ENDPOINT_URL'):
 
@@ -129,10 +161,55 @@ def upload_file(file_path: str) -> str:
     provider = get_storage_provider()
     try:
         logger.info(f"Uploading file to cloud storage: {file_path}")
+        size = os.path.getsize(file_path)
+        start_time = time.time()
         url = provider.upload_file(file_path)
-        logger.info(f"File uploaded successfully: {url}")
+        elapsed = time.time() - start_time
+        logger.info(f"File uploaded successfully: {url} ({size} bytes in {elapsed:.2f}s, {size / max(elapsed, 1e-6) / 1024 ** 2:.1f} MB/s)")
+
+        # Reported as "upload_stats" in the job response
+        context = job_control.current_job()
+        if context is not None:
+            context.record_upload(size, elapsed)
         return url
     except Exception as e:
         logger.error(f"Error uploading file to cloud storage: {e}")
         raise
-    
\ No newline at end of file
+
+class _CountingReader(io.RawIOBase):
+    """Passes reads through to a stream and counts the bytes."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.stream.readinto(b)
+        self.count += n or 0
+        return n
+
+def upload_stream(stream, filename: str) -> str:
+    """
+    Upload a binary stream of unknown length (e.g. ffmpeg writing to a pipe) as filename.
+
+    The upload consumes the stream while it is being produced; a read error from the
+    stream aborts it without leaving a partial object behind.
+    """
+    provider = get_storage_provider()
+    try:
+        logger.info(f"Streaming upload to cloud storage: {filename}")
+        counter = _CountingReader(stream)
+        start_time = time.time()
+        url = provider.upload_stream(counter, filename)
+        elapsed = time.time() - start_time
+        logger.info(f"Stream uploaded successfully: {url} ({counter.count} bytes in {elapsed:.2f}s)")
+
+        context = job_control.current_job()
+        if context is not None:
+            context.record_upload(counter.count, elapsed)
+        return url
+    except Exception as e:
+        logger.error(f"Error streaming upload to cloud storage: {e}")
+        raise
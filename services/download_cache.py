@@ -0,0 +1,242 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+from config import LOCAL_STORAGE_PATH
+from services.job_store import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Byte budget of the input download cache (0 disables it)
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+
+# Linux ioctl that clones a file's extents (reflink) on btrfs, XFS and similar
+FICLONE = 0x40049409
+
+# Query parameters of presigned URLs that change on every request but not the object
+_SIGNATURE_PARAMS = {'signature', 'expires', 'awsaccesskeyid', 'googleaccessid', 'x-amz-security-token'}
+_SIGNATURE_PREFIXES = ('x-amz-', 'x-goog-')
+
+def _cache_url(url):
+    """Strip presigned-URL credentials so re-signed links to one object share a cache entry."""
+    parsed = urlparse(url)
+    query = [
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k.lower() not in _SIGNATURE_PARAMS and not k.lower().startswith(_SIGNATURE_PREFIXES)
+    ]
+    return urlunparse(parsed._replace(query=urlencode(query), fragment=''))
+
+def link_or_copy(src, dst):
+    """Hand out src at dst as a hardlink, a reflink or, failing both, a copy."""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return
+    except (OSError, ImportError):
+        pass
+    shutil.copyfile(src, dst)
+
+class DownloadCache:
+    """
+    Content-addressed cache of downloaded inputs, shared by all gunicorn workers.
+
+    Entries are keyed by the URL plus the validators the server returned (ETag,
+    Last-Modified, Content-Length), so a changed object is downloaded again.
+    Responses without an ETag or Last-Modified header are never cached.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DOWNLOAD_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or os.path.join(LOCAL_STORAGE_PATH, 'cache', 'downloads')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = open_sqlite(os.path.join(self.cache_dir, 'index.db'))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        self._conn().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def key_lock(self, key):
+        """Lock that lets one thread per process download a given key at a time."""
+        with self._key_locks_lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def key(self, url, headers):
+        """
+        Build the cache key of a response.
+
+        Args:
+            url (str): The requested URL
+            headers (Mapping): Response headers
+
+        Returns:
+            str|None: The key, or None if the response carries no validator
+        """
+        etag = headers.get('ETag', '')
+        last_modified = headers.get('Last-Modified', '')
+        if not etag and not last_modified:
+            self._count('uncacheable')
+            return None
+        # Weak and strong ETags of one object validate the same content here
+        etag = etag[2:] if etag.startswith('W/') else etag
+        material = '\n'.join([_cache_url(url), etag, last_modified, headers.get('Content-Length', '')])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def contains(self, key):
+        """Return True if key has a cached file (without counting a lookup)."""
+        row = self._conn().execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.exists(row[0])
+
+    def checkout(self, key, dst):
+        """
+        Place the cached file for key at dst.
+
+        Returns:
+            bool: True on a hit, False on a miss
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            try:
+                link_or_copy(row[0], dst)
+            except FileNotFoundError:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            else:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._count('hits')
+                return True
+        self._count('misses')
+        return False
+
+    def add(self, key, url, src):
+        """Store a freshly downloaded file under key, then evict down to the byte budget."""
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            return
+
+        path = os.path.join(self.cache_dir, key[:2], key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        link_or_copy(src, tmp_path)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, url, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, _cache_url(url), path, size, now, now)
+        )
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for key, path, size in conn.execute("SELECT key, path, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+            logger.info(f"Evicted {evicted} download cache entries, {total} bytes remain")
+        return evicted
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        conn = self._conn()
+        stats = {name: 0 for name in ('hits', 'misses', 'uncacheable', 'evictions')}
+        stats.update(dict(conn.execute("SELECT name, value FROM counters").fetchall()))
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(stats['hits'] / lookups, 3) if lookups else None
+        })
+        return stats
+
+_download_cache = None
+_download_cache_failed = False
+_download_cache_lock = threading.Lock()
+
+def get_download_cache():
+    """Return the process-wide download cache, or None when it is disabled or unusable."""
+    global _download_cache, _download_cache_failed
+
+    if DOWNLOAD_CACHE_MAX_BYTES <= 0 or _download_cache_failed:
+        return None
+    if _download_cache is None:
+        with _download_cache_lock:
+            if _download_cache is None and not _download_cache_failed:
+                try:
+                    _download_cache = DownloadCache(os.environ.get('DOWNLOAD_CACHE_DIR') or None)
+                    logger.info(f"Using download cache at {_download_cache.cache_dir} ({DOWNLOAD_CACHE_MAX_BYTES} bytes)")
+                except Exception as e:
+                    # Downloads keep working without the cache
+                    logger.error(f"Download cache disabled: {e}")
+                    _download_cache_failed = True
+    return _download_cache
@@ -17,9 +17,9 @@
 
 
 import os
-import subprocess
 import json
 from services.file_management import download_file
+from services.job_control import run_subprocess
 
 STORAGE_PATH = "/tmp/"
 
@@ -38,7 +38,7 @@ def process_keyframe_extraction(video_url, job_id):
 
     print(f"Images: {cmd}")
 
-    subprocess.run(cmd, check=True)
+    run_subprocess(cmd, check=True)
 
     # Upload keyframes to GCS and get URLs
     output_filenames = []
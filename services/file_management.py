@@ -17,16 +17,51 @@
 
 
 import os
+import time
 import uuid
+import logging
+import re
+import threading
 import requests
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, parse_qs
 import mimetypes
+from services.download_cache import get_download_cache
+from services.http_client import get_session
 
-def get_extension_from_url(url):
+logger = logging.getLogger(__name__)
+
+# Opt-in parallel downloads: number of concurrent byte-range requests per file (1 disables)
+DOWNLOAD_CONNECTIONS = int(os.environ.get('DOWNLOAD_CONNECTIONS', 1))
+# Files smaller than this are always fetched with a single request
+DOWNLOAD_PARALLEL_MIN_BYTES = int(os.environ.get('DOWNLOAD_PARALLEL_MIN_BYTES', 32 * 1024 * 1024))
+# Attempts per byte range; a retry resumes where the failed request stopped
+DOWNLOAD_RANGE_RETRIES = int(os.environ.get('DOWNLOAD_RANGE_RETRIES', 3))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Inputs of a multi-input request that are downloaded at the same time
+DOWNLOAD_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', 4))
+# Let ffmpeg/ffprobe read seekable HTTP inputs directly instead of downloading them first
+REMOTE_MEDIA_INPUT = os.environ.get('REMOTE_MEDIA_INPUT', 'true').lower() in ('true', '1', 'yes')
+
+# An input for ffmpeg/ffprobe: a local path or a seekable URL, its size in bytes, and
+# the options to pass before it ("input_args" for command lines, "input_kwargs" for ffmpeg-python)
+MediaInput = namedtuple('MediaInput', ['path', 'size', 'remote', 'input_args', 'input_kwargs'])
+
+class RangeNotSupported(Exception):
+    """The server ignored a Range request or the object changed mid-download."""
+
+class DownloadCancelled(Exception):
+    """A download was stopped because another input of the same request failed."""
+
+def get_extension_from_url(url, content_type=None):
     """Extract file extension from URL or content type.
     
     Args:
         url (str): The URL to extract the extension from
+        content_type (str, optional): Content-Type of a response already received for
+            the URL; without it a HEAD request is sent when the URL has no extension
         
     Returns:
         str: The file extension including the dot (e.g., '.jpg')
@@ -44,9 +79,10 @@ def get_extension_from_url(url):
 
     # If no extension in URL, try to determine from content type
     try:
-        response = requests.head(url, allow_redirects=True)
-        content_type = response.headers.get('content-type', '').split(';')[0]
-        ext = mimetypes.guess_extension(content_type)
+        if content_type is None:
+            response = get_session().head(url, allow_redirects=True)
+            content_type = response.headers.get('content-type', '')
+        ext = mimetypes.guess_extension(content_type.split(';')[0].strip())
         if ext:
             return ext.lower()
     except:
@@ -55,27 +91,229 @@ def get_extension_from_url(url):
     # If we can't determine the extension, raise an error
     raise ValueError(f"Could not determine file extension from URL: {url}")
 
-def download_file(url, storage_path="/tmp/"):
+def _write_response(response, local_filename, cancel_event=None):
+    with open(local_filename, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled(f"Download of {response.url} cancelled")
+            if chunk:
+                f.write(chunk)
+
+def _fetch_range(url, fd, start, end, validator, stopped):
+    """Write bytes start..end (inclusive) of url into fd, resuming after failures."""
+    offset = start
+    attempt = 0
+    while offset <= end:
+        if stopped():
+            return
+        headers = {'Range': f"bytes={offset}-{end}"}
+        if validator:
+            # The server answers 200 with the full body if the object changed
+            headers['If-Range'] = validator
+        try:
+            with get_session().get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise RangeNotSupported(f"Server answered range request with {response.status_code}")
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if stopped():
+                        return
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            if offset <= end:
+                raise IOError(f"Range {start}-{end} ended early at byte {offset}")
+        except RangeNotSupported:
+            raise
+        except (requests.RequestException, IOError) as e:
+            attempt += 1
+            if attempt >= DOWNLOAD_RANGE_RETRIES:
+                raise
+            logger.warning(f"Range {start}-{end} of {url} failed at byte {offset} ({e}), retrying")
+            time.sleep(min(2 ** attempt, 10))
+
+def _download_ranges(url, local_filename, size, connections, validator=None, cancel_event=None):
+    """
+    Download url with several concurrent byte-range requests into a preallocated file.
+
+    Raises:
+        RangeNotSupported: If the server does not honour the ranges
+        DownloadCancelled: If cancel_event is set before the download completes
+    """
+    part_size = -(-size // connections)
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+    failed = threading.Event()
+    stopped = lambda: failed.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    fd = os.open(local_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(_fetch_range, url, fd, start, end, validator, stopped) for start, end in ranges]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                # Stop the other ranges as soon as one gives up
+                failed.set()
+                raise
+    finally:
+        os.close(fd)
+    if cancel_event is not None and cancel_event.is_set():
+        raise DownloadCancelled(f"Download of {url} cancelled")
+
+def _fetch(url, response, local_filename, cancel_event=None):
+    """Write the body of response to local_filename, with parallel ranges when enabled and supported."""
+    size = int(response.headers.get('Content-Length') or 0)
+    if (DOWNLOAD_CONNECTIONS > 1 and size >= DOWNLOAD_PARALLEL_MIN_BYTES
+            and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            and not response.headers.get('Content-Encoding')):
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        response.close()
+        try:
+            _download_ranges(url, local_filename, size, DOWNLOAD_CONNECTIONS, validator, cancel_event)
+            return
+        except RangeNotSupported as e:
+            logger.info(f"Falling back to a single stream for {url}: {e}")
+            response = get_session().get(url, stream=True)
+            response.raise_for_status()
+    _write_response(response, local_filename, cancel_event)
+
+def download_file(url, storage_path="/tmp/", cancel_event=None):
     """Download a file from URL to local storage."""
     # Create storage directory if it doesn't exist
     os.makedirs(storage_path, exist_ok=True)
     
     file_id = str(uuid.uuid4())
-    extension = get_extension_from_url(url)
-    local_filename = os.path.join(storage_path, f"{file_id}{extension}")
+    local_filename = None
 
     try:
-        response = requests.get(url, stream=True)
+        # One pooled GET provides the body, the cache validators and the content type
+        response = get_session().get(url, stream=True)
         response.raise_for_status()
 
-        with open(local_filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        try:
+            extension = get_extension_from_url(url, response.headers.get('content-type', ''))
+        except ValueError:
+            response.close()
+            raise
+        local_filename = os.path.join(storage_path, f"{file_id}{extension}")
+
+        # Repeated inputs are handed out from the cache without reading the body
+        cache = get_download_cache()
+        cache_key = cache.key(url, response.headers) if cache is not None else None
+        if cache_key is not None:
+            with cache.key_lock(cache_key):
+                try:
+                    hit = cache.checkout(cache_key, local_filename)
+                except Exception as e:
+                    logger.warning(f"Download cache lookup failed for {url}: {e}")
+                    hit = False
+                if hit:
+                    response.close()
+                    return local_filename
+                _fetch(url, response, local_filename, cancel_event)
+                try:
+                    cache.add(cache_key, url, local_filename)
+                except Exception as e:
+                    logger.warning(f"Failed to add {url} to the download cache: {e}")
+            return local_filename
 
+        _fetch(url, response, local_filename, cancel_event)
         return local_filename
     except Exception as e:
-        if os.path.exists(local_filename):
+        if local_filename and os.path.exists(local_filename):
             os.remove(local_filename)
         raise e
 
+def download_files(urls, storage_path="/tmp/", max_workers=DOWNLOAD_CONCURRENCY):
+    """
+    Download several URLs concurrently through a bounded thread pool.
+
+    Every distinct URL is downloaded once; repeated URLs share one local file. The
+    first failure cancels the remaining downloads and removes the finished ones.
+
+    Args:
+        urls (list): URLs to download
+        storage_path (str): Directory to store the files in
+        max_workers (int): Maximum number of simultaneous downloads
+
+    Returns:
+        list: Local paths in the order of urls
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    cancel_event = threading.Event()
+    paths = {}
+    error = None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_urls)))) as pool:
+        futures = {pool.submit(download_file, url, storage_path, cancel_event): url for url in unique_urls}
+        for future in as_completed(futures):
+            try:
+                paths[futures[future]] = future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+                    cancel_event.set()
+                    for pending in futures:
+                        pending.cancel()
+
+    if error is not None:
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        raise error
+
+    return [paths[url] for url in urls]
+
+def _probe_seekable(url):
+    """
+    Check whether url can be read with byte ranges.
+
+    Returns:
+        tuple: (total size or None if not seekable, response headers)
+    """
+    with get_session().get(url, headers={'Range': 'bytes=0-0'}, stream=True) as response:
+        if response.status_code != 206:
+            return None, response.headers
+        match = re.match(r'bytes\s+0-0/(\d+)', response.headers.get('Content-Range', ''))
+        return (int(match.group(1)) if match else None), response.headers
+
+@contextmanager
+def open_media_input(url, storage_path="/tmp/"):
+    """
+    Provide an input for ffmpeg/ffprobe without downloading it when possible.
+
+    Seekable HTTP sources are read by ffmpeg directly, so probing a file or grabbing
+    one frame costs a few range requests instead of a full transfer. Inputs already
+    in the download cache are read locally; anything else is downloaded to
+    storage_path and removed when the block exits.
+
+    Args:
+        url (str): URL of the media file
+        storage_path (str): Directory for the fallback download
+
+    Yields:
+        MediaInput: The input to hand to ffmpeg/ffprobe
+    """
+    if REMOTE_MEDIA_INPUT and urlparse(url).scheme in ('http', 'https'):
+        try:
+            size, headers = _probe_seekable(url)
+        except requests.RequestException as e:
+            logger.info(f"Range probe of {url} failed ({e}), downloading it")
+            size = None
+
+        if size is not None:
+            cache = get_download_cache()
+            # Cache keys use the full object length, which a 206 carries in Content-Range
+            cache_key = cache.key(url, {**headers, 'Content-Length': str(size)}) if cache is not None else None
+            if cache_key is None or not cache.contains(cache_key):
+                logger.info(f"Reading {url} remotely ({size} bytes)")
+                yield MediaInput(url, size, True, ['-reconnect', '1'], {'reconnect': 1})
+                return
+
+    local_path = download_file(url, storage_path)
+    try:
+        yield MediaInput(local_path, os.path.getsize(local_path), False, [], {})
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
@@ -18,11 +18,15 @@
 
 import os
 import json
+import shutil
 import logging
 from google.oauth2 import service_account
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from google.cloud.run_v2 import JobsClient, RunJobRequest
 from google.api_core.exceptions import GoogleAPIError
+from config import UPLOAD_PART_SIZE, UPLOAD_CONCURRENCY, UPLOAD_CHECKSUM
+from services.client_registry import get_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,7 +35,12 @@ logger = logging.getLogger(__name__)
 # GCS environment variables
 GCP_BUCKET_NAME = os.getenv('GCP_BUCKET_NAME')
 STORAGE_PATH = "/tmp/"
-gcs_client = None
+
+# Resumable and XML multipart uploads require chunk sizes in multiples of 256 KiB
+GCS_CHUNK_ALIGNMENT = 256 * 1024
+GCS_CHUNK_SIZE = max(GCS_CHUNK_ALIGNMENT, UPLOAD_PART_SIZE // GCS_CHUNK_ALIGNMENT * GCS_CHUNK_ALIGNMENT)
+# Checksums the GCS client can compute while uploading
+GCS_CHECKSUMS = {'md5', 'crc32c'}
 
 def initialize_gcp_client():
     GCP_SA_CREDENTIALS = os.getenv('GCP_SA_CREDENTIALS')
@@ -54,10 +63,36 @@ def initialize_gcp_client():
         logger.error(f"Failed to initialize GCS client: {e}")
         return None
 
-# Initialize the GCS client
-gcs_client = initialize_gcp_client()
+def get_gcs_client():
+    """Return the process-wide GCS client, created on first use (None without credentials)."""
+    try:
+        return get_client(('gcs', os.getenv('GCP_SA_CREDENTIALS')), _create_gcs_client)
+    except ValueError:
+        return None
+
+def _create_gcs_client():
+    client = initialize_gcp_client()
+    if client is None:
+        # Not cached, so credentials fixed later are picked up by the next upload
+        raise ValueError("GCS client could not be initialized")
+    return client
+
+def _get_service_account(json_str):
+    """Parse the service account JSON once per process; returns (credentials_info, credentials)."""
+    def create_credentials():
+        credentials_info = json.loads(json_str)
+        return credentials_info, service_account.Credentials.from_service_account_info(credentials_info)
+    return get_client(('service_account', json_str), create_credentials)
+
+def _checksum_kwargs():
+    if UPLOAD_CHECKSUM == 'none':
+        return {'checksum': None}
+    if UPLOAD_CHECKSUM in GCS_CHECKSUMS:
+        return {'checksum': UPLOAD_CHECKSUM}
+    return {}
 
 def upload_to_gcs(file_path, bucket_name=GCP_BUCKET_NAME):
+    gcs_client = get_gcs_client()
     if not gcs_client:
         raise ValueError("GCS client is not initialized. Skipping file upload.")
 
@@ -65,13 +100,44 @@ def upload_to_gcs(file_path, bucket_name=GCP_BUCKET_NAME):
         logger.info(f"Uploading file to Google Cloud Storage: {file_path}")
         bucket = gcs_client.bucket(bucket_name)
         blob = bucket.blob(os.path.basename(file_path))
-        blob.upload_from_filename(file_path)
+        checksum = _checksum_kwargs()
+        if UPLOAD_CONCURRENCY > 1 and os.path.getsize(file_path) > GCS_CHUNK_SIZE:
+            # Parts are sent in parallel through the XML multipart API and composed by GCS
+            transfer_manager.upload_chunks_concurrently(
+                file_path, blob,
+                chunk_size=GCS_CHUNK_SIZE,
+                max_workers=UPLOAD_CONCURRENCY,
+                worker_type=transfer_manager.THREAD,
+                **checksum
+            )
+        else:
+            blob.chunk_size = GCS_CHUNK_SIZE
+            blob.upload_from_filename(file_path, **checksum)
         logger.info(f"File uploaded successfully to GCS: {blob.public_url}")
         return blob.public_url
     except Exception as e:
         logger.error(f"Error uploading file to GCS: {e}")
         raise
 
+def upload_stream_to_gcs(stream, filename, bucket_name=GCP_BUCKET_NAME):
+    """Upload a binary stream of unknown length as a resumable upload, one chunk at a time."""
+    gcs_client = get_gcs_client()
+    if not gcs_client:
+        raise ValueError("GCS client is not initialized. Skipping file upload.")
+
+    try:
+        logger.info(f"Streaming upload to Google Cloud Storage: {filename}")
+        blob = gcs_client.bucket(bucket_name).blob(filename)
+        writer = blob.open('wb', chunk_size=GCS_CHUNK_SIZE, **_checksum_kwargs())
+        shutil.copyfileobj(stream, writer, GCS_CHUNK_SIZE)
+        # Only closing finalizes the object; after a failure the unfinished session simply expires
+        writer.close()
+        logger.info(f"Stream uploaded successfully to GCS: {blob.public_url}")
+        return blob.public_url
+    except Exception as e:
+        logger.error(f"Error streaming upload to GCS: {e}")
+        raise
+
 
 def trigger_cloud_run_job(job_name, location="us-central1", overrides=None):
     # Retrieve service account credentials
@@ -79,11 +145,10 @@ def trigger_cloud_run_job(job_name, location="us-central1", overrides=None):
     if not json_str:
         raise ValueError("GCP_SA_CREDENTIALS environment variable not set.")
     
-    credentials_info = json.loads(json_str)
-    credentials = service_account.Credentials.from_service_account_info(credentials_info)
+    credentials_info, credentials = _get_service_account(json_str)
 
-    # Initialize the JobsClient with the provided credentials
-    client = JobsClient(credentials=credentials)
+    # The JobsClient keeps its gRPC channel open between triggers and refreshes its token itself
+    client = get_client(('cloud_run_jobs', json_str), lambda: JobsClient(credentials=credentials))
 
     # Construct the job path using project ID and location
     project_id = credentials_info.get("project_id")
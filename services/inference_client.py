@@ -0,0 +1,164 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import uuid
+import select
+import socket
+import logging
+import http.client
+from urllib.parse import urlparse
+from services.job_control import current_job
+
+logger = logging.getLogger(__name__)
+
+# Address of the inference server that owns the models, e.g. unix:///tmp/inference.sock or
+# http://127.0.0.1:8765; empty runs inference in each worker process
+INFERENCE_SERVER_URL = os.environ.get('INFERENCE_SERVER_URL', '')
+# Seconds a request may wait for the inference server, queueing included
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 3600))
+# Requests one job keeps open to the inference server at a time, e.g. for the clips of a batch
+INFERENCE_CLIENT_CONCURRENCY = int(os.environ.get('INFERENCE_CLIENT_CONCURRENCY', 16))
+
+# Seconds between cancellation checks while waiting for the server's response
+_POLL_INTERVAL = 0.5
+
+class InferenceError(Exception):
+    """Raised when the inference server can't be reached or fails a request."""
+    pass
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def enabled():
+    """Whether inference is delegated to the inference server."""
+    return bool(INFERENCE_SERVER_URL)
+
+def _connection(url, timeout):
+    parsed = urlparse(url)
+    if parsed.scheme == 'unix':
+        return _UnixHTTPConnection(parsed.path, timeout=timeout)
+    if parsed.scheme == 'http':
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    raise ValueError(f"Unsupported INFERENCE_SERVER_URL: {url}")
+
+def json_default(value):
+    """Serialize the numpy scalars and arrays found in model output."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def request(path, payload=None, url=None, timeout=None):
+    """
+    Send one request to the inference server and return its JSON response.
+
+    The timeout is shortened to the current job's remaining time. While waiting,
+    the current job is checked every _POLL_INTERVAL seconds; a cancelled job closes
+    the connection, and the server then drops the request if it is still queued.
+    """
+    url = url or INFERENCE_SERVER_URL
+    timeout = timeout or INFERENCE_TIMEOUT
+    context = current_job()
+    if context is not None:
+        context.check()
+        remaining = context.remaining()
+        if remaining is not None:
+            timeout = max(1.0, min(timeout, remaining))
+
+    deadline = time.time() + timeout
+    conn = _connection(url, timeout)
+    try:
+        if payload is None:
+            conn.request('GET', path)
+        else:
+            body = json.dumps(payload, default=json_default)
+            conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+        while not select.select([conn.sock], [], [], _POLL_INTERVAL)[0]:
+            if context is not None:
+                context.check()
+            if time.time() >= deadline:
+                raise TimeoutError(f"no response within {timeout:g}s")
+        response = conn.getresponse()
+        data = json.loads(response.read() or b'{}')
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise InferenceError(f"Inference server at {url} failed: {e}")
+    finally:
+        conn.close()
+
+    if response.status != 200:
+        raise InferenceError(f"Inference server error ({response.status}): {data.get('error', data)}")
+    return data
+
+def _audio_payload(audio):
+    """Describe audio by path so the server maps the same file; returns (payload, temporary file)."""
+    if isinstance(audio, str):
+        return {"media_path": os.path.abspath(audio)}, None
+
+    from config import LOCAL_STORAGE_PATH
+    from services.audio_prep import sample_range, audio_from_samples
+    shared = sample_range(audio)
+    if shared is not None:
+        path, start, end = shared
+        return {"samples_path": path, "start": start, "end": end}, None
+    # Samples only held in memory go through a file in the storage both processes see
+    prepared = audio_from_samples(audio, os.path.join(LOCAL_STORAGE_PATH, f"{uuid.uuid4().hex}.f32"))
+    return {"samples_path": prepared.path}, prepared
+
+def transcribe(audio, model_name, backend, device=None, batch_decode=False, **options):
+    """
+    Transcribe audio (a media path or 16 kHz samples) on the inference server; see transcription_backend.transcribe.
+
+    With batch_decode the server may decode the clip in one batch with others
+    (see transcription_backend.transcribe_batch); otherwise it returns exactly
+    what transcribe() returns.
+    """
+    audio_payload, temporary = _audio_payload(audio)
+    try:
+        payload = dict(audio_payload, model=model_name, backend=backend, device=device,
+                       batch_decode=batch_decode, options=options)
+        return request('/transcribe', payload)["result"]
+    finally:
+        if temporary is not None:
+            temporary.remove()
+
+def text_to_speech(text, output_path, language=None, emotion_intensity=0.5, model_type="english", audio_prompt_path=None):
+    """Have the inference server synthesize text into the WAV file output_path."""
+    payload = {
+        "text": text,
+        "output_path": os.path.abspath(output_path),
+        "language": language,
+        "emotion_intensity": emotion_intensity,
+        "model_type": model_type,
+        "audio_prompt_path": os.path.abspath(audio_prompt_path) if audio_prompt_path else None
+    }
+    return request('/tts', payload)["output_path"]
+
+def health(url=None, timeout=5):
+    """Return the inference server's status: loaded models, queue and batch counters."""
+    return request('/health', url=url, timeout=timeout)
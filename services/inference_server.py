@@ -0,0 +1,372 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+"""
+Inference server: one process that owns the Whisper and Chatterbox models for all gunicorn workers.
+
+Usage:
+    INFERENCE_SERVER_URL=unix:///tmp/inference.sock python -m services.inference_server
+
+Workers started with the same INFERENCE_SERVER_URL send their transcription and
+text-to-speech requests here instead of loading models themselves. Media and
+prepared audio are passed by path, so the server and the workers must share
+LOCAL_STORAGE_PATH.
+"""
+
+import os
+import json
+import time
+import select
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from urllib.parse import urlparse
+from services.inference_client import INFERENCE_SERVER_URL, json_default
+
+logger = logging.getLogger(__name__)
+
+# Inference batches running at the same time; each model still runs one batch at a time
+INFERENCE_MAX_CONCURRENCY = int(os.environ.get('INFERENCE_MAX_CONCURRENCY', 1))
+# Requests for the same model and options run together in batches of up to this many
+INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 8))
+# Milliseconds a request may wait for others to join its batch
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 10))
+
+# Seconds between checks whether the client of a waiting request has gone away
+_POLL_INTERVAL = 0.5
+
+class _Request:
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.queued_at = time.time()
+
+class InferenceScheduler:
+    """
+    Queues inference requests by batch key and runs them in batches on a fixed set of threads.
+
+    Requests with the same key (kind, model and options) are batched: a batch
+    starts once batch_size requests are waiting or the oldest has waited
+    batch_wait seconds. At most max_concurrency batches run at once and never two
+    of the same key, so the CPU is never oversubscribed by parallel inference.
+    Requests whose future is cancelled before their batch starts are dropped.
+
+    Usage:
+        scheduler = InferenceScheduler()
+        scheduler.register('transcribe', run_transcriptions)
+        result = scheduler.submit(('transcribe', 'base'), payload).result()
+    """
+
+    def __init__(self, max_concurrency=INFERENCE_MAX_CONCURRENCY, batch_size=INFERENCE_BATCH_SIZE,
+                 batch_wait=INFERENCE_BATCH_WAIT_MS / 1000):
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = max(0.0, batch_wait)
+        self._runners = {}
+        self._queues = {}
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._counters = {"requests": 0, "batches": 0, "failed": 0, "dropped": 0}
+        self._threads = [
+            threading.Thread(target=self._work, name=f'inference-{i}', daemon=True)
+            for i in range(self.max_concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def register(self, kind, runner):
+        """Register runner(key, payloads) -> list of results or exceptions, one per payload."""
+        self._runners[kind] = runner
+
+    def submit(self, key, payload):
+        """Queue a request; key[0] names its runner. Returns a Future of its result."""
+        if key[0] not in self._runners:
+            raise ValueError(f"Unknown inference kind: {key[0]}")
+        request = _Request(payload)
+        with self._cond:
+            self._queues.setdefault(key, deque()).append(request)
+            self._counters["requests"] += 1
+            self._cond.notify()
+        return request.future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                due_key = None
+                next_due = None
+                for key, queue in self._queues.items():
+                    if key in self._busy:
+                        continue
+                    due_at = queue[0].queued_at + self.batch_wait
+                    if len(queue) >= self.batch_size or due_at <= now:
+                        if due_key is None or queue[0].queued_at < self._queues[due_key][0].queued_at:
+                            due_key = key
+                    elif next_due is None or due_at < next_due:
+                        next_due = due_at
+                if due_key is None:
+                    self._cond.wait(None if next_due is None else next_due - now)
+                    continue
+                queue = self._queues[due_key]
+                batch = []
+                while queue and len(batch) < self.batch_size:
+                    request = queue.popleft()
+                    # False for a request cancelled while queued; it can't be cancelled once running
+                    if request.future.set_running_or_notify_cancel():
+                        batch.append(request)
+                    else:
+                        self._counters["dropped"] += 1
+                if not queue:
+                    del self._queues[due_key]
+                if not batch:
+                    continue
+                self._busy.add(due_key)
+                return due_key, batch
+            return None
+
+    def _work(self):
+        while True:
+            item = self._next_batch()
+            if item is None:
+                return
+            key, batch = item
+            start_time = time.time()
+            try:
+                results = self._runners[key[0]](key, [request.payload for request in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            failed = 0
+            for request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+            logger.info(f"Ran a batch of {len(batch)} {key[0]} requests in {time.time() - start_time:.2f}s")
+            with self._cond:
+                self._busy.discard(key)
+                self._counters["batches"] += 1
+                self._counters["failed"] += failed
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return request and batch counters and the current queue."""
+        with self._cond:
+            return dict(
+                self._counters,
+                queued=sum(len(queue) for queue in self._queues.values()),
+                running=len(self._busy),
+                max_concurrency=self.max_concurrency,
+                batch_size=self.batch_size
+            )
+
+    def stop(self):
+        """Stop the threads once their current batch is done; queued requests are failed."""
+        with self._cond:
+            self._stopped = True
+            for queue in self._queues.values():
+                for request in queue:
+                    if request.future.set_running_or_notify_cancel():
+                        request.future.set_exception(RuntimeError("Inference server is shutting down"))
+            self._queues.clear()
+            self._cond.notify_all()
+
+def _load_audio(payload):
+    if payload.get('samples_path'):
+        from services.audio_prep import load_samples
+        return load_samples(payload['samples_path'], payload.get('start') or 0, payload.get('end'))
+    return payload['media_path']
+
+def run_transcriptions(key, payloads):
+    """Transcribe a batch of requests that share model, backend, device, batch_decode and options."""
+    from services.transcription_backend import transcribe_batch
+    _, model_name, backend, device, batch_decode, options = key
+    results = [None] * len(payloads)
+    audios = []
+    for i, payload in enumerate(payloads):
+        try:
+            audios.append((i, _load_audio(payload)))
+        except Exception as e:
+            results[i] = e
+    batch_results = transcribe_batch(
+        [audio for _, audio in audios], model_name, backend, device, batch_decode, **json.loads(options)
+    )
+    for (i, _), result in zip(audios, batch_results):
+        results[i] = result
+    return results
+
+def run_text_to_speech(key, payloads):
+    """Synthesize a batch of requests for the same Chatterbox model, one after another."""
+    from services.v1.chatterbox.tts import generate_speech
+    results = []
+    for payload in payloads:
+        try:
+            results.append(generate_speech(
+                payload['text'], payload['output_path'], payload.get('language'),
+                payload.get('emotion_intensity', 0.5), key[1], payload.get('audio_prompt_path')
+            ))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def _batch_key(path, payload):
+    if path == '/transcribe':
+        from services.model_registry import WHISPER_MODEL
+        from services.transcription_backend import resolve_backend
+        if not payload.get('samples_path') and not payload.get('media_path'):
+            raise ValueError("samples_path or media_path is required")
+        options = json.dumps(payload.get('options') or {}, sort_keys=True)
+        return ('transcribe', payload.get('model') or WHISPER_MODEL, resolve_backend(payload.get('backend')),
+                payload.get('device'), bool(payload.get('batch_decode')), options)
+    if path == '/tts':
+        if not payload.get('text') or not payload.get('output_path'):
+            raise ValueError("text and output_path are required")
+        return ('tts', payload.get('model_type') or 'english')
+    return None
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send(self, code, data):
+        body = json.dumps(data, default=json_default).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._send(404, {"error": f"Unknown path: {self.path}"})
+        from services.model_registry import get_model_registry
+        self._send(200, {
+            "status": "ok",
+            "pid": os.getpid(),
+            "models": [list(key) for key in get_model_registry().loaded()],
+            "scheduler": self.server.scheduler.stats()
+        })
+
+    def _client_gone(self):
+        # The client sends nothing after its request, so a readable socket means it was closed
+        if not select.select([self.connection], [], [], 0)[0]:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+
+    def do_POST(self):
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            key = _batch_key(self.path, payload)
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        if key is None:
+            return self._send(404, {"error": f"Unknown path: {self.path}"})
+
+        future = self.server.scheduler.submit(key, payload)
+        while True:
+            try:
+                result = future.result(timeout=_POLL_INTERVAL)
+                break
+            except FutureTimeout:
+                # A cancelled job closes its connection; don't run its request if it is still queued
+                if self._client_gone() and future.cancel():
+                    logger.info(f"Dropped queued {self.path} request, its client went away")
+                    return
+            except Exception as e:
+                logger.error(f"Inference request {self.path} failed: {e}")
+                return self._send(500, {"error": str(e)})
+        if key[0] == 'tts':
+            return self._send(200, {"output_path": result})
+        self._send(200, {"result": result})
+
+    def log_message(self, format, *args):
+        # Unix socket clients have no address for the default log line
+        logger.debug(f"{self.command} {self.path}: " + format % args)
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left by a previous run would make bind fail
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+def create_server(url=None, scheduler=None):
+    """
+    Create (but don't start) an inference server listening on url.
+
+    Args:
+        url (str, optional): unix:///path/to.sock or http://host:port, INFERENCE_SERVER_URL by default
+        scheduler (InferenceScheduler, optional): Scheduler with the runners registered
+
+    Returns:
+        HTTPServer: Call serve_forever(), and shutdown() from another thread to stop it
+    """
+    url = url or INFERENCE_SERVER_URL
+    if not url:
+        raise ValueError("INFERENCE_SERVER_URL is not set")
+    if scheduler is None:
+        scheduler = InferenceScheduler()
+        scheduler.register('transcribe', run_transcriptions)
+        scheduler.register('tts', run_text_to_speech)
+
+    parsed = urlparse(url)
+    if parsed.scheme == 'unix':
+        server = _UnixHTTPServer(parsed.path, _Handler)
+    elif parsed.scheme == 'http':
+        server = ThreadingHTTPServer((parsed.hostname, parsed.port or 80), _Handler)
+        server.daemon_threads = True
+    else:
+        raise ValueError(f"Unsupported inference server URL: {url}")
+    server.scheduler = scheduler
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Whisper and Chatterbox inference to the API workers")
+    parser.add_argument('--url', default=INFERENCE_SERVER_URL, help="unix:///path/to.sock or http://127.0.0.1:8765")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from services.model_registry import warmup
+    server = create_server(args.url)
+    # Load WHISPER_WARMUP_MODELS here once instead of in every worker
+    threading.Thread(target=warmup, name='model-warmup', daemon=True).start()
+    logger.info(f"Inference server listening on {args.url} (PID {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.scheduler.stop()
+        server.server_close()
+        if isinstance(server, _UnixHTTPServer) and os.path.exists(server.server_address):
+            os.remove(server.server_address)
+
+if __name__ == "__main__":
+    main()
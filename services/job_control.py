@@ -0,0 +1,317 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import signal
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Status and response code recorded for a job that was stopped before it finished
+ABORT_CODES = {
+    'cancelled': 499,
+    'timed_out': 504
+}
+
+def abort_message(reason, timeout=None):
+    """Human-readable message for a job stopped for reason."""
+    if reason == 'timed_out':
+        return f"Job timed out after {timeout}s" if timeout else "Job timed out"
+    return "Job cancelled"
+
+class JobCancelled(Exception):
+    """Raised inside a job that has been cancelled or has run out of time."""
+    def __init__(self, reason, message=None):
+        self.reason = reason
+        super().__init__(message or abort_message(reason))
+
+class JobContext:
+    """Tracks the deadline, cancellation state and child processes of one running job."""
+
+    def __init__(self, job_id, timeout=None):
+        self.job_id = job_id
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.deadline = self.started_at + timeout if timeout else None
+        self.reason = None
+        self._processes = set()
+        self._uploads = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def message(self):
+        return abort_message(self.reason, self.timeout)
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without a timeout."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def check(self):
+        """Raise JobCancelled if the job has been stopped or is past its deadline."""
+        if self.reason is None and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel('timed_out')
+        if self.reason is not None:
+            raise JobCancelled(self.reason, self.message())
+
+    def add_process(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.reason is not None
+        # A cancel that raced with the launch must not leave the process running
+        if cancelled:
+            kill_process_tree(process.pid)
+
+    def remove_process(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def record_upload(self, size, seconds):
+        """Record an output upload of size bytes that took seconds."""
+        with self._lock:
+            self._uploads.append((size, seconds))
+
+    def upload_stats(self):
+        """Summarize the uploads of this job for its response, or None if it uploaded nothing."""
+        with self._lock:
+            uploads = list(self._uploads)
+        if not uploads:
+            return None
+        size = sum(u[0] for u in uploads)
+        seconds = sum(u[1] for u in uploads)
+        return {
+            "files": len(uploads),
+            "bytes": size,
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(size / seconds / 1024 ** 2, 2) if seconds > 0 else None
+        }
+
+    def cancel(self, reason='cancelled'):
+        """Mark the job as stopped and kill every child process it started."""
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            processes = list(self._processes)
+        for process in processes:
+            kill_process_tree(process.pid)
+
+_local = threading.local()
+_active_jobs = {}
+_active_lock = threading.Lock()
+
+def current_job():
+    """Return the JobContext of the job running on this thread, or None."""
+    return getattr(_local, 'context', None)
+
+def get_active_job(job_id):
+    """Return the JobContext of a job running in this process, or None."""
+    with _active_lock:
+        return _active_jobs.get(job_id)
+
+def active_jobs():
+    """Return all JobContexts running in this process."""
+    with _active_lock:
+        return list(_active_jobs.values())
+
+@contextmanager
+def job_context(context):
+    """Make context the current job of this thread while the block runs."""
+    previous = current_job()
+    _local.context = context
+    with _active_lock:
+        _active_jobs[context.job_id] = context
+    try:
+        yield context
+    finally:
+        with _active_lock:
+            if _active_jobs.get(context.job_id) is context:
+                del _active_jobs[context.job_id]
+        _local.context = previous
+
+@contextmanager
+def attach_job(context):
+    """Make context the current job of a helper thread working for it, without registering it again."""
+    previous = current_job()
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+def cancel_job(job_id, reason='cancelled'):
+    """
+    Stop a job running in this process.
+
+    Returns:
+        bool: True if the job was found
+    """
+    context = get_active_job(job_id)
+    if context is None:
+        return False
+    context.cancel(reason)
+    return True
+
+def kill_process_tree(pid):
+    """Kill a process started by run_subprocess together with all of its descendants."""
+    try:
+        import psutil
+        parent = psutil.Process(pid)
+        for child in parent.children(recursive=True):
+            child.kill()
+    except Exception:
+        pass
+    try:
+        # Processes run in their own session, so the group id equals their pid
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to kill process group {pid}: {e}")
+
+def run_subprocess(cmd, check=False, capture_output=False, timeout=None, input=None, **kwargs):
+    """
+    Drop-in replacement for subprocess.run that respects the current job's
+    deadline and cancellation.
+
+    The child is started in its own session so that cancelling the job kills the
+    whole process tree (e.g. ffmpeg and anything it spawned).
+
+    Raises:
+        JobCancelled: If the job is cancelled or times out while the process runs
+        subprocess.CalledProcessError: If check is True and the process fails
+    """
+    context = current_job()
+    if context is not None:
+        context.check()
+        remaining = context.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+    if capture_output:
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+
+    process = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+    if context is not None:
+        context.add_process(process)
+    try:
+        try:
+            stdout, stderr = process.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process.pid)
+            process.communicate()
+            if context is not None and context.deadline is not None and time.time() >= context.deadline:
+                context.cancel('timed_out')
+                context.check()
+            raise
+        except BaseException:
+            kill_process_tree(process.pid)
+            process.wait()
+            raise
+    finally:
+        if context is not None:
+            context.remove_process(process)
+
+    if context is not None:
+        context.check()
+
+    completed = subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+    if check:
+        completed.check_returncode()
+    return completed
+
+def run_ffmpeg(stream, capture_stdout=False, capture_stderr=False, overwrite_output=False, quiet=False):
+    """
+    Drop-in replacement for ffmpeg-python's stream.run() that respects the current
+    job's deadline and cancellation like run_subprocess.
+
+    Returns:
+        tuple: (stdout, stderr), each None unless captured
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails, as stream.run() does
+    """
+    import ffmpeg
+    cmd = ffmpeg.compile(stream, overwrite_output=overwrite_output)
+    completed = run_subprocess(
+        cmd,
+        stdout=subprocess.PIPE if capture_stdout or quiet else None,
+        stderr=subprocess.PIPE if capture_stderr or quiet else None
+    )
+    if completed.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', completed.stdout, completed.stderr)
+    return completed.stdout, completed.stderr
+
+def run_ffprobe(filename, cmd='ffprobe', **kwargs):
+    """
+    Drop-in replacement for ffmpeg.probe() that respects the current job's deadline
+    and cancellation like run_subprocess, e.g. for a slow probe of a remote input.
+
+    Returns:
+        dict: ffprobe's JSON output (format and streams)
+
+    Raises:
+        ffmpeg.Error: If ffprobe fails, as ffmpeg.probe() does
+    """
+    import ffmpeg
+    args = [cmd, '-show_format', '-show_streams', '-of', 'json']
+    for key, value in sorted(kwargs.items()):
+        args.append(f'-{key}')
+        if value is not None:
+            args.append(str(value))
+    args.append(filename)
+    completed = run_subprocess(args, capture_output=True)
+    if completed.returncode != 0:
+        raise ffmpeg.Error('ffprobe', completed.stdout, completed.stderr)
+    return json.loads(completed.stdout.decode('utf-8'))
+
+@contextmanager
+def popen(cmd, **kwargs):
+    """
+    Start a process that the caller talks to while it runs (e.g. ffmpeg writing to a pipe).
+
+    Like run_subprocess, the child gets its own session and is registered with the
+    current job, so cancelling the job kills it. A process still running when the
+    block exits is killed.
+    """
+    context = current_job()
+    if context is not None:
+        context.check()
+
+    process = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+    if context is not None:
+        context.add_process(process)
+    try:
+        yield process
+    finally:
+        if process.poll() is None:
+            kill_process_tree(process.pid)
+        process.wait()
+        if context is not None:
+            context.remove_process(process)
@@ -0,0 +1,417 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+import time
+import threading
+from contextlib import contextmanager
+from services import job_control
+from services.job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+# Rough resident memory budget for one running job (FFmpeg encode, Whisper base, uploads)
+DEFAULT_JOB_MEMORY_MB = 1024
+
+# Concurrency classes ("lanes") for jobs. Every lane has its own worker threads and
+# limit, so cheap jobs never wait behind long encodes or model inference.
+LANE_HEAVY_ML = 'heavy-ml'    # Whisper / Chatterbox inference, one model load at a time
+LANE_ENCODE = 'encode'        # FFmpeg encodes and other CPU-bound work
+LANE_LIGHT_IO = 'light-io'    # Probes, thumbnails, downloads and uploads
+DEFAULT_LANE = LANE_ENCODE
+DEFAULT_LIGHT_IO_LIMIT = 4
+
+# How often the watchdog checks running jobs for timeouts and cancel requests
+WATCHDOG_INTERVAL = float(os.environ.get('JOB_WATCHDOG_INTERVAL', 1.0))
+# Seconds an idle worker holding a lane slot waits between letting waiting synchronous requests in
+SLOT_YIELD_INTERVAL = 0.05
+
+def get_default_worker_count(job_memory_mb=DEFAULT_JOB_MEMORY_MB):
+    """
+    Size the executor from the CPU count and the memory available to this gunicorn worker.
+
+    Both resources are split evenly across GUNICORN_WORKERS so that every worker
+    process gets its fair share of the machine.
+
+    Args:
+        job_memory_mb (int): Memory budget for a single running job in MB
+
+    Returns:
+        int: Number of executor threads (at least 1)
+    """
+    gunicorn_workers = max(1, int(os.environ.get('GUNICORN_WORKERS', 1)))
+    cpu_count = os.cpu_count() or 1
+    cpu_slots = max(1, cpu_count // gunicorn_workers)
+
+    try:
+        import psutil
+        available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        memory_slots = max(1, int(available_mb // (job_memory_mb * gunicorn_workers)))
+    except Exception as e:
+        logger.warning(f"Could not determine available memory, sizing by CPU only: {e}")
+        memory_slots = cpu_slots
+
+    return max(1, min(cpu_slots, memory_slots))
+
+def resolve_worker_count(value):
+    """
+    Resolve the QUEUE_WORKERS setting to a thread count.
+
+    Args:
+        value (str|int): A positive integer, or "auto"/0/empty to size from CPU and memory
+
+    Returns:
+        int: Number of executor threads
+    """
+    if value in (None, '', 'auto', '0', 0):
+        job_memory_mb = int(os.environ.get('QUEUE_JOB_MEMORY_MB', DEFAULT_JOB_MEMORY_MB))
+        return get_default_worker_count(job_memory_mb)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid QUEUE_WORKERS value '{value}', sizing automatically")
+        return get_default_worker_count()
+
+def resolve_lane_limits(queue_workers, lanes_spec=None):
+    """
+    Build the per-lane concurrency limits.
+
+    Args:
+        queue_workers (str|int): QUEUE_WORKERS setting, used for the encode lane
+        lanes_spec (str, optional): Overrides such as "heavy-ml=1,encode=4,light-io=8"
+
+    Returns:
+        dict: Mapping of lane name to the number of jobs it may run at once
+    """
+    limits = {
+        LANE_HEAVY_ML: 1,
+        LANE_ENCODE: resolve_worker_count(queue_workers),
+        LANE_LIGHT_IO: DEFAULT_LIGHT_IO_LIMIT
+    }
+
+    for entry in (lanes_spec or '').split(','):
+        if not entry.strip():
+            continue
+        try:
+            lane, limit = entry.split('=')
+            limits[lane.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning(f"Ignoring invalid QUEUE_LANES entry '{entry}'")
+
+    return limits
+
+class JobExecutor:
+    """
+    Runs queued jobs on a fixed pool of daemon threads.
+
+    The heavy lifting in this toolkit happens in FFmpeg subprocesses, network I/O and
+    PyTorch kernels, all of which release the GIL, so threads are enough to keep
+    several jobs running at once inside one gunicorn worker.
+
+    A watchdog thread stops jobs that exceed their timeout or are cancelled: it kills
+    their subprocesses, records the outcome through on_abort and hands the job's slot
+    to a fresh thread right away, leaving the old thread to exit once the job returns.
+    """
+
+    def __init__(self, handler, job_queue, lane_limits, on_abort=None, on_recover=None, max_attempts=0):
+        """
+        Args:
+            handler (callable): Called with the job dict of every claimed job
+            job_queue (JobQueue): Queue the worker threads pull jobs from
+            lane_limits (dict): Number of jobs each lane may run concurrently
+            on_abort (callable, optional): Called with the job dict and the reason
+                ('cancelled' or 'timed_out') when a job is stopped
+            on_recover (callable, optional): Called with the job dict and whether it was
+                requeued for every job found interrupted by a dead worker at startup
+            max_attempts (int): Interrupted runs after which a job is given up (0 retries forever)
+        """
+        self.handler = handler
+        self.job_queue = job_queue
+        self.lane_limits = dict(lane_limits)
+        self.on_abort = on_abort
+        self.on_recover = on_recover
+        self.max_attempts = max_attempts
+        self.queue_id = id(self)
+        self._threads = []
+        self._thread_count = 0
+        self._slots = {lane: threading.BoundedSemaphore(limit) for lane, limit in self.lane_limits.items()}
+        self._running = {lane: 0 for lane in self.lane_limits}
+        # Synchronous requests waiting for a slot; idle workers step aside for them
+        self._waiting = {lane: 0 for lane in self.lane_limits}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads. Calling start() more than once is a no-op."""
+        if self._threads:
+            return
+        self.recover()
+        for lane, limit in self.lane_limits.items():
+            for _ in range(limit):
+                self._start_worker(lane)
+        threading.Thread(target=self._watchdog, name="job-executor-watchdog", daemon=True).start()
+        logger.info(f"PID {os.getpid()} job executor started with lanes {self.lane_limits}")
+
+    def recover(self):
+        """Requeue the jobs of workers that died mid-job (timeout, OOM kill, deploy)."""
+        try:
+            requeued, abandoned = self.job_queue.recover(self.max_attempts)
+        except Exception as e:
+            logger.error(f"Failed to recover interrupted jobs: {e}")
+            return
+
+        for job in requeued:
+            logger.warning(f"Job {job['job_id']} was interrupted (attempt {job['attempts']}), requeued")
+        for job in abandoned:
+            logger.error(f"Job {job['job_id']} was interrupted {job['attempts']} times, giving up")
+        if self.on_recover is not None:
+            for job, retried in [(job, True) for job in requeued] + [(job, False) for job in abandoned]:
+                try:
+                    self.on_recover(job, retried)
+                except Exception as e:
+                    logger.error(f"Failed to record recovery of job {job.get('job_id')}: {e}")
+
+        queued = self.qsize()
+        if queued:
+            logger.info(f"PID {os.getpid()} found {queued} queued job(s) to resume")
+
+    def _start_worker(self, lane):
+        with self._lock:
+            index = self._thread_count
+            self._thread_count += 1
+            self._threads = [t for t in self._threads if t.is_alive()]
+        thread = threading.Thread(target=self._worker, args=(lane,), name=f"job-executor-{lane}-{index}", daemon=True)
+        thread.start()
+        with self._lock:
+            self._threads.append(thread)
+
+    def resolve_lane(self, lane):
+        """Map a requested lane to a configured one, falling back to the default lane."""
+        if lane is None:
+            return DEFAULT_LANE
+        if lane not in self.lane_limits:
+            logger.warning(f"Unknown lane '{lane}', using '{DEFAULT_LANE}'")
+            return DEFAULT_LANE
+        return lane
+
+    def _acquire(self, lane):
+        self._slots[lane].acquire()
+        with self._lock:
+            self._running[lane] += 1
+
+    def _release(self, lane):
+        with self._lock:
+            self._running[lane] -= 1
+        self._slots[lane].release()
+
+    @contextmanager
+    def lane_slot(self, lane):
+        """
+        Hold one of the lane's concurrency slots.
+
+        Queued jobs and synchronous requests of the same lane share these slots,
+        so e.g. two Whisper jobs never load models in one worker at the same time.
+        """
+        lane = self.resolve_lane(lane)
+        with self._lock:
+            self._waiting[lane] += 1
+        try:
+            self._acquire(lane)
+        finally:
+            with self._lock:
+                self._waiting[lane] -= 1
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    def submit(self, job, max_length=0):
+        """
+        Add a job to the queue.
+
+        Returns:
+            bool: False if the queue already holds max_length jobs
+        """
+        job["lane"] = self.resolve_lane(job.get("lane"))
+        return self.job_queue.put(job, max_length)
+
+    def qsize(self, lane=None):
+        """Number of jobs waiting to run, in one lane or in total."""
+        return self.job_queue.qsize(lane)
+
+    def running(self):
+        """Number of jobs currently running in this worker, per lane."""
+        with self._lock:
+            return dict(self._running)
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job.
+
+        Queued jobs are removed from the queue and jobs running in this worker are
+        stopped at once. Jobs running in another gunicorn worker are flagged in the
+        job store and stopped by that worker's watchdog.
+
+        Returns:
+            str: 'cancelled' if the job was stopped, 'cancelling' if it was flagged
+        """
+        job = self.job_queue.remove(job_id)
+        if job is not None:
+            self._notify_abort(job, 'cancelled')
+            return 'cancelled'
+        if self.abort(job_id, 'cancelled'):
+            return 'cancelled'
+        # Synchronous requests can't be answered early, but their subprocesses can be killed
+        if job_control.cancel_job(job_id, 'cancelled'):
+            return 'cancelling'
+        get_job_store().request_cancel(job_id)
+        return 'cancelling'
+
+    def abort(self, job_id, reason):
+        """
+        Stop a job run by this executor and free its slot immediately.
+
+        Returns:
+            bool: False if the job is not running in this executor
+        """
+        with self._lock:
+            entry = self._jobs.pop(job_id, None)
+        if entry is None:
+            return False
+
+        job, lane, context = entry
+        context.cancel(reason)
+        logger.warning(f"Job {job_id} {reason.replace('_', ' ')}, freeing its {lane} slot")
+        self._release(lane)
+        self._task_done(job)
+        # The job's thread may be stuck in Python code that can't be interrupted;
+        # it exits when the job returns, and a new thread takes over its slot now.
+        self._start_worker(lane)
+        self._notify_abort(job, reason)
+        return True
+
+    def _notify_abort(self, job, reason):
+        if self.on_abort is None:
+            return
+        try:
+            self.on_abort(job, reason)
+        except Exception as e:
+            logger.error(f"Failed to record {reason} status for job {job.get('job_id')}: {e}")
+
+    def _task_done(self, job):
+        try:
+            self.job_queue.task_done(job)
+        except Exception as e:
+            logger.error(f"Failed to remove job {job.get('job_id')} from queue: {e}")
+
+    def _worker(self, lane):
+        while True:
+            # Take the slot before claiming a job, so a job is never claimed from a
+            # shared queue by a worker that can't run it yet (e.g. while a
+            # synchronous request of the same lane holds the slot)
+            while self._waiting[lane]:
+                time.sleep(SLOT_YIELD_INTERVAL)
+            self._slots[lane].acquire()
+            try:
+                # A short wait, since a synchronous request may be waiting for this slot
+                job = self.job_queue.get(timeout=SLOT_YIELD_INTERVAL * 5, lane=lane)
+            except Exception as e:
+                self._slots[lane].release()
+                logger.error(f"Failed to fetch job from {lane} queue: {e}")
+                time.sleep(1)
+                continue
+            if job is None:
+                self._slots[lane].release()
+                continue
+            with self._lock:
+                self._running[lane] += 1
+
+            if not self._run(job, lane):
+                # The job was aborted and another thread owns this slot now
+                return
+
+    def _run(self, job, lane):
+        """
+        Run one job in the lane slot the calling worker holds; the slot is released
+        when the job finishes.
+
+        Returns:
+            bool: False if the job was aborted while it ran
+        """
+        job_id = job.get("job_id")
+        try:
+            cancel_requested = job_id in get_job_store().cancel_requests([job_id])
+        except Exception as e:
+            logger.warning(f"Failed to check cancel requests for job {job_id}: {e}")
+            cancel_requested = False
+        if cancel_requested:
+            # Cancelled in another worker while it was still queued here
+            get_job_store().clear_cancel(job_id)
+            self._release(lane)
+            self._task_done(job)
+            self._notify_abort(job, 'cancelled')
+            return True
+
+        context = job_control.JobContext(job_id, job.get("timeout"))
+        with self._lock:
+            self._jobs[job_id] = (job, lane, context)
+        try:
+            with job_control.job_context(context):
+                self.handler(job)
+        except Exception as e:
+            # Keep the worker thread alive no matter what the job does
+            logger.exception(f"Unhandled error while processing job {job_id}: {e}")
+        finally:
+            with self._lock:
+                finished = self._jobs.pop(job_id, None) is not None
+            if finished:
+                self._release(lane)
+                self._task_done(job)
+                # Stopped from inside the job, e.g. run_subprocess hit the deadline
+                if context.cancelled:
+                    self._notify_abort(job, context.reason)
+        return finished
+
+    def _watchdog(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            try:
+                self._check_jobs()
+            except Exception as e:
+                logger.error(f"Job watchdog failed: {e}")
+
+    def _check_jobs(self):
+        now = time.time()
+        contexts = job_control.active_jobs()
+        if not contexts:
+            return
+
+        expired = {c.job_id for c in contexts if c.deadline is not None and now >= c.deadline}
+        requested = get_job_store().cancel_requests([c.job_id for c in contexts])
+        for context in contexts:
+            if context.job_id in requested:
+                reason = 'cancelled'
+                get_job_store().clear_cancel(context.job_id)
+            elif context.job_id in expired:
+                reason = 'timed_out'
+            else:
+                continue
+            if not self.abort(context.job_id, reason):
+                # A synchronous request: kill its subprocesses and let it return an error
+                context.cancel(reason)
@@ -0,0 +1,387 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import logging
+import inspect
+import threading
+from abc import ABC, abstractmethod
+from queue import Queue, Empty
+from config import LOCAL_STORAGE_PATH
+from services.job_store import open_sqlite
+from services.job_executor import DEFAULT_LANE
+
+logger = logging.getLogger(__name__)
+
+# How often idle executor threads look for jobs submitted by other gunicorn workers
+QUEUE_POLL_INTERVAL = float(os.environ.get('QUEUE_POLL_INTERVAL', 0.5))
+
+# Route functions that can be run from the queue, keyed by "module.function"
+_task_registry = {}
+# The same functions keyed by URL path, for jobs whose function key changed between deploys
+_endpoint_registry = {}
+
+def task_key(f):
+    """Return the registry key of a route function."""
+    return f"{f.__module__}.{f.__qualname__}"
+
+def register_task(f):
+    """
+    Register a route function so that any worker can run it from a queued job.
+
+    Every gunicorn worker imports all route modules at startup, so a job queued by
+    one worker can be resolved by key and executed by another.
+    """
+    key = task_key(f)
+    _task_registry[key] = f
+    return key
+
+def get_task(key):
+    """Return the route function registered under key, or None."""
+    return _task_registry.get(key)
+
+def register_endpoints(app):
+    """Map every URL path of app to the registered route function it runs."""
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if view is None:
+            continue
+        f = inspect.unwrap(view)
+        if task_key(f) in _task_registry:
+            _endpoint_registry[rule.rule] = f
+
+def resolve_task(job):
+    """
+    Return the route function a job runs, or None.
+
+    Jobs are identified by function key and fall back to their endpoint, so jobs
+    replayed after a deploy that moved or renamed a route function still run.
+    """
+    return get_task(job.get("task")) or _endpoint_registry.get(job.get("endpoint"))
+
+def _owner_id(pid=None):
+    """Identify a process by pid and start time, so a reused pid is not mistaken for it."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return f"{pid}:{psutil.Process(pid).create_time()}"
+    except Exception:
+        return str(pid)
+
+def _owner_alive(owner):
+    """Return True if the process that claimed a job is still running."""
+    if not owner:
+        return False
+    pid, _, create_time = owner.partition(':')
+    try:
+        import psutil
+        if not psutil.pid_exists(int(pid)):
+            return False
+        return not create_time or _owner_id(int(pid)) == owner
+    except ImportError:
+        try:
+            os.kill(int(pid), 0)
+            return True
+        except OSError:
+            return False
+    except Exception:
+        return False
+
+def new_job(job_id, f, data, endpoint, args=(), kwargs=None, lane=None, timeout=None):
+    """
+    Build a queue entry for a route function call.
+
+    Args:
+        job_id (str): The unique job ID
+        f (callable): The route function, registered with register_task
+        data (dict): The request payload
+        endpoint (str): The request path, kept for logging
+        args (tuple): Positional view arguments
+        kwargs (dict): Keyword view arguments
+        lane (str, optional): Concurrency class the job runs in
+        timeout (float, optional): Seconds the job may run before it is killed
+
+    Returns:
+        dict: JSON-serializable job description
+    """
+    return {
+        "job_id": job_id,
+        "task": task_key(f),
+        "endpoint": endpoint,
+        "data": data,
+        "args": list(args),
+        "kwargs": kwargs or {},
+        "lane": lane,
+        "timeout": timeout,
+        "queued_at": time.time()
+    }
+
+class JobQueue(ABC):
+    @abstractmethod
+    def put(self, job: dict, max_length: int = 0) -> bool:
+        pass
+
+    @abstractmethod
+    def get(self, timeout: float = None, lane: str = None):
+        pass
+
+    @abstractmethod
+    def task_done(self, job: dict) -> None:
+        pass
+
+    @abstractmethod
+    def qsize(self, lane: str = None) -> int:
+        pass
+
+    @abstractmethod
+    def remove(self, job_id: str):
+        pass
+
+    @abstractmethod
+    def recover(self, max_attempts: int):
+        pass
+
+class MemoryJobQueue(JobQueue):
+    """In-process FIFO per lane; every gunicorn worker has its own queues"""
+    def __init__(self):
+        self._queues = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, lane):
+        with self._lock:
+            if lane not in self._queues:
+                self._queues[lane] = Queue()
+            return self._queues[lane]
+
+    def put(self, job, max_length=0):
+        queue = self._queue(job.get("lane"))
+        with self._lock:
+            if max_length > 0 and len(self._pending) >= max_length:
+                return False
+            self._pending[job["job_id"]] = job
+            queue.put(job)
+        return True
+
+    def get(self, timeout=None, lane=None):
+        queue = self._queue(lane)
+        while True:
+            try:
+                job = queue.get(timeout=timeout)
+            except Empty:
+                return None
+            with self._lock:
+                if self._pending.pop(job["job_id"], None) is not None:
+                    return job
+            # Removed while it was waiting
+            queue.task_done()
+
+    def task_done(self, job):
+        self._queue(job.get("lane")).task_done()
+
+    def qsize(self, lane=None):
+        with self._lock:
+            if lane is None:
+                return len(self._pending)
+            return sum(1 for job in self._pending.values() if job.get("lane") == lane)
+
+    def remove(self, job_id):
+        with self._lock:
+            return self._pending.pop(job_id, None)
+
+    def recover(self, max_attempts):
+        # Nothing survives a restart of this worker
+        return [], []
+
+class SQLiteJobQueue(JobQueue):
+    """FIFO shared by all gunicorn workers on the host through a SQLite database"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(LOCAL_STORAGE_PATH, 'jobs', 'queue.db')
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_queue (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                queued_at REAL NOT NULL,
+                started_at REAL,
+                owner TEXT,
+                lane TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                job TEXT NOT NULL
+            )
+        """)
+        # Queues created before lanes existed lack the lane column
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(job_queue)")]
+        if 'lane' not in columns:
+            conn.execute("ALTER TABLE job_queue ADD COLUMN lane TEXT")
+            conn.execute("UPDATE job_queue SET lane = ? WHERE lane IS NULL", (DEFAULT_LANE,))
+        if 'attempts' not in columns:
+            conn.execute("ALTER TABLE job_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_status_queued_at ON job_queue (status, queued_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_status_lane_queued_at ON job_queue (status, lane, queued_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = open_sqlite(self.db_path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put(self, job, max_length=0):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Count and insert in one write transaction so the limit holds across workers
+            if max_length > 0:
+                queued = conn.execute("SELECT COUNT(*) FROM job_queue WHERE status = 'queued'").fetchone()[0]
+                if queued >= max_length:
+                    conn.execute("ROLLBACK")
+                    return False
+            conn.execute(
+                "INSERT INTO job_queue (job_id, status, queued_at, lane, job) VALUES (?, 'queued', ?, ?, ?)",
+                (job["job_id"], job["queued_at"], job.get("lane"), json.dumps(job))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+        return True
+
+    def get(self, timeout=None, lane=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self._claim(lane)
+            if job is not None:
+                return job
+
+            wait = QUEUE_POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            # Wake up immediately for local submissions, poll for the other workers'
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _claim(self, lane):
+        conn = self._conn()
+        # Cheap read first so idle threads don't contend for the write lock
+        if conn.execute("SELECT 1 FROM job_queue WHERE status = 'queued' AND lane = ? LIMIT 1", (lane,)).fetchone() is None:
+            return None
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id, job FROM job_queue WHERE status = 'queued' AND lane = ? ORDER BY queued_at LIMIT 1",
+                (lane,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "UPDATE job_queue SET status = 'running', started_at = ?, owner = ? WHERE job_id = ?",
+                (time.time(), _owner_id(), row[0])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return json.loads(row[1])
+
+    def task_done(self, job):
+        self._conn().execute("DELETE FROM job_queue WHERE job_id = ?", (job["job_id"],))
+
+    def remove(self, job_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job FROM job_queue WHERE job_id = ? AND status = 'queued'", (job_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return json.loads(row[0]) if row is not None else None
+
+    def recover(self, max_attempts):
+        """
+        Requeue jobs whose worker died while running them.
+
+        Args:
+            max_attempts (int): Interrupted runs after which a job is given up (0 retries forever)
+
+        Returns:
+            tuple: (requeued jobs, abandoned jobs), each job carrying its "attempts" count
+        """
+        conn = self._conn()
+        requeued, abandoned = [], []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT job_id, owner, attempts, job FROM job_queue WHERE status = 'running'"
+            ).fetchall()
+            for job_id, owner, attempts, job_json in rows:
+                if _owner_alive(owner):
+                    continue
+                job = json.loads(job_json)
+                job["attempts"] = attempts + 1
+                if max_attempts > 0 and job["attempts"] >= max_attempts:
+                    conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+                    abandoned.append(job)
+                else:
+                    conn.execute(
+                        "UPDATE job_queue SET status = 'queued', started_at = NULL, owner = NULL, "
+                        "attempts = ?, job = ? WHERE job_id = ?",
+                        (job["attempts"], json.dumps(job), job_id)
+                    )
+                    requeued.append(job)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if requeued:
+            self._wakeup.set()
+        return requeued, abandoned
+
+    def qsize(self, lane=None):
+        if lane is not None:
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM job_queue WHERE status = 'queued' AND lane = ?", (lane,)
+            ).fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM job_queue WHERE status = 'queued'").fetchone()[0]
+
+def create_job_queue() -> JobQueue:
+    """Create the job queue selected by JOB_QUEUE_BACKEND (sqlite or memory)."""
+    backend = os.environ.get('JOB_QUEUE_BACKEND', 'sqlite').lower()
+    if backend == 'memory':
+        logger.info("Using per-worker in-memory job queue")
+        return MemoryJobQueue()
+    queue = SQLiteJobQueue(os.environ.get('JOB_QUEUE_PATH') or None)
+    logger.info(f"Using shared SQLite job queue at {queue.db_path}")
+    return queue
@@ -0,0 +1,269 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Jobs older than this are removed from the store (0 keeps jobs forever)
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 7 * 24 * 3600))
+# Minimum number of seconds between two compaction runs in the same process
+JOB_COMPACT_INTERVAL = int(os.environ.get('JOB_COMPACT_INTERVAL', 3600))
+
+def open_sqlite(db_path):
+    """
+    Open a SQLite connection tuned for many concurrent readers and writers.
+
+    WAL mode lets readers proceed while a writer is active, which is what the
+    gunicorn workers and executor threads sharing one database need.
+
+    Args:
+        db_path (str): Path to the database file
+
+    Returns:
+        sqlite3.Connection: Connection in autocommit mode
+    """
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+class JobStore(ABC):
+    @abstractmethod
+    def save(self, job_id: str, data: dict) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str):
+        pass
+
+    @abstractmethod
+    def list_statuses(self, since: float) -> dict:
+        pass
+
+    @abstractmethod
+    def compact(self, ttl_seconds: int) -> int:
+        pass
+
+    @abstractmethod
+    def request_cancel(self, job_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def cancel_requests(self, job_ids) -> set:
+        pass
+
+    @abstractmethod
+    def clear_cancel(self, job_id: str) -> None:
+        pass
+
+class FileJobStore(JobStore):
+    """Legacy store writing one JSON file per job to LOCAL_STORAGE_PATH/jobs"""
+    def __init__(self, jobs_dir=None):
+        self.jobs_dir = jobs_dir or os.path.join(LOCAL_STORAGE_PATH, 'jobs')
+
+    def save(self, job_id, data):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        job_file = os.path.join(self.jobs_dir, f"{job_id}.json")
+        with open(job_file, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def get(self, job_id):
+        job_file = os.path.join(self.jobs_dir, f"{job_id}.json")
+        if not os.path.exists(job_file):
+            return None
+        with open(job_file, 'r') as f:
+            return json.load(f)
+
+    def list_statuses(self, since):
+        if not os.path.exists(self.jobs_dir):
+            raise FileNotFoundError("Jobs directory not found")
+
+        jobs_status = {}
+        for filename in os.listdir(self.jobs_dir):
+            if filename.endswith('.json'):
+                job_file = os.path.join(self.jobs_dir, filename)
+                if os.path.getmtime(job_file) >= since:
+                    with open(job_file, 'r') as f:
+                        job_data = json.load(f)
+                    if "job_status" in job_data:
+                        jobs_status[filename[:-len('.json')]] = job_data["job_status"]
+        return jobs_status
+
+    def compact(self, ttl_seconds):
+        if ttl_seconds <= 0 or not os.path.exists(self.jobs_dir):
+            return 0
+        cutoff = time.time() - ttl_seconds
+        removed = 0
+        for filename in os.listdir(self.jobs_dir):
+            job_file = os.path.join(self.jobs_dir, filename)
+            if filename.endswith('.json') and os.path.getmtime(job_file) < cutoff:
+                os.remove(job_file)
+                removed += 1
+        return removed
+
+    def _cancel_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.cancel")
+
+    def request_cancel(self, job_id):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with open(self._cancel_file(job_id), 'w') as f:
+            f.write(str(time.time()))
+
+    def cancel_requests(self, job_ids):
+        return {job_id for job_id in job_ids if os.path.exists(self._cancel_file(job_id))}
+
+    def clear_cancel(self, job_id):
+        try:
+            os.remove(self._cancel_file(job_id))
+        except FileNotFoundError:
+            pass
+
+class SQLiteJobStore(JobStore):
+    """Indexed job store shared by every gunicorn worker on the host"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(LOCAL_STORAGE_PATH, 'jobs', 'jobs.db')
+        self.legacy_store = FileJobStore(os.path.dirname(self.db_path))
+        self._local = threading.local()
+        self._last_compact = 0
+        self._compact_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_updated_at ON jobs (status, updated_at)")
+        # Cancellations requested through any worker, picked up by the worker running the job
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_cancellations (
+                job_id TEXT PRIMARY KEY,
+                requested_at REAL NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = open_sqlite(self.db_path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def save(self, job_id, data):
+        self._conn().execute(
+            """
+            INSERT INTO jobs (job_id, status, updated_at, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(job_id) DO UPDATE SET
+                status = excluded.status,
+                updated_at = excluded.updated_at,
+                data = excluded.data
+            """,
+            (job_id, data.get("job_status"), time.time(), json.dumps(data, separators=(',', ':')))
+        )
+        self._maybe_compact()
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        # Jobs written before the switch to SQLite are still readable
+        return self.legacy_store.get(job_id)
+
+    def list_statuses(self, since):
+        rows = self._conn().execute(
+            "SELECT job_id, status FROM jobs WHERE updated_at >= ? AND status IS NOT NULL",
+            (since,)
+        ).fetchall()
+        return dict(rows)
+
+    def compact(self, ttl_seconds):
+        if ttl_seconds <= 0:
+            return 0
+        cutoff = time.time() - ttl_seconds
+        conn = self._conn()
+        conn.execute("DELETE FROM job_cancellations WHERE requested_at < ?", (cutoff,))
+        cursor = conn.execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def request_cancel(self, job_id):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO job_cancellations (job_id, requested_at) VALUES (?, ?)",
+            (job_id, time.time())
+        )
+
+    def cancel_requests(self, job_ids):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        placeholders = ','.join('?' * len(job_ids))
+        rows = self._conn().execute(
+            f"SELECT job_id FROM job_cancellations WHERE job_id IN ({placeholders})", job_ids
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def clear_cancel(self, job_id):
+        self._conn().execute("DELETE FROM job_cancellations WHERE job_id = ?", (job_id,))
+
+    def _maybe_compact(self):
+        if JOB_TTL_SECONDS <= 0 or time.time() - self._last_compact < JOB_COMPACT_INTERVAL:
+            return
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_compact = time.time()
+            removed = self.compact(JOB_TTL_SECONDS)
+            if removed:
+                logger.info(f"Compacted job store: removed {removed} job(s) older than {JOB_TTL_SECONDS}s")
+        except Exception as e:
+            logger.warning(f"Job store compaction failed: {e}")
+        finally:
+            self._compact_lock.release()
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+def get_job_store() -> JobStore:
+    """Return the process-wide job store selected by JOB_STORE_BACKEND (sqlite or file)."""
+    global _job_store
+
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                backend = os.environ.get('JOB_STORE_BACKEND', 'sqlite').lower()
+                if backend == 'file':
+                    _job_store = FileJobStore()
+                else:
+                    _job_store = SQLiteJobStore(os.environ.get('JOB_STORE_PATH') or None)
+                logger.info(f"Using {type(_job_store).__name__} for job status")
+    return _job_store
@@ -0,0 +1,283 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from services import inference_client
+from services.job_control import current_job
+from services.model_registry import get_model_registry, resolve_device, WHISPER_MODEL
+from services.transcription_backend import transcribe, resolve_backend
+from services.audio_prep import SAMPLE_RATE, prepare_audio, load_samples, detect_silences
+
+logger = logging.getLogger(__name__)
+
+# Media longer than this many seconds is split into chunks transcribed in parallel (0 disables it)
+LONG_MEDIA_CHUNK_SECONDS = float(os.environ.get('LONG_MEDIA_CHUNK_SECONDS', 0))
+# Processes transcribing the chunks of one media file
+LONG_MEDIA_WORKERS = int(os.environ.get('LONG_MEDIA_WORKERS', 2))
+# Seconds an idle chunk pool keeps its processes and their loaded models for the next long media;
+# 0 shuts the pool down after every file
+LONG_MEDIA_POOL_IDLE_SECONDS = float(os.environ.get('LONG_MEDIA_POOL_IDLE_SECONDS', 600))
+
+# Chunks are cut at the longest silence in the last part of each chunk
+_SEARCH_FRACTION = 0.2
+_SILENCE_NOISE = "-30dB"
+_SILENCE_MIN_DURATION = 0.3
+
+# (key, pool, timer) of the pool kept between long media jobs of this worker process
+_idle_pool = None
+_idle_pool_lock = threading.Lock()
+
+def plan_chunks(duration, silences, chunk_seconds):
+    """
+    Choose the cut points of media split into chunks of at most chunk_seconds.
+
+    Each cut is placed in the middle of the longest silence found in the last
+    _SEARCH_FRACTION of the chunk, so no word is split; without one the chunk is
+    cut at its full length.
+
+    Args:
+        duration (float): Length of the media in seconds
+        silences (list): (start, end, duration) tuples from detect_silences
+        chunk_seconds (float): Maximum chunk length in seconds
+
+    Returns:
+        list: Cut points in seconds, excluding 0 and the end of the media
+    """
+    cuts = []
+    start = 0.0
+    while duration - start > chunk_seconds:
+        target = start + chunk_seconds
+        earliest = target - chunk_seconds * _SEARCH_FRACTION
+        candidates = [
+            (silence_duration, (silence_start + silence_end) / 2)
+            for silence_start, silence_end, silence_duration in silences
+            if earliest <= (silence_start + silence_end) / 2 <= target
+        ]
+        cut = max(candidates)[1] if candidates else target
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+def _init_worker(threads, model_name, backend, device):
+    # Keep the pool from oversubscribing the CPU: each process gets its share of the cores
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # Load the model once per process; the pool outlives the job, so later jobs find it loaded
+    try:
+        with get_model_registry().use('whisper' if backend == 'whisper' else 'faster-whisper', model_name, device):
+            pass
+    except Exception as e:
+        # Raising here would make the pool respawn the process forever; the first chunk reports it
+        logger.error(f"Failed to preload {backend} model {model_name} in chunk worker: {e}")
+
+def _transcribe_chunk(path, start, end, model_name, backend, device, options):
+    # Runs in a pool process with the model already loaded.
+    # The chunk is mapped from the job's prepared audio rather than decoded again.
+    return transcribe(load_samples(path, start, end), model_name, backend, device, **options)
+
+def _close_pool(pool):
+    pool.close()
+    pool.join()
+
+def _checkout_pool(key):
+    """Take the idle chunk pool if it was started for key, otherwise start a new one."""
+    global _idle_pool
+    with _idle_pool_lock:
+        idle, _idle_pool = _idle_pool, None
+    if idle is not None:
+        idle_key, pool, timer = idle
+        timer.cancel()
+        if idle_key == key:
+            return pool
+        _close_pool(pool)
+
+    model_name, backend, device, workers = key
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Spawned rather than forked: the parent runs threads and may hold a CUDA context
+    return multiprocessing.get_context('spawn').Pool(
+        workers, initializer=_init_worker, initargs=(threads, model_name, backend, device)
+    )
+
+def _return_pool(key, pool):
+    """Keep a pool that finished its job for the next one, for LONG_MEDIA_POOL_IDLE_SECONDS."""
+    global _idle_pool
+    if LONG_MEDIA_POOL_IDLE_SECONDS <= 0:
+        _close_pool(pool)
+        return
+    timer = threading.Timer(LONG_MEDIA_POOL_IDLE_SECONDS, _expire_pool, (pool,))
+    timer.daemon = True
+    with _idle_pool_lock:
+        previous, _idle_pool = _idle_pool, (key, pool, timer)
+    timer.start()
+    if previous is not None:
+        # Another job finished with a pool at the same time; one idle pool is enough
+        previous[2].cancel()
+        _close_pool(previous[1])
+
+def _expire_pool(pool):
+    global _idle_pool
+    with _idle_pool_lock:
+        if _idle_pool is None or _idle_pool[1] is not pool:
+            return
+        _idle_pool = None
+    logger.info("Shutting down the idle long media pool")
+    _close_pool(pool)
+
+def offset_segment(segment, offset, segment_id):
+    """Return a copy of a Whisper segment of a chunk starting at offset, placed in the whole media."""
+    segment = dict(segment)
+    segment['id'] = segment_id
+    segment['start'] = round(segment['start'] + offset, 3)
+    segment['end'] = round(segment['end'] + offset, 3)
+    if 'seek' in segment:
+        # Whisper's seek counts 10 ms mel frames
+        segment['seek'] += int(round(offset * 100))
+    if segment.get('words'):
+        segment['words'] = [
+            dict(word, start=round(word['start'] + offset, 3), end=round(word['end'] + offset, 3))
+            for word in segment['words']
+        ]
+    return segment
+
+def stitch_results(results, offsets):
+    """
+    Join the Whisper results of consecutive chunks into the result of the whole media.
+
+    Segment and word timestamps are shifted by the offset of their chunk and segment
+    ids are renumbered, so the output has the same structure as a single run.
+    """
+    segments = []
+    for result, offset in zip(results, offsets):
+        for segment in result['segments']:
+            segments.append(offset_segment(segment, offset, len(segments)))
+
+    return {
+        "text": ''.join(result['text'] for result in results),
+        "segments": segments,
+        "language": results[0].get('language') if results else None
+    }
+
+def _wait(async_result):
+    """Wait for a pool result while honouring the current job's cancellation and deadline."""
+    context = current_job()
+    while True:
+        if context is not None:
+            context.check()
+        try:
+            return async_result.get(timeout=1)
+        except multiprocessing.TimeoutError:
+            continue
+
+def transcribe_long_media(media_path, model_name=None, chunk_seconds=None, workers=None, backend=None, audio=None, **options):
+    """
+    Transcribe long media by splitting it at silences and running the chunks in a process pool.
+
+    The media is decoded once; the pool processes memory-map their chunk of the
+    same raw audio file. Each pool process loads the model when it starts, and
+    the pool is kept for the next long media with the same model and workers
+    (see LONG_MEDIA_POOL_IDLE_SECONDS), so only the first one pays for loading it.
+
+    Media no longer than chunk_seconds is transcribed in this process as usual.
+    Without a language the first chunk is transcribed alone and its detected
+    language is used for the rest, so every chunk is decoded in the same language.
+
+    Args:
+        media_path (str): Local media file
+        model_name (str, optional): Whisper model, WHISPER_MODEL by default
+        chunk_seconds (float, optional): Maximum chunk length, LONG_MEDIA_CHUNK_SECONDS by default
+        workers (int, optional): Pool processes, LONG_MEDIA_WORKERS by default
+        backend (str, optional): Transcription backend, WHISPER_BACKEND by default
+        audio (PreparedAudio, optional): The job's decoded audio; decoded here when missing
+        **options: Options for model.transcribe (language, task, word_timestamps, ...)
+
+    Returns:
+        dict: The Whisper result (text, segments, language)
+    """
+    model_name = model_name or WHISPER_MODEL
+    chunk_seconds = chunk_seconds or LONG_MEDIA_CHUNK_SECONDS
+    workers = max(1, workers or LONG_MEDIA_WORKERS)
+    backend = resolve_backend(backend)
+
+    prepared = audio is None
+    if prepared:
+        audio = prepare_audio(media_path)
+    try:
+        duration = audio.duration
+        if not chunk_seconds or duration <= chunk_seconds:
+            return transcribe(audio.samples, model_name, backend, **options)
+
+        start_time = time.time()
+        silences = detect_silences(audio.samples, _SILENCE_NOISE, _SILENCE_MIN_DURATION)
+        bounds = [0.0] + plan_chunks(duration, silences, chunk_seconds) + [duration]
+        chunks = [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in zip(bounds, bounds[1:])]
+        workers = min(workers, len(chunks))
+        logger.info(f"Split {duration:.1f}s of media into {len(chunks)} chunks for {workers} workers")
+
+        results = _transcribe_chunks(audio.path, chunks, workers, model_name, backend, options)
+    finally:
+        if prepared:
+            audio.remove()
+
+    logger.info(f"Transcribed {len(chunks)} chunks of {media_path} in {time.time() - start_time:.2f}s")
+    return stitch_results(results, [start / SAMPLE_RATE for start, _ in chunks])
+
+def _transcribe_chunks(path, chunks, workers, model_name, backend, options):
+    """Transcribe the (start, end) sample ranges of the raw audio file at path in a process pool."""
+    if inference_client.enabled():
+        # The inference server runs the model; threads only keep its queue fed
+        device = None
+        key = None
+        pool = ThreadPool(workers)
+    else:
+        device = resolve_device()
+        key = (model_name, backend, device, workers)
+        pool = _checkout_pool(key)
+    try:
+        options = dict(options)
+        pending = []
+        if not options.get('language'):
+            first = _wait(pool.apply_async(_transcribe_chunk, (path, *chunks[0], model_name, backend, device, options)))
+            options['language'] = first.get('language')
+            results = [first]
+            remaining = chunks[1:]
+        else:
+            results = []
+            remaining = chunks
+        for start, end in remaining:
+            pending.append(pool.apply_async(_transcribe_chunk, (path, start, end, model_name, backend, device, options)))
+        results.extend(_wait(async_result) for async_result in pending)
+
+        if key is None:
+            _close_pool(pool)
+        else:
+            _return_pool(key, pool)
+        pool = None
+        return results
+    finally:
+        if pool is not None:
+            # Cancelled or failed: stop the chunks still running, the next job starts a new pool
+            pool.terminate()
+            pool.join()
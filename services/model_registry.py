@@ -0,0 +1,206 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import gc
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Whisper model used when a request doesn't name one
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+# Device for Whisper models; empty picks CUDA when available, else CPU
+WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE', '')
+# Comma-separated Whisper models to load (and run once) when a worker boots
+WHISPER_WARMUP_MODELS = [m.strip() for m in os.environ.get('WHISPER_WARMUP_MODELS', '').split(',') if m.strip()]
+# Models unused for this many seconds are unloaded (0 keeps them loaded)
+MODEL_IDLE_TIMEOUT = int(os.environ.get('MODEL_IDLE_TIMEOUT', 0))
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        # Held while the model is loaded or used; inference on one model is serialized
+        self.lock = threading.Lock()
+        self.users = 0
+        self.last_used = time.time()
+        # Preloaded in the gunicorn master; unloading it in a worker would free nothing
+        self.pinned = False
+
+class ModelRegistry:
+    """
+    Loaded models of this process, keyed by (kind, name, device).
+
+    A model is loaded on first use and then reused by every job, so a request pays
+    only for inference. Using a model holds its lock: Whisper's decoder installs
+    kv-cache hooks on the shared modules, so two threads must never run the same
+    model at once. Different models (or devices) run in parallel.
+    """
+
+    def __init__(self, idle_timeout=MODEL_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaders = {}
+        self._sweeper_pid = None
+
+    def register_loader(self, kind, loader):
+        """Register loader(name, device) -> model for models of this kind."""
+        self._loaders[kind] = loader
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.users += 1
+            return entry
+
+    @contextmanager
+    def use(self, kind, name, device):
+        """
+        Yield the model for exclusive use, loading it first if needed.
+
+        Args:
+            kind (str): Registered model kind, e.g. 'whisper'
+            name (str): Model name passed to the loader
+            device (str): Resolved device, e.g. 'cpu' or 'cuda'
+        """
+        key = (kind, name, device)
+        entry = self._entry(key)
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    start_time = time.time()
+                    entry.model = self._loaders[kind](name, device)
+                    logger.info(f"Loaded {kind} model {name} on {device} in {time.time() - start_time:.2f}s (PID {os.getpid()})")
+                    self._start_sweeper()
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.time()
+
+    def preload(self, kind, name, device):
+        """Load a model now and pin it, so it is never evicted (used before gunicorn forks)."""
+        key = (kind, name, device)
+        entry = self._entry(key)
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    start_time = time.time()
+                    entry.model = self._loaders[kind](name, device)
+                    logger.info(f"Preloaded {kind} model {name} on {device} in {time.time() - start_time:.2f}s")
+                entry.pinned = True
+                return entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+
+    def loaded(self):
+        """Return the keys of the models currently in memory."""
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.model is not None]
+
+    def evict_idle(self, idle_timeout=None):
+        """Unload models nobody has used for idle_timeout seconds; returns their keys."""
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.users == 0 and not entry.pinned and now - entry.last_used >= idle_timeout:
+                    del self._entries[key]
+                    if entry.model is not None:
+                        evicted.append(key)
+        if evicted:
+            gc.collect()
+            if any(key[2].startswith('cuda') for key in evicted):
+                import torch
+                torch.cuda.empty_cache()
+            logger.info(f"Unloaded idle models: {evicted}")
+        return evicted
+
+    def _start_sweeper(self):
+        # Threads don't survive fork, so every worker starts its own
+        if self.idle_timeout <= 0 or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep, name='model-sweeper', daemon=True).start()
+
+    def _sweep(self):
+        interval = max(1, min(60, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Model eviction failed: {e}")
+
+_registry = ModelRegistry()
+
+def get_model_registry():
+    return _registry
+
+def resolve_device(device=None):
+    """Return device, or WHISPER_DEVICE, or 'cuda' when available and 'cpu' otherwise."""
+    device = device or WHISPER_DEVICE
+    if device:
+        return device
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+def _load_whisper(name, device):
+    import whisper
+    return whisper.load_model(name, device=device)
+
+_registry.register_loader('whisper', _load_whisper)
+
+@contextmanager
+def whisper_model(name=None, device=None):
+    """
+    Borrow a shared Whisper model for one transcription.
+
+    Usage:
+        with whisper_model() as model:
+            result = model.transcribe(path)
+    """
+    with _registry.use('whisper', name or WHISPER_MODEL, resolve_device(device)) as model:
+        yield model
+
+def warmup(models=None):
+    """Load the given (or WHISPER_WARMUP_MODELS) Whisper models and run them once on a second of silence."""
+    import numpy as np
+    from services.transcription_backend import transcribe_local, resolve_backend
+    for name in models if models is not None else WHISPER_WARMUP_MODELS:
+        try:
+            transcribe_local(np.zeros(16000, dtype=np.float32), name, resolve_backend(), fp16=False, verbose=None)
+        except Exception as e:
+            logger.error(f"Warmup of Whisper model {name} failed: {e}")
+
+def start_warmup():
+    """Warm up in the background so a booting worker accepts requests right away; early requests wait for the load."""
+    from services import inference_client
+    # With an inference server the models are loaded (and warmed up) there, not in the workers
+    if WHISPER_WARMUP_MODELS and not inference_client.enabled():
+        threading.Thread(target=warmup, name='model-warmup', daemon=True).start()
@@ -0,0 +1,112 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Models loaded once in the gunicorn master and shared copy-on-write by every worker,
+# e.g. "whisper:base,chatterbox:english". Setting it turns on gunicorn's preload_app.
+PRELOAD_MODELS = [m.strip() for m in os.environ.get('PRELOAD_MODELS', '').split(',') if m.strip()]
+
+# Set by gunicorn.conf.py when the app is imported in the master before forking
+_preloading = os.environ.get('GUNICORN_PRELOAD_APP') == '1'
+_after_fork = []
+
+def after_fork(callback):
+    """
+    Run callback in each worker once it has been forked, or right away without preload.
+
+    Threads don't survive fork, so anything that starts threads (like the job
+    executor) must run in the worker rather than in the master.
+    """
+    if _preloading:
+        _after_fork.append(callback)
+    else:
+        callback()
+
+def run_after_fork():
+    """Called in each worker by the post_worker_init hook."""
+    global _preloading
+    _preloading = False
+    for callback in _after_fork:
+        callback()
+    del _after_fork[:]
+
+def _share_memory(model):
+    """Move a model's tensors into shared memory so workers keep sharing them even if a page is touched."""
+    import torch
+    modules = [model] if isinstance(model, torch.nn.Module) else [
+        value for value in vars(model).values() if isinstance(value, torch.nn.Module)
+    ]
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            # Sparse tensors (Whisper's alignment heads) have no storage to share
+            if not tensor.is_sparse:
+                tensor.share_memory_()
+
+def load_models():
+    """Load PRELOAD_MODELS in the master; a no-op unless gunicorn preloads the app."""
+    if not _preloading or not PRELOAD_MODELS:
+        return
+
+    from services.model_registry import get_model_registry
+
+    for spec in PRELOAD_MODELS:
+        kind, _, name = spec.partition(':')
+        try:
+            if kind == 'whisper':
+                from services.model_registry import resolve_device, WHISPER_MODEL
+                device = resolve_device()
+                if device.startswith('cuda'):
+                    # A CUDA context can't be inherited across fork
+                    logger.warning(f"Not preloading {spec}: models on {device} must be loaded in the worker")
+                    continue
+                model = get_model_registry().preload('whisper', name or WHISPER_MODEL, device)
+            elif kind == 'chatterbox':
+                import torch
+                if torch.cuda.is_available():
+                    logger.warning(f"Not preloading {spec}: models on cuda must be loaded in the worker")
+                    continue
+                from services.v1.chatterbox.tts import get_chatterbox_model
+                model = get_chatterbox_model(model_type=name or 'english', device='cpu')
+            else:
+                logger.warning(f"Unknown model in PRELOAD_MODELS: {spec}")
+                continue
+            _share_memory(model)
+        except Exception as e:
+            # Workers load the model on first use instead
+            logger.error(f"Failed to preload {spec}: {e}")
+
+    # Keep the collector from writing to (and so un-sharing) the pages of preloaded objects
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded models {PRELOAD_MODELS} in master PID {os.getpid()}")
+
+def memory_report():
+    """Return this process's memory use in MB; uss is what the process does not share with others."""
+    import psutil
+    info = psutil.Process().memory_full_info()
+    return {
+        "rss_mb": round(info.rss / 1024 ** 2, 1),
+        "uss_mb": round(info.uss / 1024 ** 2, 1),
+        "pss_mb": round(getattr(info, 'pss', 0) / 1024 ** 2, 1),
+        "shared_mb": round(getattr(info, 'shared', 0) / 1024 ** 2, 1)
+    }
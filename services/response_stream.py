@@ -0,0 +1,79 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import json
+
+# Streaming formats and their content types
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+class StreamingResult:
+    """
+    Payload a route returns to stream progress events ahead of its usual response.
+
+    events is a generator that yields (event, data) pairs while the work runs and
+    returns the route's usual (payload, endpoint, code) tuple. Synchronous requests
+    send every event as it is produced and end with the same response object a
+    non-streaming request gets; queued jobs just run it to completion.
+
+    Usage:
+        def events():
+            for segment in segments:
+                yield "segment", segment
+            return result, "/v1/endpoint", 200
+
+        return StreamingResult(events(), "ndjson"), "/v1/endpoint", 200
+    """
+
+    def __init__(self, events, stream_format="ndjson"):
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(f"Unknown stream format: {stream_format}")
+        self.events = events
+        self.stream_format = stream_format
+
+    @property
+    def mimetype(self):
+        return STREAM_FORMATS[self.stream_format]
+
+    def encode(self, event, data):
+        """Serialize one event; NDJSON lines carry the event name next to its data."""
+        if self.stream_format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, "data": data}) + "\n"
+
+    def encode_result(self, response_obj):
+        """Serialize the final response object, unchanged from the non-streaming response."""
+        if self.stream_format == "sse":
+            return f"event: result\ndata: {json.dumps(response_obj)}\n\n"
+        return json.dumps(response_obj) + "\n"
+
+    def drain(self):
+        """Run the events to completion without sending them and return the route's response tuple."""
+        while True:
+            try:
+                next(self.events)
+            except StopIteration as stop:
+                return stop.value
+
+def resolve(response):
+    """Return a route response, first running a StreamingResult payload to completion."""
+    if isinstance(response[0], StreamingResult):
+        return response[0].drain()
+    return response
@@ -17,28 +17,140 @@
 
 
 import os
+import io
+import time
+import queue
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from urllib.parse import urlparse, quote
+from config import UPLOAD_PART_SIZE, UPLOAD_CONCURRENCY, UPLOAD_CHECKSUM
+from services.client_registry import get_client
+from services import job_control
 
 logger = logging.getLogger(__name__)
 
+# Algorithms S3 accepts for the optional end-to-end checksum of an upload
+S3_CHECKSUM_ALGORITHMS = {'crc32', 'crc32c', 'crc64nvme', 'sha1', 'sha256'}
+
+# Files above one part are split into parts uploaded in parallel; boto3 grows the
+# part size on its own if a file would otherwise exceed 10,000 parts
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_PART_SIZE,
+    multipart_chunksize=UPLOAD_PART_SIZE,
+    max_concurrency=UPLOAD_CONCURRENCY,
+    use_threads=True
+)
+
+# Smallest part of a streamed upload (S3 rejects non-final parts under 5 MiB)
+STREAM_UPLOAD_PART_SIZE = max(5 * 1024 * 1024, int(os.environ.get('STREAM_UPLOAD_PART_SIZE', 8 * 1024 * 1024)))
+# Parts uploaded at the same time while the next one is being read
+STREAM_UPLOAD_PARTS_IN_FLIGHT = max(1, int(os.environ.get('STREAM_UPLOAD_PARTS_IN_FLIGHT', 4)))
+# Attempts per part before the whole upload is aborted
+STREAM_UPLOAD_PART_RETRIES = max(1, int(os.environ.get('STREAM_UPLOAD_PART_RETRIES', 3)))
+# S3 limit on the number of parts of one multipart upload
+MAX_PARTS = 10000
+# Without a Content-Length the part size doubles every this many parts, which keeps
+# 10,000 parts of the 8 MiB default well above the 5 TiB object limit
+PART_SIZE_GROWTH_INTERVAL = 1000
+
+class _PartReader(io.RawIOBase):
+    """Seekable read-only view of a filled pool buffer, so botocore can retry and checksum it."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+def _part_size(part_number, total_size):
+    """Size of a part so that the whole file fits in MAX_PARTS."""
+    if total_size:
+        # Round up to whole MiB so every part but the last has the same size
+        needed = -(-total_size // MAX_PARTS)
+        needed = -(-needed // (1024 * 1024)) * 1024 * 1024
+        return max(STREAM_UPLOAD_PART_SIZE, needed)
+    return STREAM_UPLOAD_PART_SIZE * 2 ** ((part_number - 1) // PART_SIZE_GROWTH_INTERVAL)
+
+def _fill(raw, buffer, size):
+    """Read up to size bytes of raw into buffer; returns the number of bytes read."""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < size:
+        n = raw.readinto(view[filled:size])
+        if not n:
+            break
+        filled += n
+    return filled
+
+def _client_config():
+    options = {
+        # Every concurrent part needs its own connection
+        'max_pool_connections': max(10, UPLOAD_CONCURRENCY * 2)
+    }
+    if UPLOAD_CHECKSUM == 'none':
+        # Only send checksums the operation requires; also needed by S3-compatible stores that reject them
+        options.update(request_checksum_calculation='when_required', response_checksum_validation='when_required')
+    return Config(**options)
+
+def upload_extra_args(extra_args=None):
+    """Add the configured checksum algorithm to the ExtraArgs of an upload."""
+    extra_args = dict(extra_args or {})
+    if UPLOAD_CHECKSUM in S3_CHECKSUM_ALGORITHMS:
+        extra_args['ChecksumAlgorithm'] = UPLOAD_CHECKSUM.upper()
+    return extra_args
+
+def get_s3_client(endpoint_url, access_key, secret_key, region):
+    """
+    Return the process-wide S3 client for these settings.
+
+    boto3 clients are thread-safe, so one client (and its connection pool) is shared
+    by every upload in the worker instead of building a session per call.
+    """
+    def create_client():
+        session = boto3.Session(
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region
+        )
+        return session.client('s3', endpoint_url=endpoint_url, config=_client_config())
+
+    return get_client(('s3', endpoint_url, access_key, secret_key, region), create_client)
+
 def upload_to_s3(file_path, s3_url, access_key, secret_key, bucket_name, region):
     # Parse the S3 URL into bucket, region, and endpoint
     #bucket_name, region, endpoint_url = parse_s3_url(s3_url)
     
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region
-    )
-    
-    client = session.client('s3', endpoint_url=s3_url)
+    client = get_s3_client(s3_url, access_key, secret_key, region)
 
     try:
         # Upload the file to the specified S3 bucket
         with open(file_path, 'rb') as data:
-            client.upload_fileobj(data, bucket_name, os.path.basename(file_path), ExtraArgs={'ACL': 'public-read'})
+            client.upload_fileobj(
+                data, bucket_name, os.path.basename(file_path),
+                ExtraArgs=upload_extra_args({'ACL': 'public-read'}),
+                Config=TRANSFER_CONFIG
+            )
 
         # URL encode the filename for the URL
         encoded_filename = quote(os.path.basename(file_path))
@@ -47,3 +159,140 @@ def upload_to_s3(file_path, s3_url, access_key, secret_key, bucket_name, region)
     except Exception as e:
         logger.error(f"Error uploading file to S3: {e}")
         raise
+
+def _upload_parts(s3_client, bucket_name, key, upload_id, raw, total_size, checksum_args):
+    """
+    Read raw into parts and upload them with a bounded number in flight.
+
+    Returns:
+        tuple: (parts for complete_multipart_upload in part order, bytes uploaded)
+    """
+    # One spare buffer lets the next part download while the others upload
+    buffers = queue.Queue()
+    for _ in range(STREAM_UPLOAD_PARTS_IN_FLIGHT + 1):
+        buffers.put(bytearray(_part_size(1, total_size)))
+    checksum_algorithm = checksum_args.get('ChecksumAlgorithm')
+
+    def upload_part(part_number, buffer, size):
+        try:
+            for attempt in range(1, STREAM_UPLOAD_PART_RETRIES + 1):
+                try:
+                    result = s3_client.upload_part(
+                        Bucket=bucket_name,
+                        Key=key,
+                        PartNumber=part_number,
+                        UploadId=upload_id,
+                        Body=_PartReader(memoryview(buffer)[:size]),
+                        ContentLength=size,
+                        **checksum_args
+                    )
+                    break
+                except Exception as e:
+                    if attempt >= STREAM_UPLOAD_PART_RETRIES:
+                        raise
+                    logger.warning(f"Part {part_number} of {key} failed ({e}), retrying")
+                    time.sleep(min(2 ** attempt, 10))
+            part = {'PartNumber': part_number, 'ETag': result['ETag']}
+            if checksum_algorithm:
+                part[f"Checksum{checksum_algorithm}"] = result[f"Checksum{checksum_algorithm}"]
+            return part
+        finally:
+            buffers.put(buffer)
+
+    parts = []
+    uploaded = 0
+    part_number = 1
+    in_flight = set()
+    context = job_control.current_job()
+
+    with ThreadPoolExecutor(max_workers=STREAM_UPLOAD_PARTS_IN_FLIGHT) as pool:
+        try:
+            while True:
+                if context is not None:
+                    context.check()
+                if part_number > MAX_PARTS:
+                    raise ValueError(f"File exceeds the {MAX_PARTS} part limit of a multipart upload")
+
+                part_size = _part_size(part_number, total_size)
+                # Blocks while every buffer is held by an in-flight part
+                buffer = buffers.get()
+                if len(buffer) < part_size:
+                    buffer = bytearray(part_size)
+                size = _fill(raw, buffer, part_size)
+                # An empty read ends the stream; the first part is sent even when empty
+                if size == 0 and part_number > 1:
+                    buffers.put(buffer)
+                    break
+
+                logger.debug(f"Uploading part {part_number} ({size} bytes)")
+                in_flight.add(pool.submit(upload_part, part_number, buffer, size))
+                uploaded += size
+                part_number += 1
+
+                # Surface failed parts early instead of after the whole download
+                done = {f for f in in_flight if f.done()}
+                for future in done:
+                    parts.append(future.result())
+                in_flight -= done
+
+                if size < part_size:
+                    break
+
+            for future in wait(in_flight).done:
+                parts.append(future.result())
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+
+    parts.sort(key=lambda part: part['PartNumber'])
+    return parts, uploaded
+
+def upload_stream_multipart(client, bucket_name, key, raw, total_size=None, acl='public-read'):
+    """
+    Upload everything readable from raw as one object with a pipelined multipart upload.
+
+    Up to STREAM_UPLOAD_PARTS_IN_FLIGHT parts are uploaded while the next one is read
+    into a buffer from a reusable pool. Failed parts are retried; if the upload cannot
+    complete it is aborted so S3 does not keep (and bill for) the orphaned parts.
+
+    Args:
+        client: S3 client
+        bucket_name (str): Target bucket
+        key (str): Object key
+        raw: Binary stream supporting readinto(); read until EOF
+        total_size (int, optional): Expected size, used to pick the part size
+        acl (str): Canned ACL of the object
+
+    Returns:
+        int: Number of bytes uploaded
+    """
+    checksum_args = upload_extra_args()
+    upload_id = client.create_multipart_upload(Bucket=bucket_name, Key=key, ACL=acl, **checksum_args)['UploadId']
+    try:
+        parts, uploaded = _upload_parts(client, bucket_name, key, upload_id, raw, total_size, checksum_args)
+        logger.info(f"Completing multipart upload of {key} ({len(parts)} parts)")
+        client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except BaseException:
+        logger.warning(f"Aborting multipart upload {upload_id} of {key}")
+        try:
+            client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload {upload_id}: {e}")
+        raise
+    return uploaded
+
+def upload_stream_to_s3(stream, filename, s3_url, access_key, secret_key, bucket_name, region):
+    """Upload a binary stream of unknown length as filename; returns the public URL like upload_to_s3."""
+    client = get_s3_client(s3_url, access_key, secret_key, region)
+    try:
+        upload_stream_multipart(client, bucket_name, filename, stream)
+        return f"{s3_url}/{bucket_name}/{quote(filename)}"
+    except Exception as e:
+        logger.error(f"Error streaming upload to S3: {e}")
+        raise
@@ -0,0 +1,101 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import io
+import os
+import logging
+import threading
+import subprocess
+import ffmpeg
+from services import job_control
+from services.cloud_storage import upload_stream
+
+logger = logging.getLogger(__name__)
+
+# Upload the output of streamable encodes while ffmpeg is still writing it
+STREAMING_UPLOAD = os.environ.get('STREAMING_UPLOAD', 'false').lower() in ('true', '1', 'yes')
+
+# Muxers that never seek back into bytes they already wrote when the output is a pipe,
+# with the options that make them do so (MP4 becomes fragmented MP4)
+STREAMABLE_FORMATS = {
+    'mpegts': {},
+    'mp4': {'movflags': 'frag_keyframe+empty_moov+default_base_moof'},
+    'mp3': {},
+    'wav': {}
+}
+
+# Bytes of ffmpeg's stderr kept for error messages
+STDERR_LIMIT = 64 * 1024
+
+def can_stream_upload(output_format):
+    """Return True if outputs of this ffmpeg format are uploaded while they are encoded."""
+    return STREAMING_UPLOAD and output_format in STREAMABLE_FORMATS
+
+def _drain(pipe, buffer):
+    for data in iter(lambda: pipe.read1(65536), b''):
+        buffer.extend(data)
+        if len(buffer) > STDERR_LIMIT:
+            del buffer[:len(buffer) - STDERR_LIMIT]
+
+class _ProcessOutput(io.RawIOBase):
+    """
+    stdout of a running ffmpeg process. At end of stream it waits for ffmpeg and
+    raises ffmpeg.Error if the encode failed, so the upload is aborted instead of
+    completing with a truncated file.
+    """
+    def __init__(self, cmd, process):
+        self.cmd = cmd
+        self.process = process
+        self.stderr = bytearray()
+        # ffmpeg blocks once the stderr pipe is full, so read it alongside the output
+        self._drainer = threading.Thread(target=_drain, args=(process.stderr, self.stderr), daemon=True)
+        self._drainer.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.process.stdout.readinto(b)
+        if not n:
+            if self.process.wait() != 0:
+                self._drainer.join(timeout=5)
+                raise ffmpeg.Error(self.cmd[0], b'', bytes(self.stderr))
+        return n
+
+def upload_ffmpeg_output(stream, filename, output_format, **output_options):
+    """
+    Encode an ffmpeg-python stream to a pipe and upload the output while it is written.
+
+    Args:
+        stream: ffmpeg-python input or filter stream to encode
+        filename (str): Name of the uploaded object
+        output_format (str): A format in STREAMABLE_FORMATS
+        **output_options: Options for ffmpeg.output, as for a file output
+
+    Returns:
+        str: URL of the uploaded file
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails; the upload is aborted
+    """
+    options = dict(output_options, format=output_format, **STREAMABLE_FORMATS[output_format])
+    cmd = ffmpeg.compile(ffmpeg.output(stream, 'pipe:1', **options), overwrite_output=True)
+    logger.info(f"Running ffmpeg command with streaming upload: {' '.join(cmd)}")
+
+    with job_control.popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        return upload_stream(_ProcessOutput(cmd, process), filename)
@@ -0,0 +1,293 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services import inference_client
+from services.job_control import current_job, attach_job, JobCancelled
+from services.model_registry import get_model_registry, resolve_device, whisper_model, WHISPER_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Transcription backend: "whisper" (openai-whisper) or "faster-whisper" (CTranslate2)
+WHISPER_BACKEND = os.environ.get('WHISPER_BACKEND', 'whisper')
+# CTranslate2 compute type of faster-whisper models; int8 quantizes the weights for fast CPU inference
+FASTER_WHISPER_COMPUTE_TYPE = os.environ.get('FASTER_WHISPER_COMPUTE_TYPE', 'int8')
+
+# Clips of up to 30 seconds transcribed together by openai-whisper in one batch of mel spectrograms
+WHISPER_BATCH_SIZE = int(os.environ.get('WHISPER_BATCH_SIZE', 8))
+
+BACKENDS = ('whisper', 'faster-whisper')
+
+# Whisper's 30 s input window in samples, and the options a batched decode honours
+_CLIP_SAMPLES = 30 * 16000
+_BATCH_OPTIONS = {'task', 'language', 'verbose', 'fp16', 'initial_prompt', 'condition_on_previous_text', 'word_timestamps'}
+# Seconds per timestamp token
+_TIME_PRECISION = 0.02
+
+# openai-whisper options that faster-whisper doesn't take or names differently
+_DROPPED_OPTIONS = {'verbose', 'fp16'}
+_RENAMED_OPTIONS = {'logprob_threshold': 'log_prob_threshold'}
+
+def _load_faster_whisper(name, device):
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        raise RuntimeError("The faster-whisper backend requires the faster-whisper package")
+    # CTranslate2 takes the device index separately
+    device, _, index = device.partition(':')
+    return WhisperModel(name, device=device, device_index=int(index or 0), compute_type=FASTER_WHISPER_COMPUTE_TYPE)
+
+get_model_registry().register_loader('faster-whisper', _load_faster_whisper)
+
+def resolve_backend(backend=None):
+    """Return backend or WHISPER_BACKEND, checking that it is known."""
+    backend = backend or WHISPER_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {backend}")
+    return backend
+
+def faster_whisper_segment(segment, segment_id):
+    """Convert a faster-whisper segment to the segment dict openai-whisper returns."""
+    result_segment = {
+        "id": segment_id,
+        "seek": segment.seek,
+        "start": round(segment.start, 3),
+        "end": round(segment.end, 3),
+        "text": segment.text,
+        "tokens": list(segment.tokens),
+        "temperature": segment.temperature,
+        "avg_logprob": segment.avg_logprob,
+        "compression_ratio": segment.compression_ratio,
+        "no_speech_prob": segment.no_speech_prob
+    }
+    if segment.words is not None:
+        result_segment["words"] = [
+            {"word": word.word, "start": round(word.start, 3), "end": round(word.end, 3), "probability": word.probability}
+            for word in segment.words
+        ]
+    return result_segment
+
+def faster_whisper_options(options):
+    """Translate openai-whisper transcribe options to faster-whisper's."""
+    options = {
+        _RENAMED_OPTIONS.get(key, key): value for key, value in options.items()
+        if key not in _DROPPED_OPTIONS and value is not None
+    }
+    # Greedy decoding like openai-whisper's transcribe() unless a beam is requested
+    options.setdefault('beam_size', 1)
+    return options
+
+def transcribe(audio, model_name=None, backend=None, device=None, **options):
+    """
+    Transcribe audio with a shared model of the chosen backend.
+
+    Every backend returns openai-whisper's result structure: text, language and
+    segments with start, end, text and (with word_timestamps) words. With
+    INFERENCE_SERVER_URL set the inference server runs the model instead of this process.
+
+    Args:
+        audio (str|numpy.ndarray): Media path or 16 kHz mono float32 samples
+        model_name (str, optional): Model size, WHISPER_MODEL by default
+        backend (str, optional): "whisper" or "faster-whisper", WHISPER_BACKEND by default
+        device (str, optional): Device to run on, see resolve_device
+        **options: openai-whisper transcribe options (language, task, word_timestamps, ...)
+
+    Returns:
+        dict: The transcription result
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    if inference_client.enabled():
+        return inference_client.transcribe(audio, model_name, backend, device, **options)
+    return transcribe_local(audio, model_name, backend, device, **options)
+
+def transcribe_local(audio, model_name, backend, device=None, **options):
+    """Transcribe audio with a model loaded in this process; see transcribe."""
+    if backend == 'whisper':
+        with whisper_model(model_name, device) as model:
+            return model.transcribe(audio, **options)
+
+    with get_model_registry().use('faster-whisper', model_name, resolve_device(device)) as model:
+        return _faster_whisper_transcribe(model, audio, options)
+
+def _faster_whisper_transcribe(model, audio, options):
+    segments, info = model.transcribe(audio, **faster_whisper_options(options))
+    # Segments are decoded lazily, so consume them while holding the model
+    segments = [faster_whisper_segment(segment, i) for i, segment in enumerate(segments)]
+    return {
+        "text": ''.join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": info.language
+    }
+
+def _batchable(audio, options):
+    """Whether a batched decode gives the same result transcribe() would for audio."""
+    return (
+        not isinstance(audio, str) and len(audio) <= _CLIP_SAMPLES
+        and not options.get('word_timestamps') and set(options) <= _BATCH_OPTIONS
+    )
+
+def _token_segments(result, tokenizer, duration):
+    """Split the tokens of a decoded 30 s window into segments at its timestamp tokens."""
+    segments = []
+    start = None
+    text_tokens = []
+
+    def add(end):
+        segments.append({
+            "id": len(segments),
+            "seek": 0,
+            "start": round(start or 0.0, 3),
+            "end": round(min(end, duration), 3),
+            "text": tokenizer.decode(text_tokens),
+            "tokens": list(text_tokens),
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob
+        })
+
+    for token in result.tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        seconds = (token - tokenizer.timestamp_begin) * _TIME_PRECISION
+        if start is not None and text_tokens:
+            add(seconds)
+            text_tokens = []
+        start = seconds
+    if text_tokens:
+        add(duration)
+    return segments
+
+def _decode_clips(model, audios, options):
+    """
+    Decode clips of up to 30 s as one batch of log-mel spectrograms.
+
+    Returns results in transcribe()'s structure, with None for clips whose greedy
+    decode fails Whisper's compression or log-probability checks; transcribe()
+    retries those at higher temperatures.
+    """
+    import numpy as np
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.array(audio, dtype=np.float32))), model.dims.n_mels)
+        for audio in audios
+    ]).to(model.device)
+    task = options.get('task', 'transcribe')
+    decoding_options = whisper.DecodingOptions(
+        task=task,
+        language=options.get('language'),
+        temperature=0.0,
+        prompt=options.get('initial_prompt'),
+        fp16=options.get('fp16', True) and model.device.type != 'cpu'
+    )
+    decoded = whisper.decode(model, mels, decoding_options)
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=getattr(model, 'num_languages', 99), task=task)
+
+    results = []
+    for audio, result in zip(audios, decoded):
+        if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+            results.append({"text": "", "segments": [], "language": result.language})
+        elif result.compression_ratio > 2.4 or result.avg_logprob < -1.0:
+            results.append(None)
+        else:
+            segments = _token_segments(result, tokenizer, len(audio) / 16000)
+            results.append({
+                "text": ''.join(segment["text"] for segment in segments),
+                "segments": segments,
+                "language": result.language
+            })
+    return results
+
+def transcribe_batch(audios, model_name, backend, device=None, batch_decode=True, **options):
+    """
+    Transcribe several inputs with the same model and options in this process.
+
+    The model is taken once for the whole batch. With openai-whisper and
+    batch_decode, clips of up to 30 seconds (without word timestamps) are decoded
+    WHISPER_BATCH_SIZE at a time from one batch of mel spectrograms; everything
+    else, and all faster-whisper inputs, are transcribed one after another. Batched
+    decoding can differ slightly from transcribe(), so results of callers that
+    expect transcribe()'s exact output need batch_decode=False.
+
+    Returns:
+        list: One result or exception per input, in order
+    """
+    kind = 'whisper' if backend == 'whisper' else 'faster-whisper'
+    results = [None] * len(audios)
+    with get_model_registry().use(kind, model_name, resolve_device(device)) as model:
+        if backend == 'whisper' and batch_decode:
+            clips = [i for i, audio in enumerate(audios) if _batchable(audio, options)]
+            for start in range(0, len(clips), max(1, WHISPER_BATCH_SIZE)):
+                indexes = clips[start:start + WHISPER_BATCH_SIZE]
+                if len(indexes) < 2:
+                    continue
+                try:
+                    for i, result in zip(indexes, _decode_clips(model, [audios[i] for i in indexes], options)):
+                        results[i] = result
+                except Exception as e:
+                    logger.warning(f"Batched decoding of {len(indexes)} clips failed, transcribing them one by one: {e}")
+
+        for i, audio in enumerate(audios):
+            if results[i] is not None:
+                continue
+            try:
+                if backend == 'whisper':
+                    results[i] = model.transcribe(audio, **options)
+                else:
+                    results[i] = _faster_whisper_transcribe(model, audio, options)
+            except Exception as e:
+                results[i] = e
+    return results
+
+def transcribe_many(audios, model_name=None, backend=None, device=None, **options):
+    """
+    Transcribe several inputs with the same model and options.
+
+    Runs transcribe_batch in this process, or sends the inputs to the inference
+    server INFERENCE_CLIENT_CONCURRENCY at a time so its scheduler batches them.
+
+    Returns:
+        list: One result or exception per input, in order
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    if not inference_client.enabled():
+        return transcribe_batch(audios, model_name, backend, device, **options)
+
+    context = current_job()
+
+    def run(audio):
+        # The requests check the job, so a cancelled batch stops waiting on the server
+        with attach_job(context):
+            try:
+                return inference_client.transcribe(audio, model_name, backend, device, batch_decode=True, **options)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                return e
+
+    workers = max(1, min(len(audios), inference_client.INFERENCE_CLIENT_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, audios))
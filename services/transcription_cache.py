@@ -0,0 +1,312 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from config import LOCAL_STORAGE_PATH
+from services.job_store import open_sqlite
+from services.model_registry import WHISPER_MODEL
+from services.long_media import transcribe_long_media
+from services.transcription_backend import transcribe, transcribe_many, resolve_backend
+from services.transcription_stream import stream_transcribe
+
+logger = logging.getLogger(__name__)
+
+# Byte budget of the transcription cache (compressed results; 0 disables it)
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Options that only change logging, not the result
+_IGNORED_OPTIONS = {'verbose'}
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TranscriptionCache:
+    """
+    Whisper results keyed by media content, model and transcription options.
+
+    Results are stored as zlib-compressed JSON inside one SQLite database shared by
+    all gunicorn workers; least recently used entries are evicted beyond max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=TRANSCRIPTION_CACHE_MAX_BYTES):
+        self.path = path or os.path.join(LOCAL_STORAGE_PATH, 'cache', 'transcriptions.db')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                result BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = open_sqlite(self.path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        self._conn().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    @staticmethod
+    def key(media_hash, model, options):
+        """Build the cache key of a transcription of media_hash with model and options."""
+        options = {k: v for k, v in options.items() if k not in _IGNORED_OPTIONS and v is not None}
+        material = json.dumps({"media": media_hash, "model": model, "options": options}, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key, *fallback_keys):
+        """Return the cached result for key, or for the first of fallback_keys stored, or None."""
+        conn = self._conn()
+        for key in (key,) + fallback_keys:
+            row = conn.execute("SELECT result FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                break
+        else:
+            self._count('misses')
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count('hits')
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, model, result):
+        """Store a result under key, then evict down to the byte budget."""
+        blob = zlib.compress(json.dumps(result, separators=(',', ':')).encode('utf-8'), 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, model, result, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, blob, len(blob), now, now)
+        )
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+            logger.info(f"Evicted {evicted} transcription cache entries, {total} bytes remain")
+        return evicted
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        conn = self._conn()
+        stats = {name: 0 for name in ('hits', 'misses', 'evictions')}
+        stats.update(dict(conn.execute("SELECT name, value FROM counters").fetchall()))
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(stats['hits'] / lookups, 3) if lookups else None
+        })
+        return stats
+
+_transcription_cache = None
+_transcription_cache_failed = False
+_transcription_cache_lock = threading.Lock()
+
+def get_transcription_cache():
+    """Return the process-wide transcription cache, or None when it is disabled or unusable."""
+    global _transcription_cache, _transcription_cache_failed
+
+    if TRANSCRIPTION_CACHE_MAX_BYTES <= 0 or _transcription_cache_failed:
+        return None
+    if _transcription_cache is None:
+        with _transcription_cache_lock:
+            if _transcription_cache is None and not _transcription_cache_failed:
+                try:
+                    _transcription_cache = TranscriptionCache(os.environ.get('TRANSCRIPTION_CACHE_PATH') or None)
+                    logger.info(f"Using transcription cache at {_transcription_cache.path} ({TRANSCRIPTION_CACHE_MAX_BYTES} bytes)")
+                except Exception as e:
+                    # Transcription keeps working without the cache
+                    logger.error(f"Transcription cache disabled: {e}")
+                    _transcription_cache_failed = True
+    return _transcription_cache
+
+def _lookup(media_path, model_name, backend, options, batched=False):
+    """
+    Return (cache, key, cache_model, result) for a transcription; result is None on a miss.
+
+    With batched, key is the entry of a batch-decoded result, and a result stored
+    by an unbatched run of the same options is preferred when there is one.
+    """
+    # Results of other backends are stored apart from openai-whisper's
+    cache_model = model_name if backend == 'whisper' else f"{backend}:{model_name}"
+    cache = get_transcription_cache()
+    if cache is None:
+        return None, None, cache_model, None
+    try:
+        media_hash = file_hash(media_path)
+        key = cache.key(media_hash, cache_model, options)
+        if batched:
+            batched_key = cache.key(media_hash, cache_model, dict(options, batched=True))
+            result = cache.get(key, batched_key)
+            key = batched_key
+        else:
+            result = cache.get(key)
+        if result is not None:
+            logger.info(f"Transcription cache hit for {media_path}")
+        return cache, key, cache_model, result
+    except Exception as e:
+        logger.warning(f"Transcription cache lookup failed for {media_path}: {e}")
+        return None, None, cache_model, None
+
+def _store(cache, key, cache_model, media_path, result):
+    if key is None:
+        return
+    try:
+        cache.put(key, cache_model, result)
+    except Exception as e:
+        logger.warning(f"Failed to store transcription of {media_path}: {e}")
+
+def transcribe_with_cache(media_path, model_name=None, chunk_seconds=None, chunk_workers=None, backend=None, audio=None, **options):
+    """
+    Transcribe media_path, or return the stored result of an identical earlier run.
+
+    Args:
+        media_path (str): Local media file
+        model_name (str, optional): Whisper model, WHISPER_MODEL by default
+        chunk_seconds (float, optional): Split media longer than this at silences and
+            transcribe the chunks in parallel (see services.long_media)
+        chunk_workers (int, optional): Processes transcribing the chunks
+        backend (str, optional): Transcription backend, WHISPER_BACKEND by default
+        audio (PreparedAudio, optional): Decoded samples of media_path to transcribe instead
+            of decoding the file again; media_path still keys the cache
+        **options: Options for model.transcribe (language, task, word_timestamps, ...)
+
+    Returns:
+        dict: The Whisper result (text, segments, language)
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    # Chunked results can differ slightly at the cuts, so the chunk size is part of the key
+    key_options = dict(options, chunk_seconds=chunk_seconds) if chunk_seconds else options
+    cache, key, cache_model, result = _lookup(media_path, model_name, backend, key_options)
+    if result is not None:
+        return result
+
+    if chunk_seconds:
+        result = transcribe_long_media(media_path, model_name, chunk_seconds, chunk_workers, backend, audio, **options)
+    else:
+        result = transcribe(audio.samples if audio is not None else media_path, model_name, backend, **options)
+
+    _store(cache, key, cache_model, media_path, result)
+    return result
+
+def transcribe_many_with_cache(media_paths, model_name=None, backend=None, audios=None, **options):
+    """
+    Transcribe several media files with the same options, serving repeats from the cache.
+
+    The files not in the cache are transcribed together (see
+    transcription_backend.transcribe_many), so short clips share batched inference.
+    Batched decoding can differ slightly from transcribe(), so these results are
+    stored apart from transcribe_with_cache's; a file it already transcribed is
+    still served from its entry.
+
+    Args:
+        media_paths (list): Local media files
+        model_name (str, optional): Whisper model, WHISPER_MODEL by default
+        backend (str, optional): Transcription backend, WHISPER_BACKEND by default
+        audios (list, optional): PreparedAudio of each file, read only for cache misses
+        **options: Options for model.transcribe (language, task, word_timestamps, ...)
+
+    Returns:
+        list: One result or exception per file, in order
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    results = [None] * len(media_paths)
+    misses = []
+    for i, media_path in enumerate(media_paths):
+        cache, key, cache_model, result = _lookup(media_path, model_name, backend, options, batched=True)
+        if result is not None:
+            results[i] = result
+            continue
+        try:
+            audio = audios[i].samples if audios is not None else media_path
+        except Exception as e:
+            results[i] = e
+            continue
+        misses.append((i, audio, cache, key, cache_model))
+
+    if misses:
+        transcribed = transcribe_many([audio for _, audio, _, _, _ in misses], model_name, backend, **options)
+        for (i, _, cache, key, cache_model), result in zip(misses, transcribed):
+            results[i] = result
+            if not isinstance(result, Exception):
+                _store(cache, key, cache_model, media_paths[i], result)
+    return results
+
+def stream_with_cache(media_path, model_name=None, backend=None, audio=None, **options):
+    """
+    Yield the segments of media_path as they are transcribed, or all at once from the cache.
+
+    The generator returns the complete result like transcribe_with_cache; see
+    services.transcription_stream.stream_transcribe.
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    # Streaming gives the same result as one unchunked run, so the two share cache entries
+    cache, key, cache_model, result = _lookup(media_path, model_name, backend, options)
+    if result is not None:
+        yield from result['segments']
+        return result
+
+    result = yield from stream_transcribe(media_path, model_name, backend, audio=audio, **options)
+    _store(cache, key, cache_model, media_path, result)
+    return result
@@ -0,0 +1,199 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import sys
+import queue
+import types
+import logging
+import importlib
+import threading
+from services import inference_client
+from services.job_control import current_job, JobCancelled
+from services.model_registry import get_model_registry, resolve_device, WHISPER_MODEL
+from services.transcription_backend import (
+    transcribe, transcribe_local, resolve_backend, faster_whisper_segment, faster_whisper_options
+)
+from services.audio_prep import prepare_audio
+
+logger = logging.getLogger(__name__)
+
+# Seconds between cancellation checks while waiting for the next window
+_POLL_INTERVAL = 0.5
+
+# Set on the thread running openai-whisper's transcribe() to receive its segments
+_window_hook = threading.local()
+_window_hook_lock = threading.Lock()
+_window_hook_installed = None
+
+class _TqdmProxy(types.ModuleType):
+    """Stands in for the tqdm module inside whisper.transcribe; only tqdm.tqdm is replaced."""
+
+    def __init__(self, module, progress):
+        super().__init__(module.__name__)
+        self._module = module
+        self.tqdm = progress
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+def _window_segments(frame):
+    # The all_segments list of the transcribe() call advancing the progress bar
+    if frame.f_code.co_name != 'transcribe':
+        return None
+    return frame.f_locals.get('all_segments')
+
+def _install_window_hook():
+    """
+    Have openai-whisper's transcribe() report its segments after every 30 s window.
+
+    transcribe() takes no callback, but it advances its progress bar right after
+    adding a window's segments to all_segments, so a progress bar that reads them
+    from the calling frame sees each window as soon as it is decoded. This relies
+    on the openai-whisper version pinned in requirements.txt. The progress bar
+    behaves as usual on threads without _window_hook.on_window, e.g. unstreamed
+    transcriptions.
+
+    Returns:
+        bool: False if whisper.transcribe doesn't have the expected shape; segments
+            then arrive all at once when the run is done
+    """
+    global _window_hook_installed
+    with _window_hook_lock:
+        if _window_hook_installed is not None:
+            return _window_hook_installed
+        module = importlib.import_module('whisper.transcribe')
+        tqdm_module = getattr(module, 'tqdm', None)
+        if not isinstance(tqdm_module, types.ModuleType) or not hasattr(tqdm_module, 'tqdm'):
+            logger.warning("whisper.transcribe has no tqdm progress bar to hook, streamed segments arrive at the end")
+            _window_hook_installed = False
+            return False
+
+        class _WindowProgress(tqdm_module.tqdm):
+            def update(self, n=1):
+                on_window = getattr(_window_hook, 'on_window', None)
+                if on_window is not None:
+                    on_window(_window_segments(sys._getframe(1)))
+                return super().update(n)
+
+        module.tqdm = _TqdmProxy(tqdm_module, _WindowProgress)
+        _window_hook_installed = True
+        return True
+
+def _stream_whisper(audio, model_name, device, options):
+    # A single transcribe() run in a thread, so the result is exactly the unstreamed one,
+    # with every window's segments handed over as soon as it is decoded
+    _install_window_hook()
+    context = current_job()
+    handoff = queue.Queue()
+    stopped = threading.Event()
+    handed = 0
+    missing = False
+
+    def on_window(segments):
+        nonlocal handed, missing
+        # Raising here aborts transcribe() and frees the model
+        if stopped.is_set():
+            raise JobCancelled('cancelled')
+        if context is not None:
+            context.check()
+        if segments is None:
+            if not missing:
+                missing = True
+                logger.warning("Whisper's transcribe() has no all_segments, streamed segments arrive at the end")
+            return
+        if len(segments) > handed:
+            handoff.put(('segments', segments[handed:]))
+            handed = len(segments)
+
+    def run():
+        _window_hook.on_window = on_window
+        try:
+            handoff.put(('result', transcribe_local(audio.samples, model_name, 'whisper', device, **options)))
+        except BaseException as e:
+            handoff.put(('error', e))
+        finally:
+            _window_hook.on_window = None
+
+    threading.Thread(target=run, name='whisper-stream', daemon=True).start()
+    yielded = 0
+    try:
+        while True:
+            try:
+                kind, value = handoff.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if context is not None:
+                    context.check()
+                continue
+            if kind == 'error':
+                raise value
+            if kind == 'result':
+                # Everything not handed over per window (all of it without the hook) is sent now
+                yield from value['segments'][yielded:]
+                return value
+            yielded += len(value)
+            yield from value
+    finally:
+        stopped.set()
+
+def _stream_faster_whisper(audio, model_name, device, options):
+    # faster-whisper decodes segments lazily, so each one is yielded as soon as it exists
+    segments = []
+    with get_model_registry().use('faster-whisper', model_name, resolve_device(device)) as model:
+        decoded, info = model.transcribe(audio.samples, **faster_whisper_options(options))
+        for segment in decoded:
+            segment = faster_whisper_segment(segment, len(segments))
+            segments.append(segment)
+            yield segment
+    return {
+        "text": ''.join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": info.language
+    }
+
+def stream_transcribe(media_path, model_name=None, backend=None, device=None, audio=None, **options):
+    """
+    Transcribe media_path, yielding each segment as soon as it is decoded.
+
+    The generator returns the complete result (text, segments, language) once the
+    media is done, identical to what transcribe() returns for the same media.
+    faster-whisper streams its segments natively and openai-whisper after each of
+    its 30 s windows. The inference server returns whole results, so through it
+    all segments arrive together at the end.
+
+    Pass the job's PreparedAudio as audio to reuse its decoded samples.
+
+    Usage:
+        stream = stream_transcribe(path, word_timestamps=True)
+        result = yield from stream
+    """
+    model_name = model_name or WHISPER_MODEL
+    backend = resolve_backend(backend)
+    prepared = audio is None
+    if prepared:
+        audio = prepare_audio(media_path)
+    try:
+        if inference_client.enabled():
+            result = transcribe(audio.samples, model_name, backend, device, **options)
+            yield from result['segments']
+            return result
+        if backend == 'faster-whisper':
+            return (yield from _stream_faster_whisper(audio, model_name, device, options))
+        return (yield from _stream_whisper(audio, model_name, device, options))
+    finally:
+        if prepared:
+            audio.remove()
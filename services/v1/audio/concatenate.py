@@ -18,7 +18,8 @@
 
 import os
 import ffmpeg
-from services.file_management import download_file
+from services.file_management import download_files
+from services.job_control import run_ffmpeg
 from config import LOCAL_STORAGE_PATH
 
 def process_audio_concatenate(media_urls, job_id, webhook_url=None):
@@ -28,11 +29,8 @@ def process_audio_concatenate(media_urls, job_id, webhook_url=None):
     output_path = os.path.join(LOCAL_STORAGE_PATH, output_filename)
 
     try:
-        # Download all media files
-        for i, media_item in enumerate(media_urls):
-            url = media_item['audio_url']
-            input_filename = download_file(url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input_{i}"))
-            input_files.append(input_filename)
+        # Download all media files concurrently
+        input_files = download_files([media_item['audio_url'] for media_item in media_urls], LOCAL_STORAGE_PATH)
 
         # Generate an absolute path concat list file for FFmpeg
         concat_file_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_concat_list.txt")
@@ -42,14 +40,14 @@ def process_audio_concatenate(media_urls, job_id, webhook_url=None):
                 concat_file.write(f"file '{os.path.abspath(input_file)}'\n")
 
         # Use the concat demuxer to concatenate the audio files without re-encoding
-        (
+        run_ffmpeg(
             ffmpeg.input(concat_file_path, format='concat', safe=0).
-                output(output_path, c='copy').
-                run(overwrite_output=True)
+                output(output_path, c='copy'),
+            overwrite_output=True
         )
 
         # Clean up input files
-        for f in input_files:
+        for f in set(input_files):
             os.remove(f)
             
         os.remove(concat_file_path)  # Remove the concat list file after the operation
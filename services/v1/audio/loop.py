@@ -19,6 +19,7 @@
 import os
 import ffmpeg
 from services.file_management import download_file
+from services.job_control import run_ffmpeg
 from config import LOCAL_STORAGE_PATH
 
 def process_audio_loop(audio_url, loop_count, job_id, webhook_url=None):
@@ -38,10 +39,10 @@ def process_audio_loop(audio_url, loop_count, job_id, webhook_url=None):
                 concat_file.write(f"file '{os.path.abspath(input_filename)}'\n")
 
         # Use the concat demuxer to loop the audio file without re-encoding
-        (
+        run_ffmpeg(
             ffmpeg.input(concat_file_path, format='concat', safe=0).
-                output(output_path, c='copy').
-                run(overwrite_output=True)
+                output(output_path, c='copy'),
+            overwrite_output=True
         )
 
         # Clean up input file and concat list
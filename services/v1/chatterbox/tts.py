@@ -21,6 +21,7 @@ import torch
 import torchaudio
 from config import LOCAL_STORAGE_PATH
 from services.file_management import download_file
+from services import inference_client
 
 # Cache for loaded models to avoid reloading
 _model_cache = {}
@@ -80,6 +81,55 @@ def get_chatterbox_model(model_type="english", device=None):
     return _model_cache[cache_key]
 
 
+def save_wav(wav, output_path):
+    """Save a generated waveform (tensor or numpy array) as a 24 kHz WAV file."""
+    if isinstance(wav, torch.Tensor):
+        # If wav is a tensor, save using torchaudio
+        torchaudio.save(output_path, wav.unsqueeze(0) if wav.dim() == 1 else wav, 24000)
+    else:
+        # If wav is numpy array or other format
+        import numpy as np
+        if isinstance(wav, np.ndarray):
+            wav_tensor = torch.from_numpy(wav)
+            torchaudio.save(output_path, wav_tensor.unsqueeze(0) if wav_tensor.dim() == 1 else wav_tensor, 24000)
+
+
+def generate_speech(text, output_path, language="en", emotion_intensity=0.5, model_type="english", audio_prompt_path=None):
+    """
+    Generate speech with a Chatterbox model of this process and save it to output_path.
+
+    Args:
+        text: Text to convert to speech
+        output_path: WAV file to write
+        language: Language code, used by the multilingual model
+        emotion_intensity: Emotion exaggeration level (0.0 to 2.0)
+        model_type: "english" or "multilingual"
+        audio_prompt_path: Reference voice to clone, 24 kHz WAV
+
+    Returns:
+        Path to generated audio file
+    """
+    model = get_chatterbox_model(model_type=model_type)
+
+    # Only multilingual model supports language_id parameter
+    kwargs = {"exaggeration": emotion_intensity}
+    if audio_prompt_path:
+        kwargs["audio_prompt_path"] = audio_prompt_path
+    if model_type == "multilingual" and language:
+        kwargs["language_id"] = language
+    wav = model.generate(text, **kwargs)
+
+    save_wav(wav, output_path)
+    return output_path
+
+
+def _synthesize(text, output_path, language, emotion_intensity, model_type, audio_prompt_path=None):
+    # With an inference server the model lives there and this worker only sends the text
+    if inference_client.enabled():
+        return inference_client.text_to_speech(text, output_path, language, emotion_intensity, model_type, audio_prompt_path)
+    return generate_speech(text, output_path, language, emotion_intensity, model_type, audio_prompt_path)
+
+
 def process_text_to_speech(text, job_id, language="en", emotion_intensity=0.5, model_type="english"):
     """
     Convert text to speech using Chatterbox TTS.
@@ -98,30 +148,11 @@ def process_text_to_speech(text, job_id, language="en", emotion_intensity=0.5, m
     output_path = os.path.join(LOCAL_STORAGE_PATH, output_filename)
 
     try:
-        # Load model
-        model = get_chatterbox_model(model_type=model_type)
-
         # Generate speech
         print(f"Generating speech for text: {text[:50]}... (language: {language}, model: {model_type})")
 
-        # Generate audio waveform
-        # Only multilingual model supports language_id parameter
-        if model_type == "multilingual" and language:
-            wav = model.generate(text, language_id=language, exaggeration=emotion_intensity)
-        else:
-            # English model or no language specified
-            wav = model.generate(text, exaggeration=emotion_intensity)
-
-        # Save audio file
-        if isinstance(wav, torch.Tensor):
-            # If wav is a tensor, save using torchaudio
-            torchaudio.save(output_path, wav.unsqueeze(0) if wav.dim() == 1 else wav, 24000)
-        else:
-            # If wav is numpy array or other format
-            import numpy as np
-            if isinstance(wav, np.ndarray):
-                wav_tensor = torch.from_numpy(wav)
-                torchaudio.save(output_path, wav_tensor.unsqueeze(0) if wav_tensor.dim() == 1 else wav_tensor, 24000)
+        # Generate audio waveform and save audio file
+        _synthesize(text, output_path, language, emotion_intensity, model_type)
 
         print(f"Text-to-speech generation successful: {output_path}")
 
@@ -163,9 +194,6 @@ def process_voice_cloning(text, voice_audio_url, job_id, language="en", emotion_
             os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_reference")
         )
 
-        # Load model
-        model = get_chatterbox_model(model_type=model_type)
-
         # Load reference audio
         reference_wav, sample_rate = torchaudio.load(reference_audio_path)
 
@@ -182,32 +210,12 @@ def process_voice_cloning(text, voice_audio_url, job_id, language="en", emotion_
         temp_ref_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_ref_temp.wav")
         torchaudio.save(temp_ref_path, reference_wav, 24000)
 
-        if model_type == "multilingual" and language:
-            wav = model.generate(
-                text,
-                audio_prompt_path=temp_ref_path,
-                language_id=language,
-                exaggeration=emotion_intensity
-            )
-        else:
-            wav = model.generate(
-                text,
-                audio_prompt_path=temp_ref_path,
-                exaggeration=emotion_intensity
-            )
-
-        # Clean up temp file
-        if os.path.exists(temp_ref_path):
-            os.remove(temp_ref_path)
-
-        # Save audio file
-        if isinstance(wav, torch.Tensor):
-            torchaudio.save(output_path, wav.unsqueeze(0) if wav.dim() == 1 else wav, 24000)
-        else:
-            import numpy as np
-            if isinstance(wav, np.ndarray):
-                wav_tensor = torch.from_numpy(wav)
-                torchaudio.save(output_path, wav_tensor.unsqueeze(0) if wav_tensor.dim() == 1 else wav_tensor, 24000)
+        try:
+            _synthesize(text, output_path, language, emotion_intensity, model_type, audio_prompt_path=temp_ref_path)
+        finally:
+            # Clean up temp file
+            if os.path.exists(temp_ref_path):
+                os.remove(temp_ref_path)
 
         print(f"Voice cloning successful: {output_path}")
 
@@ -20,7 +20,8 @@ import os
 import subprocess
 import json
 import re
-from services.file_management import download_file
+from services.file_management import download_file, download_files
+from services.job_control import run_subprocess
 from config import LOCAL_STORAGE_PATH
 
 def get_extension_from_format(format_name):
@@ -58,7 +59,7 @@ def get_metadata(filename, metadata_requests, job_id):
             thumbnail_filename
         ]
         try:
-            subprocess.run(thumbnail_command, check=True, capture_output=True, text=True)
+            run_subprocess(thumbnail_command, check=True, capture_output=True, text=True)
             if os.path.exists(thumbnail_filename):
                 metadata['thumbnail'] = thumbnail_filename  # Return local path instead of URL
         except subprocess.CalledProcessError as e:
@@ -76,7 +77,7 @@ def get_metadata(filename, metadata_requests, job_id):
             '-show_streams',
             filename
         ]
-        result = subprocess.run(ffprobe_command, capture_output=True, text=True)
+        result = run_subprocess(ffprobe_command, capture_output=True, text=True)
         probe_data = json.loads(result.stdout)
         
         if metadata_requests.get('duration'):
@@ -106,16 +107,14 @@ def process_ffmpeg_compose(data, job_id):
         if "argument" in option and option["argument"] is not None:
             command.append(str(option["argument"]))
     
-    # Add inputs
-    input_paths = []
-    for input_data in data["inputs"]:
+    # Add inputs, downloaded concurrently up front
+    input_paths = download_files([input_data["file_url"] for input_data in data["inputs"]], LOCAL_STORAGE_PATH)
+    for input_data, input_path in zip(data["inputs"], input_paths):
         if "options" in input_data:
             for option in input_data["options"]:
                 command.append(option["option"])
                 if "argument" in option and option["argument"] is not None:
                     command.append(str(option["argument"]))
-        input_path = download_file(input_data["file_url"], LOCAL_STORAGE_PATH)
-        input_paths.append(input_path)
         command.extend(["-i", input_path])
     
     # Add filters
@@ -156,7 +155,7 @@ def process_ffmpeg_compose(data, job_id):
     
     # Execute FFmpeg command
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        run_subprocess(command, check=True, capture_output=True, text=True)
     except subprocess.CalledProcessError as e:
         raise Exception(f"FFmpeg command failed: {e.stderr}")
     
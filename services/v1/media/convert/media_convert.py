@@ -19,13 +19,15 @@ import ffmpeg
 import subprocess
 import logging
 from services.file_management import download_file
+from services.job_control import run_ffmpeg
+from services.streaming_upload import upload_ffmpeg_output
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def process_media_convert(media_url, job_id, output_format='mp4', video_codec='libx264', video_preset='medium', video_crf=23, audio_codec='aac', audio_bitrate='128k', webhook_url=None):
+def process_media_convert(media_url, job_id, output_format='mp4', video_codec='libx264', video_preset='medium', video_crf=23, audio_codec='aac', audio_bitrate='128k', webhook_url=None, stream_upload=False):
     """
     Convert media to specified format with customizable encoding settings.
     
@@ -39,9 +41,11 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
         audio_codec (str): Audio codec to use (default: 'aac')
         audio_bitrate (str): Audio bitrate (default: '128k')
         webhook_url (str, optional): URL to send completion webhook
+        stream_upload (bool): Upload the output while it is encoded (see
+            streaming_upload.can_stream_upload) instead of writing it to disk
         
     Returns:
-        str: Path to the converted output file
+        str: Path to the converted output file, or its URL when stream_upload is set
     """
     input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     output_filename = f"{job_id}.{output_format}"
@@ -94,6 +98,14 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
             if audio_codec != 'copy':
                 output_options['b:a'] = audio_bitrate
         
+        if stream_upload:
+            # The encode and the upload overlap; nothing is written to LOCAL_STORAGE_PATH
+            stream_options = {k: v for k, v in output_options.items() if k != 'format'}
+            cloud_url = upload_ffmpeg_output(stream, output_filename, output_format, **stream_options)
+            os.remove(input_filename)
+            logger.info(f"Media conversion streamed to {cloud_url} in format {output_format}")
+            return cloud_url
+
         # Configure output
         stream = ffmpeg.output(stream, output_path, **output_options)
         
@@ -102,7 +114,7 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
         logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
         
         # Run the conversion
-        ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        run_ffmpeg(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
         
         # Clean up input file
         os.remove(input_filename)
@@ -20,10 +20,17 @@ import os
 import ffmpeg
 import requests
 from services.file_management import download_file
+from services.job_control import run_ffmpeg
+from services.streaming_upload import upload_ffmpeg_output
 from config import LOCAL_STORAGE_PATH
 
-def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None):
-    """Convert media to MP3 format with specified bitrate and sample rate."""
+def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None, stream_upload=False):
+    """
+    Convert media to MP3 format with specified bitrate and sample rate.
+
+    With stream_upload the MP3 is uploaded while it is encoded and its URL is
+    returned instead of a local path.
+    """
     input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     output_filename = f"{job_id}.mp3"
     output_path = os.path.join(LOCAL_STORAGE_PATH, output_filename)
@@ -37,12 +44,18 @@ def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None):
         if sample_rate is not None:
             output_options['ar'] = sample_rate
             
+        if stream_upload:
+            cloud_url = upload_ffmpeg_output(stream, output_filename, 'mp3', **output_options)
+            os.remove(input_filename)
+            print(f"Conversion streamed to {cloud_url} with bitrate {bitrate}")
+            return cloud_url
+
         # Convert media file to MP3 with specified options
-        (
+        run_ffmpeg(
             stream
             .output(output_path, **output_options)
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
+            .overwrite_output(),
+            capture_stdout=True, capture_stderr=True
         )
         os.remove(input_filename)
         sample_rate_info = f" and sample rate {sample_rate}Hz" if sample_rate is not None else ""
@@ -17,11 +17,18 @@
 
 
 import os
-import whisper
 import srt
+import threading
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from whisper.utils import WriteSRT, WriteVTT
-from services.file_management import download_file
+from services.file_management import download_file, DOWNLOAD_CONCURRENCY
+from services.job_control import current_job
+from services.transcription_backend import WHISPER_BATCH_SIZE
+from services.transcription_cache import transcribe_with_cache, stream_with_cache, transcribe_many_with_cache
+from services.long_media import LONG_MEDIA_CHUNK_SECONDS
+from services.vad import extract_speech, VAD_METHOD
+from services.audio_prep import prepare_audio
 import logging
 from config import LOCAL_STORAGE_PATH
 
@@ -29,8 +36,151 @@ from config import LOCAL_STORAGE_PATH
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None):
-    """Transcribe or translate media and return the transcript/translation, SRT or VTT file path."""
+def process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None, chunk_duration=None, chunk_workers=None, vad=None):
+    """
+    Transcribe or translate media and return the transcript/translation, SRT or VTT file path.
+
+    Media longer than chunk_duration seconds (LONG_MEDIA_CHUNK_SECONDS by default) is split
+    at silences and its chunks are transcribed by chunk_workers processes in parallel.
+    With vad ("energy" or "silencedetect", VAD_METHOD by default) non-speech is dropped
+    before inference; the fourth returned value then reports the seconds skipped.
+    """
+    events = stream_transcribe_media(
+        media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type,
+        language, job_id, words_per_line, chunk_duration, chunk_workers, vad, incremental=False
+    )
+    try:
+        while True:
+            next(events)
+    except StopIteration as stop:
+        return stop.value
+
+def format_transcription(result, task, include_text, include_srt, include_segments, response_type, job_id, words_per_line=None, vad_stats=None):
+    """
+    Turn a Whisper result into process_transcribe_media's return values.
+
+    Returns (text, srt, segments, vad_stats) for direct responses; for cloud responses
+    the first three are paths of files named after job_id, to be uploaded.
+    """
+    # For translation task, the result['text'] will be in English
+    text = None
+    srt_text = None
+    segments_json = None
+
+    logger.info(f"Generated {task} output")
+
+    if include_text is True:
+        text = result['text']
+
+    if include_srt is True:
+        srt_subtitles = []
+        subtitle_index = 1
+        
+        if words_per_line and words_per_line > 0:
+            # Collect all words and their timings
+            all_words = []
+            word_timings = []
+            
+            for segment in result['segments']:
+                words = segment['text'].strip().split()
+                segment_start = segment['start']
+                segment_end = segment['end']
+                
+                # Calculate timing for each word
+                if words:
+                    duration_per_word = (segment_end - segment_start) / len(words)
+                    for i, word in enumerate(words):
+                        word_start = segment_start + (i * duration_per_word)
+                        word_end = word_start + duration_per_word
+                        all_words.append(word)
+                        word_timings.append((word_start, word_end))
+            
+            # Process words in chunks of words_per_line
+            current_word = 0
+            while current_word < len(all_words):
+                # Get the next chunk of words
+                chunk = all_words[current_word:current_word + words_per_line]
+                
+                # Calculate timing for this chunk
+                chunk_start = word_timings[current_word][0]
+                chunk_end = word_timings[min(current_word + len(chunk) - 1, len(word_timings) - 1)][1]
+                
+                # Create the subtitle
+                srt_subtitles.append(srt.Subtitle(
+                    subtitle_index,
+                    timedelta(seconds=chunk_start),
+                    timedelta(seconds=chunk_end),
+                    ' '.join(chunk)
+                ))
+                subtitle_index += 1
+                current_word += words_per_line
+        else:
+            # Original behavior - one subtitle per segment
+            for segment in result['segments']:
+                start = timedelta(seconds=segment['start'])
+                end = timedelta(seconds=segment['end'])
+                segment_text = segment['text'].strip()
+                srt_subtitles.append(srt.Subtitle(subtitle_index, start, end, segment_text))
+                subtitle_index += 1
+        
+        srt_text = srt.compose(srt_subtitles)
+
+    if include_segments is True:
+        segments_json = result['segments']
+
+    logger.info(f"{task.capitalize()} successful, output type: {response_type}")
+
+    if response_type == "direct":
+        return text, srt_text, segments_json, vad_stats
+    else:
+        
+        if include_text is True:
+            text_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.txt")
+            with open(text_filename, 'w') as f:
+                f.write(text)
+        else:
+            text_filename = None
+        
+        if include_srt is True:
+            srt_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.srt")
+            with open(srt_filename, 'w') as f:
+                f.write(srt_text)
+        else:
+            srt_filename = None
+
+        if include_segments is True:
+            segments_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.json")
+            with open(segments_filename, 'w') as f:
+                f.write(str(segments_json))
+        else:
+            segments_filename = None
+
+        return text_filename, srt_filename, segments_filename, vad_stats
+
+def _remap_stream(segments, speech_map):
+    """Pass streamed segments through, moved back to the timeline of the original media."""
+    remapped = []
+    while True:
+        try:
+            segment = next(segments)
+        except StopIteration as stop:
+            result = stop.value
+            break
+        if speech_map is not None:
+            segment = speech_map.remap_segment(segment)
+        remapped.append(segment)
+        yield segment
+    return dict(result, segments=remapped)
+
+def stream_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None, chunk_duration=None, chunk_workers=None, vad=None, incremental=True):
+    """
+    Generator version of process_transcribe_media that yields every segment as soon as it is transcribed.
+
+    Segments carry the timestamps of the original media (and words with word_timestamps).
+    The generator returns exactly what process_transcribe_media returns for unchunked
+    media. Streaming transcribes the media in one pass, so chunk_duration, chunk_workers
+    and LONG_MEDIA_CHUNK_SECONDS only apply when incremental is False.
+    """
     logger.info(f"Starting {task} for media URL: {media_url}")
     input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     logger.info(f"Downloaded media to local file: {input_filename}")
@@ -39,8 +189,6 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
         # Load a larger model for better translation quality
         #model_size = "large" if task == "translate" else "base"
         model_size = "base"
-        model = whisper.load_model(model_size)
-        logger.info(f"Loaded Whisper {model_size} model")
 
         # Configure transcription/translation options
         options = {
@@ -53,105 +201,135 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
         if language:
             options["language"] = language
 
-        result = model.transcribe(input_filename, **options)
-        
-        # For translation task, the result['text'] will be in English
-        text = None
-        srt_text = None
-        segments_json = None
+        # Decoded once, on first use, and shared by VAD and inference
+        audio = prepare_audio(input_filename, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_audio.f32"))
+        speech = None
+        try:
+            # Drop non-speech before inference and map the timestamps back afterwards
+            vad = vad or VAD_METHOD
+            speech_map = None
+            if vad:
+                speech_map, speech = extract_speech(audio, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_speech.f32"), vad)
 
-        logger.info(f"Generated {task} output")
+            if speech_map is not None and speech is None:
+                result = {"text": "", "segments": [], "language": language}
+            else:
+                transcribe_filename, transcribe_audio = (speech.path, speech) if speech is not None else (input_filename, audio)
+                # Media already transcribed with the same options is served from the cache
+                if incremental:
+                    result = yield from _remap_stream(
+                        stream_with_cache(transcribe_filename, model_size, audio=transcribe_audio, **options), speech_map
+                    )
+                else:
+                    result = transcribe_with_cache(
+                        transcribe_filename,
+                        model_size,
+                        chunk_seconds=chunk_duration or LONG_MEDIA_CHUNK_SECONDS,
+                        chunk_workers=chunk_workers,
+                        audio=transcribe_audio,
+                        **options
+                    )
+                    if speech_map is not None:
+                        result = speech_map.remap(result)
+        finally:
+            audio.remove()
+            if speech is not None:
+                speech.remove()
+        vad_stats = speech_map.stats() if speech_map is not None else None
+        
+        os.remove(input_filename)
+        logger.info(f"Removed local file: {input_filename}")
 
-        if include_text is True:
-            text = result['text']
+        return format_transcription(
+            result, task, include_text, include_srt, include_segments, response_type, job_id, words_per_line, vad_stats
+        )
 
-        if include_srt is True:
-            srt_subtitles = []
-            subtitle_index = 1
-            
-            if words_per_line and words_per_line > 0:
-                # Collect all words and their timings
-                all_words = []
-                word_timings = []
-                
-                for segment in result['segments']:
-                    words = segment['text'].strip().split()
-                    segment_start = segment['start']
-                    segment_end = segment['end']
-                    
-                    # Calculate timing for each word
-                    if words:
-                        duration_per_word = (segment_end - segment_start) / len(words)
-                        for i, word in enumerate(words):
-                            word_start = segment_start + (i * duration_per_word)
-                            word_end = word_start + duration_per_word
-                            all_words.append(word)
-                            word_timings.append((word_start, word_end))
-                
-                # Process words in chunks of words_per_line
-                current_word = 0
-                while current_word < len(all_words):
-                    # Get the next chunk of words
-                    chunk = all_words[current_word:current_word + words_per_line]
-                    
-                    # Calculate timing for this chunk
-                    chunk_start = word_timings[current_word][0]
-                    chunk_end = word_timings[min(current_word + len(chunk) - 1, len(word_timings) - 1)][1]
-                    
-                    # Create the subtitle
-                    srt_subtitles.append(srt.Subtitle(
-                        subtitle_index,
-                        timedelta(seconds=chunk_start),
-                        timedelta(seconds=chunk_end),
-                        ' '.join(chunk)
-                    ))
-                    subtitle_index += 1
-                    current_word += words_per_line
-            else:
-                # Original behavior - one subtitle per segment
-                for segment in result['segments']:
-                    start = timedelta(seconds=segment['start'])
-                    end = timedelta(seconds=segment['end'])
-                    segment_text = segment['text'].strip()
-                    srt_subtitles.append(srt.Subtitle(subtitle_index, start, end, segment_text))
-                    subtitle_index += 1
-            
-            srt_text = srt.compose(srt_subtitles)
+    except Exception as e:
+        logger.error(f"{task.capitalize()} failed: {str(e)}")
+        raise
 
-        if include_segments is True:
-            segments_json = result['segments']
+def _transcribe_clips(batch, job_id, options, output_args):
+    """Transcribe downloaded (index, path) clips together and yield (index, output) for each."""
+    audios = [
+        prepare_audio(path, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_{index}_audio.f32"))
+        for index, path in batch
+    ]
+    try:
+        results = transcribe_many_with_cache([path for _, path in batch], "base", audios=audios, **options)
+    finally:
+        for audio in audios:
+            audio.remove()
+        for _, path in batch:
+            if os.path.exists(path):
+                os.remove(path)
 
-        os.remove(input_filename)
-        logger.info(f"Removed local file: {input_filename}")
-        logger.info(f"{task.capitalize()} successful, output type: {response_type}")
+    for (index, _), result in zip(batch, results):
+        if not isinstance(result, Exception):
+            try:
+                result = format_transcription(result, options["task"], job_id=f"{job_id}_{index}", **output_args)
+            except Exception as e:
+                result = e
+        if isinstance(result, Exception):
+            logger.error(f"Transcription of batch item {index} failed: {str(result)}")
+        yield index, result
 
-        if response_type == "direct":
-            return text, srt_text, segments_json
-        else:
-            
-            if include_text is True:
-                text_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.txt")
-                with open(text_filename, 'w') as f:
-                    f.write(text)
-            else:
-                text_file = None
-            
-            if include_srt is True:
-                srt_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.srt")
-                with open(srt_filename, 'w') as f:
-                    f.write(srt_text)
-            else:
-                srt_filename = None
+def stream_transcribe_batch(media_urls, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None):
+    """
+    Transcribe many short clips, yielding (index, output) as each one is done.
 
-            if include_segments is True:
-                segments_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.json")
-                with open(segments_filename, 'w') as f:
-                    f.write(str(segments_json))
-            else:
-                segments_filename = None
+    The clips are downloaded DOWNLOAD_CONCURRENCY at a time and transcribed in
+    batches of up to WHISPER_BATCH_SIZE as they arrive, so downloads overlap
+    inference. output is what process_transcribe_media returns for the clip (with
+    files named f"{job_id}_{index}"), or the exception that failed it; a failed
+    clip doesn't stop the others.
+    """
+    options = {
+        "task": task,
+        "word_timestamps": word_timestamps,
+        "verbose": False
+    }
+    if language:
+        options["language"] = language
+    output_args = {
+        "include_text": include_text,
+        "include_srt": include_srt,
+        "include_segments": include_segments,
+        "response_type": response_type,
+        "words_per_line": words_per_line
+    }
 
-            return text_filename, srt_filename, segments_filename 
+    logger.info(f"Starting {task} of {len(media_urls)} media URLs")
+    context = current_job()
+    cancel_event = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(media_urls))))
+    futures = {pool.submit(download_file, url, LOCAL_STORAGE_PATH, cancel_event): i for i, url in enumerate(media_urls)}
+    pending = set(futures)
+    ready = []
+    try:
+        while pending or ready:
+            if context is not None:
+                context.check()
+            done = set()
+            if pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    try:
+                        ready.append((index, future.result()))
+                    except Exception as e:
+                        logger.error(f"Download of batch item {index} failed: {str(e)}")
+                        yield index, e
 
-    except Exception as e:
-        logger.error(f"{task.capitalize()} failed: {str(e)}")
-        raise
\ No newline at end of file
+            # Run a full batch, or whatever has arrived once downloads stall or finish
+            if ready and (len(ready) >= WHISPER_BATCH_SIZE or not done):
+                batch, ready = ready[:WHISPER_BATCH_SIZE], ready[WHISPER_BATCH_SIZE:]
+                yield from _transcribe_clips(sorted(batch), job_id, options, output_args)
+    finally:
+        cancel_event.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        # Inputs downloaded but never transcribed (cancelled or failed job)
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                path = future.result()
+                if os.path.exists(path):
+                    os.remove(path)
@@ -21,7 +21,8 @@ import json
 import subprocess
 import logging
 import re
-from services.file_management import download_file
+from services.file_management import open_media_input
+from services.job_control import run_subprocess
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -45,124 +46,123 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
         list: List of dictionaries containing silence intervals with start, end, and duration
     """
     logger.info(f"Starting silence detection for media URL: {media_url}")
-    input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-    logger.info(f"Downloaded media to local file: {input_filename}")
-    
-    try:
-        # For reliable silence detection with time constraints, we need a different approach
-        # We'll use FFmpeg without any time constraints and process the results later
-        cmd = ['ffmpeg', '-i', input_filename]
-        
-        # We won't use audio trim filters as they're causing issues with silence detection
-        # Instead, we'll filter the results after the analysis is complete
-        segment_filter = ""
-        
-        # Save the start and end times for post-processing
-        start_seconds = 0
-        end_seconds = float('inf')
-        
-        if start_time:
-            try:
-                # Parse the start time to seconds
-                h, m, s = start_time.split(':')
-                start_seconds = int(h) * 3600 + int(m) * 60 + float(s)
-                logger.info(f"Will filter results starting from {start_seconds} seconds")
-            except ValueError:
-                logger.warning(f"Could not parse start time '{start_time}', using 0")
+    # Stream the media into FFmpeg when the server supports ranges, otherwise download it
+    with open_media_input(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input")) as media:
+        logger.info(f"Reading media from {'URL' if media.remote else 'local file'}: {media.path}")
+        
+        try:
+            # For reliable silence detection with time constraints, we need a different approach
+            # We'll use FFmpeg without any time constraints and process the results later
+            # We won't use audio trim filters as they're causing issues with silence detection
+            # Instead, we'll filter the results after the analysis is complete
+        
+            # Save the start and end times for post-processing
+            start_seconds = 0
+            end_seconds = float('inf')
+        
+            if start_time:
+                try:
+                    # Parse the start time to seconds
+                    h, m, s = start_time.split(':')
+                    start_seconds = int(h) * 3600 + int(m) * 60 + float(s)
+                    logger.info(f"Will filter results starting from {start_seconds} seconds")
+                except ValueError:
+                    logger.warning(f"Could not parse start time '{start_time}', using 0")
                 
-        if end_time:
-            try:
-                # Parse the end time to seconds
-                h, m, s = end_time.split(':')
-                end_seconds = int(h) * 3600 + int(m) * 60 + float(s)
-                logger.info(f"Will filter results ending at {end_seconds} seconds")
-            except ValueError:
-                logger.warning(f"Could not parse end time '{end_time}', using infinity")
-            
-        # Add audio processing options
-        cmd.extend(['-af'])
-        
-        # Build the filter string
-        filter_string = ""
-        
-        # First add the segment filter if needed
-        filter_string += segment_filter
-        
-        # Then add mono conversion if needed
-        if mono:
-            filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
-            
-        # Add the silencedetect filter
-        filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
-        cmd.append(filter_string)
-        
-        # Output to null, we only want the filter output
-        cmd.extend(['-f', 'null', '-'])
-        
-        logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
-        
-        # Run the FFmpeg command and capture stderr for silence detection output
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
-        
-        # Parse the silence detection output
-        silence_intervals = []
-        
-        # Regular expressions to match the silence detection output
-        silence_start_pattern = r'silence_start: (\d+\.?\d*)'
-        silence_end_pattern = r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)'
-        
-        # Find all silence start times
-        silence_starts = re.findall(silence_start_pattern, result.stderr)
-        
-        # Find all silence end times and durations
-        silence_ends_durations = re.findall(silence_end_pattern, result.stderr)
-        
-        # Combine the results into a list of silence intervals
-        for i, (end, duration) in enumerate(silence_ends_durations):
-            # For the first silence period, the start time might not be detected correctly
-            # if the media starts with silence
-            start = silence_starts[i] if i < len(silence_starts) else "0.0"
-            
-            # Convert to float 
-            start_time_float = float(start) 
-            end_time_float = float(end)
-            duration_float = float(duration)
+            if end_time:
+                try:
+                    # Parse the end time to seconds
+                    h, m, s = end_time.split(':')
+                    end_seconds = int(h) * 3600 + int(m) * 60 + float(s)
+                    logger.info(f"Will filter results ending at {end_seconds} seconds")
+                except ValueError:
+                    logger.warning(f"Could not parse end time '{end_time}', using infinity")
             
-            # Filter the results based on the specified time range
-            # Only include silence periods that overlap with our requested range
+            # Run silencedetect over the whole input
+            silences = find_silences(media.path, noise_threshold, min_duration, mono, media.input_args)
+        
+            # Combine the results into a list of silence intervals
+            silence_intervals = []
+            for start_time_float, end_time_float, duration_float in silences:
+                # Filter the results based on the specified time range
+                # Only include silence periods that overlap with our requested range
             
-            # Skip if silence ends before our start time
-            if end_time_float < start_seconds:
-                logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it ends before requested start time {start_seconds}")
-                continue
+                # Skip if silence ends before our start time
+                if end_time_float < start_seconds:
+                    logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it ends before requested start time {start_seconds}")
+                    continue
                 
-            # Skip if silence starts after our end time
-            if start_time_float > end_seconds:
-                logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it starts after requested end time {end_seconds}")
-                continue
+                # Skip if silence starts after our end time
+                if start_time_float > end_seconds:
+                    logger.info(f"Skipping silence at {start_time_float}-{end_time_float} as it starts after requested end time {end_seconds}")
+                    continue
                 
-            # Format time as HH:MM:SS.mmm
-            start_formatted = format_time(start_time_float)
-            end_formatted = format_time(end_time_float)
+                # Format time as HH:MM:SS.mmm
+                start_formatted = format_time(start_time_float)
+                end_formatted = format_time(end_time_float)
             
-            silence_intervals.append({
-                "start": start_formatted,
-                "end": end_formatted,
-                "duration": round(duration_float, 2)
-            })
+                silence_intervals.append({
+                    "start": start_formatted,
+                    "end": end_formatted,
+                    "duration": round(duration_float, 2)
+                })
         
-        # Clean up the downloaded file
-        os.remove(input_filename)
-        logger.info(f"Removed local file: {input_filename}")
+            return silence_intervals
         
-        return silence_intervals
-        
-    except Exception as e:
-        logger.error(f"Silence detection failed: {str(e)}")
-        # Make sure to clean up even on error
-        if os.path.exists(input_filename):
-            os.remove(input_filename)
-        raise
+        except Exception as e:
+            logger.error(f"Silence detection failed: {str(e)}")
+            raise
+
+def find_silences(path, noise_threshold="-30dB", min_duration=0.5, mono=False, input_args=()):
+    """
+    Run FFmpeg's silencedetect filter over a local file or seekable URL.
+
+    Args:
+        path (str): Input for FFmpeg
+        noise_threshold (str, optional): Noise tolerance threshold, default "-30dB"
+        min_duration (float, optional): Minimum silence duration to detect in seconds
+        mono (bool, optional): Whether to convert stereo to mono before analysis
+        input_args (sequence, optional): FFmpeg options placed before -i
+
+    Returns:
+        list: (start, end, duration) tuples in seconds
+    """
+    # Build the filter string
+    filter_string = ""
+
+    # Add mono conversion if needed
+    if mono:
+        filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
+
+    # Add the silencedetect filter
+    filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
+
+    # Output to null, we only want the filter output
+    cmd = ['ffmpeg', *input_args, '-i', path, '-af', filter_string, '-f', 'null', '-']
+
+    logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
+
+    # Run the FFmpeg command and capture stderr for silence detection output
+    result = run_subprocess(cmd, stderr=subprocess.PIPE, text=True)
+
+    # Regular expressions to match the silence detection output
+    silence_start_pattern = r'silence_start: (-?\d+\.?\d*)'
+    silence_end_pattern = r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)'
+
+    # Find all silence start times
+    silence_starts = re.findall(silence_start_pattern, result.stderr)
+
+    # Find all silence end times and durations
+    silence_ends_durations = re.findall(silence_end_pattern, result.stderr)
+
+    silences = []
+    for i, (end, duration) in enumerate(silence_ends_durations):
+        # For the first silence period, the start time might not be detected correctly
+        # if the media starts with silence
+        start = silence_starts[i] if i < len(silence_starts) else "0.0"
+        silences.append((max(0.0, float(start)), float(end), float(duration)))
+
+    return silences
 
 def format_time(seconds):
     """
@@ -17,9 +17,11 @@
 
 
 import os
-import boto3
+import time
 import logging
-import requests
+from services import s3_toolkit
+from services import job_control
+from services.http_client import get_session
 from urllib.parse import urlparse, unquote, quote
 import uuid
 import re
@@ -27,19 +29,13 @@ import re
 logger = logging.getLogger(__name__)
 
 def get_s3_client():
-    """Create and return an S3 client using environment variables."""
+    """Return the shared S3 client configured by environment variables."""
     endpoint_url = os.getenv('S3_ENDPOINT_URL')
     access_key = os.getenv('S3_ACCESS_KEY')
     secret_key = os.getenv('S3_SECRET_KEY')
     region = os.environ.get('S3_REGION', '')
     
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region
-    )
-    
-    return session.client('s3', endpoint_url=endpoint_url)
+    return s3_toolkit.get_s3_client(endpoint_url, access_key, secret_key, region)
 
 def get_filename_from_url(url):
     """Extract filename from URL."""
@@ -55,6 +51,10 @@ def get_filename_from_url(url):
 def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, download_headers=None):
     """
     Stream a file from a URL directly to S3 without saving to disk.
+
+    The download and the upload overlap: while up to STREAM_UPLOAD_PARTS_IN_FLIGHT
+    parts are being uploaded, the next one is read into a buffer from a reusable pool
+    (see s3_toolkit.upload_stream_multipart).
     
     Args:
         file_url (str): URL of the file to download
@@ -79,75 +79,25 @@ def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, downl
         else:
             filename = get_filename_from_url(file_url)
         
-        # Start a multipart upload
-        logger.info(f"Starting multipart upload for {filename} to bucket {bucket_name}")
-        acl = 'public-read' if make_public else 'private'
-        
-        multipart_upload = s3_client.create_multipart_upload(
-            Bucket=bucket_name,
-            Key=filename,
-            ACL=acl
-        )
-        
-        upload_id = multipart_upload['UploadId']
-        
         # Stream the file from URL
-        response = requests.get(file_url, stream=True, headers=download_headers)
+        response = get_session().get(file_url, stream=True, headers=download_headers)
         response.raise_for_status()
-        
-        # Process in chunks using multipart upload
-        chunk_size = 5 * 1024 * 1024  # 5MB chunks (AWS minimum)
-        parts = []
-        part_number = 1
-        
-        buffer = bytearray()
-        
-        for chunk in response.iter_content(chunk_size=1024 * 1024):  # 1MB read chunks
-            buffer.extend(chunk)
-            
-            # When we have enough data for a part, upload it
-            if len(buffer) >= chunk_size:
-                logger.info(f"Uploading part {part_number}")
-                part = s3_client.upload_part(
-                    Bucket=bucket_name,
-                    Key=filename,
-                    PartNumber=part_number,
-                    UploadId=upload_id,
-                    Body=buffer
-                )
-                
-                parts.append({
-                    'PartNumber': part_number,
-                    'ETag': part['ETag']
-                })
-                
-                part_number += 1
-                buffer = bytearray()
-        
-        # Upload any remaining data as the final part
-        if buffer:
-            logger.info(f"Uploading final part {part_number}")
-            part = s3_client.upload_part(
-                Bucket=bucket_name,
-                Key=filename,
-                PartNumber=part_number,
-                UploadId=upload_id,
-                Body=buffer
-            )
-            
-            parts.append({
-                'PartNumber': part_number,
-                'ETag': part['ETag']
-            })
-        
-        # Complete the multipart upload
-        logger.info("Completing multipart upload")
-        s3_client.complete_multipart_upload(
-            Bucket=bucket_name,
-            Key=filename,
-            UploadId=upload_id,
-            MultipartUpload={'Parts': parts}
-        )
+        # Read decoded bytes straight into the pool buffers
+        response.raw.decode_content = True
+        total_size = None if response.headers.get('Content-Encoding') else int(response.headers.get('Content-Length') or 0) or None
+
+        # Upload while downloading; the upload is aborted if anything fails
+        logger.info(f"Starting multipart upload for {filename} to bucket {bucket_name}")
+        acl = 'public-read' if make_public else 'private'
+        start_time = time.time()
+        with response:
+            uploaded = s3_toolkit.upload_stream_multipart(s3_client, bucket_name, filename, response.raw, total_size, acl)
+
+        elapsed = time.time() - start_time
+        logger.info(f"Streamed {uploaded} bytes to S3 in {elapsed:.2f}s ({uploaded / max(elapsed, 1e-6) / 1024 ** 2:.1f} MB/s)")
+        context = job_control.current_job()
+        if context is not None:
+            context.record_upload(uploaded, elapsed)
         
         # Generate the URL to the uploaded file
         if make_public:
@@ -171,4 +121,4 @@ def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, downl
         
     except Exception as e:
         logger.error(f"Error streaming file to S3: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -19,6 +19,7 @@
 import os
 import ffmpeg
 from services.file_management import download_file
+from services.job_control import run_ffmpeg
 from config import LOCAL_STORAGE_PATH
 
 def process_add_audio(video_url, audio_url, job_id, webhook_url=None):
@@ -40,7 +41,7 @@ def process_add_audio(video_url, audio_url, job_id, webhook_url=None):
         video_input = ffmpeg.input(video_file)
         audio_input = ffmpeg.input(audio_file)
 
-        (
+        run_ffmpeg(
             ffmpeg
             .output(
                 video_input.video,
@@ -49,8 +50,8 @@ def process_add_audio(video_url, audio_url, job_id, webhook_url=None):
                 vcodec='copy',  # Copy video stream (no re-encoding)
                 acodec='aac',   # Encode audio to AAC
                 shortest=None   # Use full video length
-            )
-            .run(overwrite_output=True)
+            ),
+            overwrite_output=True
         )
 
         # Clean up input files
@@ -20,6 +20,7 @@ import os
 import ffmpeg
 from config import LOCAL_STORAGE_PATH
 from services.file_management import download_file
+from services.job_control import run_ffmpeg
 from services.v1.chatterbox.tts import process_text_to_speech
 from services.ass_toolkit import generate_ass_captions_v1
 
@@ -84,14 +85,14 @@ def process_add_tts_with_captions(
         video_input = ffmpeg.input(video_path)
         audio_input = ffmpeg.input(tts_audio_path)
 
-        ffmpeg.output(
+        run_ffmpeg(ffmpeg.output(
             video_input.video,
             audio_input.audio,
             video_with_audio_path,
             vcodec='copy',
             acodec='aac',
             shortest=None
-        ).run(overwrite_output=True)
+        ), overwrite_output=True)
 
         print(f"Video with audio created: {video_with_audio_path}")
 
@@ -158,11 +159,11 @@ def process_add_tts_with_captions(
         # Step 5: Render video with captions
         output_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_final.mp4")
 
-        ffmpeg.input(video_with_audio_path).output(
+        run_ffmpeg(ffmpeg.input(video_with_audio_path).output(
             output_path,
             vf=f"subtitles='{ass_path}'",
             acodec='copy'
-        ).run(overwrite_output=True)
+        ), overwrite_output=True)
 
         print(f"Final video with captions created: {output_path}")
 
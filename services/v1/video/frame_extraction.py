@@ -18,7 +18,8 @@
 
 import os
 import ffmpeg
-from services.file_management import download_file
+from services.file_management import open_media_input
+from services.job_control import run_ffmpeg, run_ffprobe
 from config import LOCAL_STORAGE_PATH
 
 
@@ -76,50 +77,43 @@ def _extract_frame_at_position(video_url, job_id, position):
     Returns:
         str: Path to the extracted frame image
     """
-    # Download the video
-    video_path = download_file(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-
     # Set output path
     frame_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_{position}_frame.jpg")
 
-    try:
-        # Get video duration using ffprobe
-        probe = ffmpeg.probe(video_path)
-        duration = float(probe['format']['duration'])
-
-        # Calculate timestamp based on position
-        if position == "first":
-            timestamp = 0.1  # Slightly after start to ensure valid frame
-        elif position == "middle":
-            timestamp = duration / 2
-        elif position == "last":
-            timestamp = max(0, duration - 0.1)  # Slightly before end
-        else:
-            raise ValueError(f"Invalid position: {position}")
-
-        print(f"Extracting {position} frame at {timestamp}s from video (duration: {duration}s)")
-
-        # Extract frame using ffmpeg
-        (
-            ffmpeg
-            .input(video_path, ss=timestamp)
-            .output(frame_path, vframes=1, format='image2', vcodec='mjpeg')
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
-
-        # Clean up video file
-        os.remove(video_path)
-
-        # Verify frame was created
-        if not os.path.exists(frame_path):
-            raise FileNotFoundError(f"Frame file {frame_path} was not created")
-
-        return frame_path
-
-    except Exception as e:
-        print(f"Frame extraction failed: {str(e)}")
-        # Clean up on error
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        raise
+    # Seek over HTTP ranges when the server supports them, otherwise download the video
+    with open_media_input(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input")) as media:
+        try:
+            # Get video duration using ffprobe
+            probe = run_ffprobe(media.path, **media.input_kwargs)
+            duration = float(probe['format']['duration'])
+
+            # Calculate timestamp based on position
+            if position == "first":
+                timestamp = 0.1  # Slightly after start to ensure valid frame
+            elif position == "middle":
+                timestamp = duration / 2
+            elif position == "last":
+                timestamp = max(0, duration - 0.1)  # Slightly before end
+            else:
+                raise ValueError(f"Invalid position: {position}")
+
+            print(f"Extracting {position} frame at {timestamp}s from video (duration: {duration}s)")
+
+            # Extract frame using ffmpeg
+            run_ffmpeg(
+                ffmpeg
+                .input(media.path, ss=timestamp, **media.input_kwargs)
+                .output(frame_path, vframes=1, format='image2', vcodec='mjpeg')
+                .overwrite_output(),
+                capture_stdout=True, capture_stderr=True
+            )
+
+            # Verify frame was created
+            if not os.path.exists(frame_path):
+                raise FileNotFoundError(f"Frame file {frame_path} was not created")
+
+            return frame_path
+
+        except Exception as e:
+            print(f"Frame extraction failed: {str(e)}")
+            raise
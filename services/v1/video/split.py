@@ -18,10 +18,10 @@
 
 import os
 import json
-import subprocess
 import logging
 import uuid
 from services.file_management import download_file
+from services.job_control import run_subprocess
 from services.cloud_storage import upload_file
 from config import LOCAL_STORAGE_PATH
 
@@ -91,7 +91,7 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
             '-of', 'default=noprint_wrappers=1:nokey=1',
             input_filename
         ]
-        duration_result = subprocess.run(probe_cmd, capture_output=True, text=True)
+        duration_result = run_subprocess(probe_cmd, capture_output=True, text=True)
         
         try:
             file_duration = float(duration_result.stdout.strip())
@@ -154,7 +154,7 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
             logger.info(f"Running FFmpeg command for split {index+1}: {' '.join(cmd)}")
             
             # Run the FFmpeg command
-            process = subprocess.run(cmd, capture_output=True, text=True)
+            process = run_subprocess(cmd, capture_output=True, text=True)
             
             if process.returncode != 0:
                 logger.error(f"Error processing split {index+1}: {process.stderr}")
@@ -18,7 +18,8 @@
 
 import os
 import ffmpeg
-from services.file_management import download_file
+from services.file_management import open_media_input
+from services.job_control import run_ffmpeg, run_ffprobe
 from config import LOCAL_STORAGE_PATH
 
 def extract_thumbnail(video_url, job_id, second=0):
@@ -35,43 +36,36 @@ def extract_thumbnail(video_url, job_id, second=0):
     Returns:
         str: Path to the extracted thumbnail image
     """
-    # Download the video from the provided URL
-    video_path = download_file(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-
     # Set output path for the thumbnail
     thumbnail_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_thumbnail.jpg")
 
-    try:
-        # If second is -1, extract the last frame
-        if second == -1:
-            # Get video duration using ffprobe
-            probe = ffmpeg.probe(video_path)
-            duration = float(probe['format']['duration'])
-            # Extract frame at 0.1 seconds before the end to ensure we get a valid frame
-            second = max(0, duration - 0.1)
-            print(f"Video duration: {duration}s, extracting last frame at {second}s")
+    # Seek over HTTP ranges when the server supports them, otherwise download the video
+    with open_media_input(video_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input")) as media:
+        try:
+            # If second is -1, extract the last frame
+            if second == -1:
+                # Get video duration using ffprobe
+                probe = run_ffprobe(media.path, **media.input_kwargs)
+                duration = float(probe['format']['duration'])
+                # Extract frame at 0.1 seconds before the end to ensure we get a valid frame
+                second = max(0, duration - 0.1)
+                print(f"Video duration: {duration}s, extracting last frame at {second}s")
+
+            # Extract thumbnail using ffmpeg at the specified timestamp
+            run_ffmpeg(
+                ffmpeg
+                .input(media.path, ss=second, **media.input_kwargs)  # 'ss' is the seek parameter for the timestamp
+                .output(thumbnail_path, vframes=1)  # vframes=1 extracts a single frame
+                .overwrite_output(),
+                capture_stdout=True, capture_stderr=True
+            )
 
-        # Extract thumbnail using ffmpeg at the specified timestamp
-        (
-            ffmpeg
-            .input(video_path, ss=second)  # 'ss' is the seek parameter for the timestamp
-            .output(thumbnail_path, vframes=1)  # vframes=1 extracts a single frame
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
-        
-        # Clean up the downloaded video file
-        os.remove(video_path)
-        
-        # Ensure the thumbnail file exists
-        if not os.path.exists(thumbnail_path):
-            raise FileNotFoundError(f"Thumbnail file {thumbnail_path} was not created")
+            # Ensure the thumbnail file exists
+            if not os.path.exists(thumbnail_path):
+                raise FileNotFoundError(f"Thumbnail file {thumbnail_path} was not created")
+                
+            return thumbnail_path
             
-        return thumbnail_path
-        
-    except Exception as e:
-        print(f"Thumbnail extraction failed: {str(e)}")
-        # Clean up any downloaded files on error
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        raise
+        except Exception as e:
+            print(f"Thumbnail extraction failed: {str(e)}")
+            raise
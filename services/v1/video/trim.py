@@ -18,10 +18,10 @@
 
 import os
 import json
-import subprocess
 import logging
 import uuid
 from services.file_management import download_file
+from services.job_control import run_subprocess
 from services.cloud_storage import upload_file
 from config import LOCAL_STORAGE_PATH
 
@@ -96,7 +96,7 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
             '-of', 'default=noprint_wrappers=1:nokey=1',
             input_filename
         ]
-        duration_result = subprocess.run(probe_cmd, capture_output=True, text=True)
+        duration_result = run_subprocess(probe_cmd, capture_output=True, text=True)
         
         try:
             file_duration = float(duration_result.stdout.strip())
@@ -156,7 +156,7 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
         logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
         
         # Run the FFmpeg command
-        process = subprocess.run(cmd, capture_output=True, text=True)
+        process = run_subprocess(cmd, capture_output=True, text=True)
         
         if process.returncode != 0:
             logger.error(f"Error during trim: {process.stderr}")
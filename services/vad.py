@@ -0,0 +1,169 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import bisect
+import logging
+from services.audio_prep import SAMPLE_RATE, audio_from_samples, detect_silences, frame_levels
+
+logger = logging.getLogger(__name__)
+
+# Voice activity detection applied before transcription when a request doesn't choose:
+# "energy" (frame energy) or "silencedetect" (silencedetect's peak threshold), or empty for none
+VAD_METHOD = os.environ.get('VAD_METHOD', '')
+# Pauses shorter than this many seconds are kept as part of the speech around them
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get('VAD_MIN_SILENCE_SECONDS', 0.5))
+# Seconds of audio kept on both sides of every speech region
+VAD_PADDING_SECONDS = float(os.environ.get('VAD_PADDING_SECONDS', 0.2))
+
+VAD_METHODS = ('energy', 'silencedetect')
+
+_FRAME_SECONDS = 0.03
+# A frame is speech when it is this many dB above the noise floor (and above _MIN_SPEECH_DB)
+_ENERGY_MARGIN_DB = 12.0
+_MIN_SPEECH_DB = -50.0
+_SILENCE_NOISE = "-30dB"
+
+def _merge(regions, duration, min_gap=VAD_MIN_SILENCE_SECONDS, padding=VAD_PADDING_SECONDS):
+    """Pad speech regions, clip them to the media and join those separated by less than min_gap."""
+    merged = []
+    for start, end in sorted(regions):
+        start, end = max(0.0, start - padding), min(duration, end + padding)
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif end > start:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def energy_regions(samples):
+    """Find speech regions in 16 kHz samples by comparing frame energy with the noise floor."""
+    import numpy as np
+    db, _ = frame_levels(samples, _FRAME_SECONDS)
+    if len(db) == 0:
+        return []
+    threshold = max(np.percentile(db, 10) + _ENERGY_MARGIN_DB, _MIN_SPEECH_DB)
+
+    # Edges of the runs of speech frames
+    speech = np.concatenate(([False], db > threshold, [False]))
+    edges = np.flatnonzero(np.diff(speech.astype(np.int8)))
+    return [(start * _FRAME_SECONDS, end * _FRAME_SECONDS) for start, end in zip(edges[::2], edges[1::2])]
+
+def silencedetect_regions(samples, duration):
+    """Find speech regions as the gaps between silences detected like FFmpeg's silencedetect."""
+    regions = []
+    position = 0.0
+    for start, end, _ in detect_silences(samples, _SILENCE_NOISE, VAD_MIN_SILENCE_SECONDS):
+        if start > position:
+            regions.append((position, start))
+        position = max(position, end)
+    if duration > position:
+        regions.append((position, duration))
+    return regions
+
+class SpeechMap:
+    """
+    Maps times in audio reduced to its speech regions back to the original media.
+
+    Args:
+        regions (list): (start, end) of the kept regions in the original media, in order
+        duration (float): Length of the original media in seconds
+    """
+
+    def __init__(self, regions, duration):
+        self.regions = regions
+        self.duration = duration
+        self._offsets = []
+        position = 0.0
+        for start, end in regions:
+            self._offsets.append(position)
+            position += end - start
+        self.speech_seconds = position
+
+    @property
+    def skipped_seconds(self):
+        return max(0.0, self.duration - self.speech_seconds)
+
+    def to_original(self, t, end=False):
+        """Map time t of the reduced audio to the original; an end time at a region boundary stays in the earlier region."""
+        if not self.regions:
+            return t
+        index = (bisect.bisect_left if end else bisect.bisect_right)(self._offsets, t) - 1
+        index = max(0, index)
+        start, stop = self.regions[index]
+        return min(stop, start + t - self._offsets[index])
+
+    def remap_segment(self, segment):
+        """Return a copy of a Whisper segment of the reduced audio with times of the original media."""
+        segment = dict(segment)
+        segment['start'] = round(self.to_original(segment['start']), 3)
+        segment['end'] = round(self.to_original(segment['end'], end=True), 3)
+        if segment.get('words'):
+            segment['words'] = [
+                dict(word, start=round(self.to_original(word['start']), 3), end=round(self.to_original(word['end'], end=True), 3))
+                for word in segment['words']
+            ]
+        return segment
+
+    def remap(self, result):
+        """Return a Whisper result of the reduced audio with segment and word times of the original media."""
+        return dict(result, segments=[self.remap_segment(segment) for segment in result['segments']])
+
+    def stats(self):
+        """Summarize the filtering for the response."""
+        return {
+            "duration": round(self.duration, 3),
+            "speech_seconds": round(self.speech_seconds, 3),
+            "skipped_seconds": round(self.skipped_seconds, 3),
+            "regions": len(self.regions)
+        }
+
+def extract_speech(audio, output_path, method=None):
+    """
+    Reduce prepared audio to its speech, dropping everything else.
+
+    Args:
+        audio (PreparedAudio): The job's decoded audio
+        output_path (str): Raw file for the speech samples
+        method (str, optional): "energy" or "silencedetect", VAD_METHOD by default
+
+    Returns:
+        tuple: (SpeechMap, PreparedAudio) mapping times in the speech back to the
+            original; with no speech found the map has no regions and the audio is None
+    """
+    import numpy as np
+    method = method or VAD_METHOD
+    if method not in VAD_METHODS:
+        raise ValueError(f"Unknown VAD method: {method}")
+
+    samples = audio.samples
+    duration = len(samples) / SAMPLE_RATE
+    if method == 'energy':
+        regions = energy_regions(samples)
+    else:
+        regions = silencedetect_regions(samples, duration)
+    regions = _merge(regions, duration)
+
+    speech_map = SpeechMap(regions, duration)
+    speech = None
+    if regions:
+        speech = audio_from_samples(np.concatenate([audio.slice(start, end) for start, end in regions]), output_path)
+    logger.info(
+        f"VAD ({method}) kept {speech_map.speech_seconds:.1f}s of {duration:.1f}s in {len(regions)} regions, "
+        f"skipping {speech_map.skipped_seconds:.1f}s"
+    )
+    return speech_map, speech
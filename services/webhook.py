@@ -18,6 +18,7 @@
 
 import requests
 import logging
+from services.http_client import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ def send_webhook(webhook_url, data):
     """Send a POST request to a webhook URL with the provided data."""
     try:
         logger.info(f"Attempting to send webhook to {webhook_url} with data: {data}")
-        response = requests.post(webhook_url, json=data)
+        response = get_session().post(webhook_url, json=data)
         response.raise_for_status()
         logger.info(f"Webhook sent: {data}")
     except requests.RequestException as e: